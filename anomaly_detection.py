@@ -10,20 +10,21 @@ import pandas as pd
 import os
 import config.file_path as file_path
 import argparse
-import time
 import glob
 import numpy as np
 import traceback
 import timeit
 import utils.marker as mk
-import dill
 import pickle
+import models.checkpoint as checkpoint
 
 from models.anomaly_detector import AnomalyDetector
 from datetime import datetime, timedelta
-from utils.queue import Queue
+from utils.queue import Queue, InputWindow
 from utils.logger import FileLogger, StreamLogger
 from utils.graceful_killer import GracefulKiller
+from utils.wal import WriteAheadLog, latest_snapshot
+from utils.watcher import Watcher
 
 SLOG_LEVEL = "INFO"
 
@@ -43,79 +44,241 @@ class Clean(GracefulKiller):
         # raise SystemExit
 
 
-def data_loader(input_dir):
+# [*]Input files read in chunks: input directory -> [file path, chunk reader, rows read]. See data_loader.
+_streams = {}
+# [*]Input directory -> {file path: rows read} of the files read by the last data_loader call.
+_offsets = {}
+# [*]Input directory -> files read to the end by the last data_loader call. Removed by the next call.
+_read_files = {}
+# [*]File path -> rows already logged (see resume_streams).
+_resume = {}
+
+
+def data_loader(input_dir, logger, backlog=False, max_rows=None, max_seconds=None, chunk_rows=None):
     """
     Load the train data from input directory.
+    In backlog mode every ready file is read in timestamp (file name) order, until the row or time budget is
+    spent, and the rows are returned as one block for batched detection.
+    With chunk_rows a file is read chunk_rows rows at a time: each call returns the next chunk of the file being
+    read, so a huge file never has to fit in memory.
+    A file stays on disk until the call after the one that returned its last rows, when they are in the write-ahead
+    log; log the rows with their `stream_offsets`.
     :param input_dir: A String. Train data path.
+    :param logger: A Logger object. Informative logger.
+    :param backlog: A Boolean. Read all ready files instead of the oldest one.
+    :param max_rows: An Integer. Backlog mode stops reading files once this many rows are read. Unlimited if None.
+    :param max_seconds: A Float. Backlog mode stops reading files after this time. Unlimited if None.
+    :param chunk_rows: An Integer. Rows read from a file at once. The whole file if None.
     :return:
-        - queue: A Queue object.
-        - boolean: if file exist returns True, else returns False.
+        - data: A Numpy array. Rows of [PGW_IP, DTmm, SVC_TYPE, UP, DN].
+        - None: If there is no file.
     """
     stime = timeit.default_timer()
 
-    info_file_list = glob.glob(input_dir + "*.DAT.INFO")
-    if info_file_list:
+    # [*]The rows returned by the last call are logged by now.
+    for file in _read_files.pop(input_dir, []):
+        _remove_input(file + ".INFO", logger)
+    _offsets[input_dir] = {}
+
+    stream = _streams.get(input_dir)
+    info_file_list = [info_file for info_file in glob.glob(input_dir + "*.DAT.INFO")
+                      if stream is None or info_file[:-5] != stream[0]]
+    if info_file_list or stream is not None:
         info_file_list = sorted(info_file_list)
+        files = len(info_file_list)
+
+        if not backlog:
+            # [*] Work with first file
+            df = _next_block(input_dir, info_file_list, logger, chunk_rows)
+
+            etime = timeit.default_timer()
+            logger.info("Data loader required time: {}".format(etime - stime))
+
+            return df
+
+        blocks = []
+        rows = 0
+        while True:
+            block = _next_block(input_dir, info_file_list, logger, chunk_rows)
+            if block is None:
+                break
+            blocks.append(block)
+            rows += len(block)
+            if max_rows is not None and rows >= max_rows:
+                break
+            if max_seconds is not None and timeit.default_timer() - stime >= max_seconds:
+                break
 
-        # [*] Work with first file
-        file = info_file_list[0]
-        logger.info(".INFO file is detected: {}".format(file))
+        etime = timeit.default_timer()
+        # [*]Queue depth: files read now and files left behind.
+        logger.info("Backlog: {} files ({} rows) read, {} files left. Data loader required time: {}".format(
+            files - len(info_file_list), rows, len(info_file_list), etime - stime))
 
-        # [*]Remove .INFO extension.
-        file = file[:-5]
-        df = pd.read_csv(file, delimiter='|', names=['PGW_IP', 'DTmm', 'SVC_TYPE', 'UP', 'DN'], dtype={
-            "PGW_IP": str,
-            "DTmm": str,
-            "SVC_TYPE": str,
-            "UP": float,
-            "DN": float
-        }).to_numpy()
+        if not blocks:
+            return None
+        return np.concatenate(blocks) if len(blocks) > 1 else blocks[0]
+    return None
 
-        logger.info("Data file is opened: {}".format(file))
-        logger.info("Dataframe: {}".format(df))
 
-        # [*]Remove loaded file list.
-        os.remove(info_file_list[0])
-        os.remove(file)
+def stream_offsets(input_dir):
+    """
+    Rows read so far from the files read by the last data_loader call, to be logged with its rows
+    (WriteAheadLog.append).
+    :param input_dir: A String. Train data path.
+    :return:
+        A Dictionary. File path -> rows read.
+    """
+    return dict(_offsets.get(input_dir, {}))
 
-        logger.debug(".INFO file is removed: {}".format(info_file_list[0]))
-        logger.debug(".DAT file is removed: {}".format(file))
 
-        etime = timeit.default_timer()
-        logger.info("Data loader required time: {}".format(etime - stime))
+def resume_streams(offsets):
+    """
+    Skip the rows of input files that are already in the write-ahead log (WriteAheadLog.offsets), when they are
+    read again after a restart.
+    :param offsets: A Dictionary. File path -> rows logged.
+    :return: None
+    """
+    _resume.update(offsets)
 
-        return df
-    return None
+
+def _next_block(input_dir, info_file_list, logger, chunk_rows=None):
+    """
+    Read the next block of rows: the next chunk of the file being read, else the next file of info_file_list
+    (which is consumed from the front).
+    :param input_dir: A String. Train data path.
+    :param info_file_list: A List. Paths of the .INFO files not read yet, oldest first.
+    :param logger: A Logger object. Informative logger.
+    :param chunk_rows: An Integer. Rows read from a file at once. The whole file if None.
+    :return:
+        - data: A Numpy array. Rows of [PGW_IP, DTmm, SVC_TYPE, UP, DN].
+        - None: If every file is read.
+    """
+    while True:
+        stream = _streams.get(input_dir)
+        if stream is not None:
+            file, reader, rows = stream
+            chunk = next(reader, None)
+            # [*]An empty file (or one read to the end before a restart) gives an empty chunk.
+            if chunk is not None and not chunk.empty:
+                stream[2] = rows + len(chunk)
+                _offsets[input_dir][file] = stream[2]
+                logger.info("Dataframe: {}".format(chunk))
+                return chunk.to_numpy()
+            reader.close()
+            del _streams[input_dir]
+            logger.debug("Data file is read: {} ({} rows)".format(file, rows))
+            if file in _offsets[input_dir]:
+                # [*]Its last rows are returned by this call; removed once they are logged.
+                _read_files.setdefault(input_dir, []).append(file)
+            else:
+                _remove_input(file + ".INFO", logger)
+        if not info_file_list:
+            return None
+        info_file = info_file_list.pop(0)
+        file = info_file[:-5]
+        skip_rows = _resume.pop(file, 0)
+        if skip_rows:
+            logger.info("{} rows of {} are already logged; it is read on from there.".format(skip_rows, file))
+        if chunk_rows is not None:
+            _streams[input_dir] = [file, _open_input(info_file, logger, chunk_rows, skip_rows), skip_rows]
+            continue
+        data = _read_input(info_file, logger, skip_rows)
+        if not len(data):
+            _remove_input(info_file, logger)
+            continue
+        # [*]Removed once its rows are logged, like the last chunk of a file.
+        _offsets[input_dir][file] = skip_rows + len(data)
+        _read_files.setdefault(input_dir, []).append(file)
+        return data
+
+
+def _open_input(info_file, logger, chunk_rows=None, skip_rows=0):
+    """
+    Open one input file.
+    :param info_file: A String. Path of the .INFO file.
+    :param logger: A Logger object. Informative logger.
+    :param chunk_rows: An Integer. Rows per chunk. The whole file if None.
+    :param skip_rows: An Integer. Rows skipped at the start of the file.
+    :return:
+        - A DataFrame. The rows, if chunk_rows is None.
+        - A chunk reader (iterator of DataFrames) otherwise.
+    """
+    logger.info(".INFO file is detected: {}".format(info_file))
+
+    # [*]Remove .INFO extension.
+    file = info_file[:-5]
+    df = pd.read_csv(file, delimiter='|', names=['PGW_IP', 'DTmm', 'SVC_TYPE', 'UP', 'DN'], dtype={
+        "PGW_IP": str,
+        "DTmm": str,
+        "SVC_TYPE": str,
+        "UP": float,
+        "DN": float
+    }, chunksize=chunk_rows, skiprows=skip_rows)
+
+    logger.info("Data file is opened: {}".format(file))
+    return df
 
 
-def detection(detector, data, output_dir):
+def _remove_input(info_file, logger):
+    """
+    Remove an input file with its .INFO file (the marker first, so the file is never read half removed).
+    """
+    file = info_file[:-5]
+    os.remove(info_file)
+    os.remove(file)
+
+    logger.debug(".INFO file is removed: {}".format(info_file))
+    logger.debug(".DAT file is removed: {}".format(file))
+
+
+def _read_input(info_file, logger, skip_rows=0):
+    """
+    Read one input file at once.
+    :param info_file: A String. Path of the .INFO file.
+    :param logger: A Logger object. Informative logger.
+    :param skip_rows: An Integer. Rows skipped at the start of the file.
+    :return:
+        A Numpy array. Rows of [PGW_IP, DTmm, SVC_TYPE, UP, DN].
+    """
+    df = _open_input(info_file, logger, skip_rows=skip_rows).to_numpy()
+
+    logger.info("Dataframe: {}".format(df))
+    return df
+
+
+def detection(detector, data, output_dir, dstore, logger, detector_logger):
     """
     Compute the anomaly scores and write a output into a file.
     :param detector: An Anomaly Detector object. Anomaly Detector that contains its ip address and service type.
-    :param data: A Queue object. Input training data.
-    :param output_dir: A String. Output directory path.
+    :param data: A Numpy array. Rows of [PGW_IP, DTmm, SVC_TYPE, UP, DN].
+    :param output_dir: A String. Output directory path. If None, the rows are replayed: the detector and dstore
+        are updated and nothing is written.
+    :param dstore: An InputWindow object. Input window of the detector; updated with the data.
+    :param logger: A Logger object. Informative logger.
+    :param detector_logger: A Logger object. Logger of the detection results.
     :return: None
     """
 
-    for d in data:
-        if dstore.full():
-            dstore.get()
-            dstore.put([d[1], d[3:]])
-            training_data = np.array(dstore.indexList)
-            t_date = training_data[:, 0]
-            t_data = training_data[:, 1]
-
-            np_data = []
-            for t in t_data:
-                np_data.append(np.array(t, dtype=np.float))
-            np_data = np.array(np_data)
-            logger.info("Detection input data ({})".format(np_data))
-            output_path = output_dir + '{}_{}_{}.DAT'.format(detector.ip, detector.svc_type, t_date[-1])
-            detector.compute_anomaly_score(t_date, np_data, output_path, detector_logger)
-            logger.info("Threshold value: {}".format(detector.rrcf.threshold))
-        else:
-            dstore.put([d[1], d[3:]])
-            logger.debug("dstore: {}".format(dstore.indexList))
+    # [*]Rows of the window followed by the rows of the file; one allocation per block.
+    window_dates, window_values = dstore.window()
+    t_date = np.concatenate([window_dates, data[:, 1]])
+    np_data = np.concatenate([window_values, data[:, 3:].astype(np.float64)])
+    dstore.extend(t_date[len(window_dates):], np_data[len(window_values):])
+    logger.debug("dstore: {}".format(dstore))
+
+    # [*]A row is scored if the window was already full before it, i.e. the windows of rows[1:].
+    if len(np_data) - 1 < dstore.size:
+        return
+    t_date = t_date[1:]
+    np_data = np_data[1:]
+    logger.info("Detection input data ({})".format(np_data))
+    output_path = None
+    if output_dir is not None:
+        output_path = output_dir + '{}_{}_{}.DAT'.format(detector.ip, detector.svc_type, t_date[-1])
+    # [*]All windows of the file at once; one output file per block.
+    scored = detector.compute_anomaly_scores(t_date, np_data, output_path, detector_logger)
+    logger.info("Scored windows: {}, Threshold value: {}".format(scored, detector.rrcf.threshold))
+    logger.debug("Anomaly score timing: {}".format(detector.rrcf.timer))
 
 
 def directory_check():
@@ -145,16 +308,21 @@ def directory_check():
         slogger.debug("INSTANCE_DIR directory doesn't exist. Create one; ({})".format(RUN_DIR))
 
 
-def main(ip, svc, t, l, seq, q):
+def main(ip, svc, t, l, seq, q, engine='object', workers=None, hash_index=False, seed=None,
+         threshold_engine='exact', snapshot_interval=600, backlog=False, backlog_rows=None, backlog_seconds=None,
+         chunk_rows=None):
     """
     Work flow:
         1) Directory creation, if doesn't exist.
         2) Logger define.
         3) Anomaly Detector define.
-        4) While roof
-            4-1) Check logger's date.
-            4-2) Loading the data, if input file exists.
-            4-3) Anomaly detection, if data queue is full and file is read.
+        4) Replay of the write-ahead log after the last snapshot.
+        5) While roof
+            5-1) Check logger's date.
+            5-2) Loading the data, if input file exists (all ready files in backlog mode).
+            5-3) Logging the data ahead, and anomaly detection, if data queue is full and file is read.
+            5-4) Background snapshot of the model, if it is due.
+            5-5) Sleep until a .INFO file is created in the input directory (at most 1 second).
 
     :param ip: A String. P-gateway address.
     :param svc: A String. Service Type.
@@ -162,6 +330,16 @@ def main(ip, svc, t, l, seq, q):
     :param l: An Integer. Leaf size.
     :param seq: An Integer. Sequences.
     :param q: A Float. Quantile.
+    :param engine: A String. Tree engine of newly created models.
+    :param workers: An Integer. Worker processes of the sharded engine.
+    :param hash_index: A Boolean. Hash index for duplicate points of newly created models.
+    :param seed: An Integer. Random seed of newly created models.
+    :param threshold_engine: A String. Threshold engine of newly created models; exact or p2.
+    :param snapshot_interval: An Integer. Seconds between background snapshots of the model.
+    :param backlog: A Boolean. Read all ready input files at once and detect them as one block.
+    :param backlog_rows: An Integer. Row budget of one backlog read.
+    :param backlog_seconds: A Float. Time budget of one backlog read.
+    :param chunk_rows: An Integer. Rows read from an input file at once. The whole file if None.
     :return: None.
     """
     global slogger, logger, elogger, detector_logger, elog_path
@@ -169,6 +347,7 @@ def main(ip, svc, t, l, seq, q):
     global dstore
     global LOG_LEVEL
     global anomaly_detector
+    global wal
 
     logger.info("\n\t\t@Hyper parameters: \n"
                 "\t\t\t+IP addr: {}\n"
@@ -176,7 +355,8 @@ def main(ip, svc, t, l, seq, q):
                 "\t\t\t+Trees: {}\n"
                 "\t\t\t+Leaves: {}\n"
                 "\t\t\t+Sequences: {}\n"
-                "\t\t\t+Quantile: {}".format(ip, svc, t, l, seq, q))
+                "\t\t\t+Quantile: {}\n"
+                "\t\t\t+Engine: {}".format(ip, svc, t, l, seq, q, engine))
 
     '''
         Initialize Graceful Killer
@@ -184,19 +364,31 @@ def main(ip, svc, t, l, seq, q):
     killer = Clean(ip, svc)
 
     try:
-        if os.path.exists(INSTANCE_DIR + "model.pkl"):
-            with open(INSTANCE_DIR+"model.pkl", "rb") as model:
-                anomaly_detector = pickle.load(model)
+        anomaly_detector, loaded_dstore = load_model(INSTANCE_DIR)
+        if anomaly_detector is not None:
             slogger.info("Model is already exist. Loaded successfully!")
             logger.info("Anomaly Detector successfully loaded.")
             logger.info(anomaly_detector.rrcf.forest)
         else:
-            anomaly_detector = AnomalyDetector(t, l, sequences=seq, quantile=q, ip=ip, svc_type=svc)
+            anomaly_detector = AnomalyDetector(t, l, sequences=seq, quantile=q, ip=ip, svc_type=svc,
+                                               engine=engine, workers=workers, hash_index=hash_index,
+                                               random_state=seed, threshold_engine=threshold_engine)
             logger.info("Anomaly Detector successfully created.")
 
-        if os.path.exists(INSTANCE_DIR + "dstore.pkl"):
-            with open(INSTANCE_DIR + "dstore.pkl", "rb") as ds:
-                dstore = pickle.load(ds)
+        if loaded_dstore is not None:
+            dstore = loaded_dstore
+
+        # [*]Rows applied after the last snapshot (the process was killed without saving).
+        loaded_wal = WriteAheadLog(INSTANCE_DIR, interval=snapshot_interval)
+        replay = loaded_wal.pending()
+        if replay is not None:
+            stime = timeit.default_timer()
+            detection(anomaly_detector, replay, None, dstore, logger, detector_logger)
+            logger.info("{} rows of the write-ahead log are replayed. Required time: {}".format(
+                len(replay), timeit.default_timer() - stime))
+        wal = loaded_wal
+        # [*]Input files whose first rows are in the log are read on after them.
+        resume_streams(wal.offsets)
 
     except Exception:
         elogger.error(traceback.format_exc())
@@ -205,9 +397,18 @@ def main(ip, svc, t, l, seq, q):
         model_save()
         raise SystemExit
 
+    # [*]Wakes the loop when an input file arrives. None: the input directory has to be read.
+    watcher = Watcher()
+    watcher.watch(INPUT_DIR)
+    ready = None
+
     while not killer.kill_now:
+        # [*]Nothing is read (and no directory checked) while the watcher reports no new file.
+        idle = ready is not None and not ready
+
         # [*] Check directory existence.
-        directory_check()
+        if not idle:
+            directory_check()
 
         # [*]If Day pass by create a new log file.
         today = datetime.now().date()
@@ -225,8 +426,10 @@ def main(ip, svc, t, l, seq, q):
             detector_logger = FileLogger('anomaly_detector', log_path=update_dlog_path, level=LOG_LEVEL).get_instance()
 
         try:
+            ltime = timeit.default_timer()
             # [*]Loading the data and save it into queue.
-            data = data_loader(INPUT_DIR)
+            data = None if idle else data_loader(INPUT_DIR, logger, backlog=backlog, max_rows=backlog_rows,
+                                                 max_seconds=backlog_seconds, chunk_rows=chunk_rows)
             slogger.debug("Read status: {}".format(data))
         except Exception:
             elogger.error(traceback.format_exc())
@@ -238,12 +441,25 @@ def main(ip, svc, t, l, seq, q):
         try:
             if data is not None:
                 stime = timeit.default_timer()
+                # [*]Log the rows before they are applied.
+                wal.append(data, offsets=stream_offsets(INPUT_DIR))
                 # [*]Anomaly Detection.
-                detection(anomaly_detector, data, OUTPUT_DIR)
+                detection(anomaly_detector, data, OUTPUT_DIR, dstore, logger, detector_logger)
                 etime = timeit.default_timer()
                 logger.info("Detection required time: {}".format(etime - stime))
+                if backlog:
+                    logger.info("Catch-up rate: {} rows/s".format(len(data) / (etime - ltime)))
                 slogger.debug("Detection is normally worked.")
-            time.sleep(1)
+            if wal.due():
+                # [*]The sharded engine's trees live in its worker processes; it is saved in this process.
+                wal.snapshot(lambda path: save_model(path, anomaly_detector, dstore),
+                             background=anomaly_detector.rrcf.engine != 'sharded')
+                logger.info("Snapshot is started: {}".format(wal))
+            if data is None:
+                ready = watcher.wait(1)
+            else:
+                # [*]More files (or chunks of the file being read) may be waiting.
+                ready = None
         except Exception:
             elogger.error(traceback.format_exc())
             slogger.error("Detection method didn't work properly. Check your error log: {}".format(elog_path))
@@ -251,17 +467,62 @@ def main(ip, svc, t, l, seq, q):
             model_save()
             raise SystemExit
 
+    watcher.close()
     model_save()
 
 
-def model_save():
-    with open(INSTANCE_DIR + "model.pkl", "wb") as output:
-        dill.dump(anomaly_detector, output)
-        logger.info("Model is saved..")
+def load_model(instance_dir):
+    """
+    Load the detector and its input window from an instance directory: from its newest snapshot directory (see
+    utils.wal), else from the directory itself (older versions). Checkpoints are preferred; pickles of older
+    versions are loaded once and saved as checkpoints by the next snapshot.
+    :param instance_dir: A String. Instance directory path.
+    :return:
+        - detector: An Anomaly Detector object, or None if there is none.
+        - dstore: An InputWindow object, or None if there is none.
+    """
+    detector = None
+    dstore = None
+    _, snapshot_dir = latest_snapshot(instance_dir)
+    if snapshot_dir is not None:
+        instance_dir = snapshot_dir
+    if os.path.exists(instance_dir + "model.npz"):
+        detector = checkpoint.load(instance_dir + "model.npz")
+    elif os.path.exists(instance_dir + "model.pkl"):
+        with open(instance_dir + "model.pkl", "rb") as model:
+            detector = pickle.load(model)
+
+    if os.path.exists(instance_dir + "dstore.npz"):
+        dstore = checkpoint.load(instance_dir + "dstore.npz")
+    elif os.path.exists(instance_dir + "dstore.pkl"):
+        with open(instance_dir + "dstore.pkl", "rb") as ds:
+            dstore = pickle.load(ds)
+    if isinstance(dstore, Queue):
+        # [*]Input windows of older versions are Queues of [date, values] items.
+        dstore = InputWindow.from_queue(dstore)
+    return detector, dstore
+
+
+def save_model(instance_dir, detector, dstore):
+    """
+    Save the detector and its input window as checkpoints.
+    :param instance_dir: A String. Instance directory path, or the directory of a snapshot (WriteAheadLog.snapshot).
+    :param detector: An Anomaly Detector object.
+    :param dstore: An InputWindow object.
+    :return: None
+    """
+    checkpoint.save(instance_dir + "model.npz", detector)
+    checkpoint.save(instance_dir + "dstore.npz", dstore)
 
-    with open(INSTANCE_DIR + "dstore.pkl", "wb") as output:
-        dill.dump(dstore, output)
-        logger.info("Data queue is saved : {}".format(dstore))
+
+def model_save():
+    if wal is None:
+        save_model(INSTANCE_DIR, anomaly_detector, dstore)
+    else:
+        # [*]The snapshot covers the whole write-ahead log, which is removed.
+        wal.snapshot(lambda path: save_model(path, anomaly_detector, dstore), background=False)
+    logger.info("Model is saved..")
+    logger.info("Data queue is saved : {}".format(dstore))
 
 
 if __name__ == '__main__':
@@ -277,6 +538,26 @@ if __name__ == '__main__':
     parser.add_argument('--leaves', type=int, help='Leaf size to memorize.(Default: 864)', default=864)
     parser.add_argument('--q', type=float, help='Quantile value.(Default: 0.99)', default=0.99)
     parser.add_argument('--log', type=str, help='Set log level', default="INFO")
+    parser.add_argument('--engine', type=str, help='Tree engine; object, array, forest or sharded.(Default: object)',
+                        default="object", choices=['object', 'array', 'forest', 'sharded'])
+    parser.add_argument('--workers', type=int, help='Worker processes of the sharded engine.(Default: CPU count)',
+                        default=None)
+    parser.add_argument('--hash_index', action='store_true',
+                        help='Find duplicate points with a hash index instead of a tree query.')
+    parser.add_argument('--seed', type=int, help='Random seed of new models.(Default: None)', default=None)
+    parser.add_argument('--threshold', type=str, help='Threshold engine; exact or p2 (approximate).(Default: exact)',
+                        default="exact", choices=['exact', 'p2'])
+    parser.add_argument('--snapshot_interval', type=int,
+                        help='Seconds between background snapshots of the model.(Default: 600)', default=600)
+    parser.add_argument('--backlog', action='store_true',
+                        help='Read all ready input files at once and detect them as one block (catch-up mode).')
+    parser.add_argument('--backlog_rows', type=int, help='Rows read at once in backlog mode.(Default: unlimited)',
+                        default=None)
+    parser.add_argument('--backlog_seconds', type=float,
+                        help='Seconds spent reading files at once in backlog mode.(Default: unlimited)', default=None)
+    parser.add_argument('--chunk_rows', type=int,
+                        help='Rows read from an input file at once, for huge files.(Default: whole file)',
+                        default=None)
 
     args = parser.parse_args()
 
@@ -324,7 +605,12 @@ if __name__ == '__main__':
 
     mk.debug_info("Anomaly detector({}, {}) start running.".format(args.ip, args.svc))
 
-    # [*] NOTE: Global Queue
-    dstore = Queue(args.seq)
+    # [*] NOTE: Global input window
+    dstore = InputWindow(args.seq)
+    # [*]Write-ahead log; opened after the model is loaded.
+    wal = None
 
-    main(args.ip, args.svc, args.trees, args.leaves, args.seq, args.q)
+    main(args.ip, args.svc, args.trees, args.leaves, args.seq, args.q, engine=args.engine, workers=args.workers,
+         hash_index=args.hash_index, seed=args.seed, threshold_engine=args.threshold,
+         snapshot_interval=args.snapshot_interval, backlog=args.backlog, backlog_rows=args.backlog_rows,
+         backlog_seconds=args.backlog_seconds, chunk_rows=args.chunk_rows)
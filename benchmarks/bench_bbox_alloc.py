@@ -0,0 +1,135 @@
+"""
+@ File name: bench_bbox_alloc.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Temporary memory and latency of RCTree.insert_point / forget_point with the in-place bbox kernels, compared with the
+previous kernels (np.vstack per branch, a new bbox_hat per cut and a Python loop over the cut dimensions).
+The temporary memory of a call is its tracemalloc peak above the memory in use before the call; the median over
+all calls is reported, so the occasional resize of the leaves dict does not hide the kernels.
+Usage (from the repository root):
+    python3 -m benchmarks.bench_bbox_alloc --leaves 864 --seq 6
+"""
+import argparse
+import timeit
+import tracemalloc
+import numpy as np
+import utils.marker as marker
+
+from models.rrcf import RCTree
+
+
+class LegacyRCTree(RCTree):
+    """ RCTree with the bbox kernels as they were before they became allocation-free. """
+
+    def _tighten_bbox_upwards(self, node):
+        bbox = np.vstack([np.minimum(node.l.b[0, :], node.r.b[0, :]),
+                          np.maximum(node.l.b[-1, :], node.r.b[-1, :])])
+        node.b = bbox
+        node = node.u
+        while node:
+            lt = (bbox[0, :] < node.b[0, :])
+            gt = (bbox[-1, :] > node.b[-1, :])
+            lt_any = lt.any()
+            gt_any = gt.any()
+            if lt_any or gt_any:
+                if lt_any:
+                    node.b[0, :][lt] = bbox[0, :][lt]
+                if gt_any:
+                    node.b[-1, :][gt] = bbox[-1, :][gt]
+            else:
+                break
+            node = node.u
+
+    def _relax_bbox_upwards(self, node, point):
+        while node:
+            bbox = np.vstack([np.minimum(node.l.b[0, :], node.r.b[0, :]),
+                              np.maximum(node.l.b[-1, :], node.r.b[-1, :])])
+            if not ((node.b[0, :] == point) | (node.b[-1, :] == point)).any():
+                break
+            node.b[0, :] = bbox[0, :]
+            node.b[-1, :] = bbox[-1, :]
+            node = node.u
+
+    def _insert_point_cut(self, point, bbox):
+        bbox_hat = np.empty(bbox.shape)
+        bbox_hat[0, :] = np.minimum(bbox[0, :], point)
+        bbox_hat[-1, :] = np.maximum(bbox[-1, :], point)
+        b_span = bbox_hat[-1, :] - bbox_hat[0, :]
+        b_range = b_span.sum()
+        r = self.rng.uniform(0, b_range)
+        span_sum = np.cumsum(b_span)
+        cut_dimension = np.inf
+        for j in range(len(span_sum)):
+            if span_sum[j] >= r:
+                cut_dimension = j
+                break
+        if not np.isfinite(cut_dimension):
+            raise ValueError("Cut dimension is not finite.")
+        cut = bbox_hat[0, cut_dimension] + span_sum[cut_dimension] - r
+        return cut_dimension, cut
+
+
+def run(tree, points, leaves, traced):
+    """
+    Stream points through a tree (forget the oldest, insert the new one) and measure the calls after warm-up.
+    :param tree: An RCTree object.
+    :param points: A Numpy array (n x d).
+    :param leaves: An integer. Window size; the first `leaves` points are the warm-up.
+    :param traced: A Boolean. Measure temporary memory with tracemalloc instead of time.
+    :return:
+        A Tuple (insert, forget). Median bytes (traced) or mean seconds per call.
+    """
+    insert_bytes = []
+    forget_bytes = []
+    insert_total = 0.
+    forget_total = 0.
+    for index, point in enumerate(points):
+        if index < leaves:
+            tree.insert_point(point, index)
+            continue
+        if traced:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            tree.forget_point(index - leaves)
+            forget_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            tree.insert_point(point, index)
+            insert_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+        else:
+            stime = timeit.default_timer()
+            tree.forget_point(index - leaves)
+            forget_total += timeit.default_timer() - stime
+            stime = timeit.default_timer()
+            tree.insert_point(point, index)
+            insert_total += timeit.default_timer() - stime
+    if traced:
+        return np.median(insert_bytes), np.median(forget_bytes)
+    calls = len(points) - leaves
+    return insert_total / calls, forget_total / calls
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RCTree bbox kernel allocation benchmark.')
+    parser.add_argument('--leaves', type=int, help='Leaf size.(Default: 864)', default=864)
+    parser.add_argument('--seq', type=int, help='Shingle size; points have seq x 2 (UP/DN) dims.(Default: 6)',
+                        default=6)
+    parser.add_argument('--points', type=int, help='Measured points.(Default: 3000)', default=3000)
+    args = parser.parse_args()
+
+    data = np.random.RandomState(0).rand(args.leaves + args.points, args.seq * 2)
+
+    tracemalloc.start()
+    for name, tree_class in (('legacy', LegacyRCTree), ('in-place', RCTree)):
+        insert_bytes, forget_bytes = run(tree_class(random_state=0), data, args.leaves, traced=True)
+        marker.debug_info("{:>8} kernels: temporary memory insert_point {:.0f} B/call, forget_point {:.0f} B/call"
+                          .format(name, insert_bytes, forget_bytes))
+    tracemalloc.stop()
+
+    for name, tree_class in (('legacy', LegacyRCTree), ('in-place', RCTree)):
+        insert_time, forget_time = run(tree_class(random_state=0), data, args.leaves, traced=False)
+        marker.debug_info("{:>8} kernels: insert_point {:.1f} us/call, forget_point {:.1f} us/call"
+                          .format(name, insert_time * 1e6, forget_time * 1e6))
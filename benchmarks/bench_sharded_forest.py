@@ -0,0 +1,59 @@
+"""
+@ File name: bench_sharded_forest.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Per-point latency of the sharded forest by number of workers.
+Usage (from the repository root):
+    python3 -m benchmarks.bench_sharded_forest --trees 320 --workers 1,2,4,8
+"""
+import argparse
+import timeit
+import numpy as np
+import utils.marker as marker
+
+from models.rcforest import RCForest
+from models.sharded_forest import ShardedForest
+
+
+def run(forest, points, leaves, warmup):
+    """
+    Stream points through the forest and return the mean latency of the points after warm-up.
+    :param forest: An RCForest or ShardedForest object.
+    :param points: A Numpy array (n x d).
+    :param leaves: An integer. Window size.
+    :param warmup: An integer. Points streamed before timing starts.
+    :return:
+        A float. Mean seconds per point.
+    """
+    stime = None
+    for index, point in enumerate(points):
+        if index == warmup:
+            stime = timeit.default_timer()
+        forget = index - leaves if index >= leaves else None
+        forest.update(point, index, forget=forget)
+    return (timeit.default_timer() - stime) / (len(points) - warmup)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sharded forest benchmark.')
+    parser.add_argument('--trees', type=int, help='Number of trees.(Default: 320)', default=320)
+    parser.add_argument('--leaves', type=int, help='Leaf size.(Default: 864)', default=864)
+    parser.add_argument('--dim', type=int, help='Point dimension.(Default: 12)', default=12)
+    parser.add_argument('--points', type=int, help='Timed points.(Default: 500)', default=500)
+    parser.add_argument('--workers', type=str, help='Comma separated worker counts.(Default: 1,2,4)', default='1,2,4')
+    args = parser.parse_args()
+
+    data = np.random.RandomState(0).rand(args.leaves + args.points, args.dim)
+
+    base = run(RCForest(args.trees, args.leaves, random_state=0), data, args.leaves, args.leaves)
+    marker.debug_info("RCForest (1 process): {:.3f} ms/point".format(base * 1000))
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        forest = ShardedForest(args.trees, args.leaves, workers=workers, random_state=0)
+        latency = run(forest, data, args.leaves, args.leaves)
+        forest.close()
+        marker.debug_info("ShardedForest ({} workers): {:.3f} ms/point, speedup x{:.2f}".format(
+            workers, latency * 1000, base / latency))
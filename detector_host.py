@@ -0,0 +1,457 @@
+"""
+@ File name: detector_host.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Host mode of anomaly_detection: one process serves many (PGW_IP, SVC_TYPE) detectors instead of one process each.
+Every detector keeps its own input window (dstore), instance checkpoint and `.detector.run` marker, so
+output_handler and stop.py work as with separate processes.
+Only the most recently used detectors are kept in memory (--max_models, --memory_budget); the others are saved to
+their instance directory and loaded again on their next input file. The input rows of every detector are logged
+ahead (utils.wal) and replayed on its next load if the host was killed before saving it.
+Usage:
+    python3 detector_host.py --pair 10.0.0.1:1 --pair 10.0.0.1:2
+    python3 detector_host.py --discover --memory_budget 4096
+"""
+import os
+import glob
+import timeit
+import logging
+import argparse
+import traceback
+import numpy as np
+import config.file_path as file_path
+import utils.marker as mk
+import anomaly_detection as ad
+
+from datetime import datetime, timedelta
+from models.anomaly_detector import AnomalyDetector
+from models.registry import DetectorRegistry, estimate_nbytes
+from utils.queue import InputWindow
+from utils.logger import FileLogger, StreamLogger
+from utils.graceful_killer import GracefulKiller
+from utils.wal import WriteAheadLog
+from utils.watcher import Watcher
+
+SLOG_LEVEL = "INFO"
+
+
+class PairLogger(logging.LoggerAdapter):
+    """
+    Host logger that prefixes the messages of one detector with its (ip, svc).
+    """
+
+    def process(self, msg, kwargs):
+        return "[{}:{}] {}".format(self.extra['ip'], self.extra['svc'], msg), kwargs
+
+
+class Tenant(object):
+    def __init__(self, ip, svc):
+        """ One (ip, svc) pair served by the host. The detector and its input window live in the registry.
+
+        Args:
+            :param ip: A String. P-gateway address.
+            :param svc: A String. Service Type.
+        """
+        self.ip = ip
+        self.svc = svc
+        self.input_dir = file_path.input_dir(ip, svc)
+        self.output_dir = file_path.output_dir(ip, svc)
+        self.instance_dir = file_path.instant_dir(ip, svc)
+        self.run_file = file_path.run_dir() + "{}_{}.detector.run".format(ip, svc)
+        self.wal = WriteAheadLog(self.instance_dir)
+        # [*]Rows applied since the last checkpoint.
+        self.dirty = False
+        self.last_save = timeit.default_timer()
+
+    def __repr__(self):
+        return "Tenant({}:{}, dirty={})".format(self.ip, self.svc, self.dirty)
+
+
+class DetectorHost(object):
+    def __init__(self, t, l, seq, q, engine='object', workers=None, hash_index=False, seed=None,
+                 threshold_engine='exact', save_interval=600, max_models=None, memory_budget=None, backlog=False,
+                 backlog_rows=None, backlog_seconds=None, chunk_rows=None):
+        """ Runs many anomaly detectors in one process.
+
+        Args:
+            :param t: An Integer. Number of trees of new detectors.
+            :param l: An Integer. Leaf size of new detectors.
+            :param seq: An Integer. Sequences of new detectors.
+            :param q: A Float. Quantile of new detectors.
+            :param engine: A String. Tree engine of new detectors.
+            :param workers: An Integer. Worker processes of the sharded engine.
+            :param hash_index: A Boolean. Hash index for duplicate points of new detectors.
+            :param seed: An Integer. Random seed of new detectors.
+            :param threshold_engine: A String. Threshold engine of new detectors; exact or p2.
+            :param save_interval: An Integer. Seconds between checkpoints of a detector that received data.
+            :param max_models: An Integer. Detectors kept in memory. Unlimited if None.
+            :param memory_budget: An Integer. Estimated bytes of the detectors kept in memory. Unlimited if None.
+            :param backlog: A Boolean. Read all ready input files of a detector at once (see data_loader).
+            :param backlog_rows: An Integer. Row budget of one backlog read.
+            :param backlog_seconds: A Float. Time budget of one backlog read.
+            :param chunk_rows: An Integer. Rows read from an input file at once. The whole file if None.
+        """
+        self.params = {'num_trees': t, 'leaves_size': l, 'sequences': seq, 'quantile': q, 'engine': engine,
+                       'workers': workers, 'hash_index': hash_index, 'random_state': seed,
+                       'threshold_engine': threshold_engine}
+        self.loader = {'backlog': backlog, 'max_rows': backlog_rows, 'max_seconds': backlog_seconds,
+                       'chunk_rows': chunk_rows}
+        self.save_interval = save_interval
+        self.tenants = {}
+        # [*](detector, dstore) of the recently used pairs.
+        self.registry = DetectorRegistry(self._load, self._spill, capacity=max_models, memory_budget=memory_budget,
+                                         size_of=lambda state: estimate_nbytes(state[0]))
+        # [*]Wakes the host when an input file arrives. Pairs in _pending may have more files to read.
+        self.watcher = Watcher()
+        self._pending = set()
+
+    def attach(self, ip, svc):
+        """
+        Serve a pair and write its running marker. Its detector is loaded (or created) with its first data.
+        :param ip: A String. P-gateway address.
+        :param svc: A String. Service Type.
+        :return:
+            A Tenant object, or None if the pair is served by another process.
+        """
+        key = (ip, svc)
+        if key in self.tenants:
+            return self.tenants[key]
+
+        run_file = file_path.run_dir() + "{}_{}.detector.run".format(ip, svc)
+        if os.path.exists(run_file):
+            logger.warning("Anomaly detector of {}:{} is already running. It is not attached.".format(ip, svc))
+            return None
+
+        for directory in (file_path.input_dir(ip, svc), file_path.output_dir(ip, svc),
+                          file_path.instant_dir(ip, svc)):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        tenant = Tenant(ip, svc)
+        # [*]Input files whose first rows are in the log are read on after them.
+        ad.resume_streams(tenant.wal.offsets)
+        with open(run_file, "w") as out:
+            out.write(str(os.getpid()))
+        self.tenants[key] = tenant
+        self.watcher.watch(tenant.input_dir)
+        # [*]Files written before the watch are read on the next poll.
+        self._pending.add(key)
+        return tenant
+
+    def detach(self, key):
+        """
+        Checkpoint a detector and remove it from the host.
+        :param key: A Tuple. (ip, svc).
+        :return: None
+        """
+        tenant = self.tenants.pop(key)
+        self.watcher.unwatch(tenant.input_dir)
+        self._pending.discard(key)
+        try:
+            self.save(tenant)
+        finally:
+            self.registry.pop(key)
+            tenant.wal.close()
+            if os.path.exists(tenant.run_file):
+                os.remove(tenant.run_file)
+        logger.info("Anomaly Detector of {}:{} is detached.".format(tenant.ip, tenant.svc))
+
+    def save(self, tenant, state=None):
+        """
+        Checkpoint one detector, independently of the others, and drop its write-ahead log. Nothing is done if it has
+        no unsaved data.
+        :param tenant: A Tenant object.
+        :param state: A Tuple. (detector, dstore); the resident one if None.
+        :return: None
+        """
+        if state is None:
+            state = self.registry.peek((tenant.ip, tenant.svc))
+        if state is None or not tenant.dirty:
+            return
+        tenant.wal.snapshot(lambda path: ad.save_model(path, state[0], state[1]), background=False)
+        tenant.dirty = False
+        tenant.last_save = timeit.default_timer()
+        logger.debug("Model of {}:{} is saved.".format(tenant.ip, tenant.svc))
+
+    def _load(self, key):
+        """
+        Registry miss: load the detector of a pair from its instance directory, or create a new one, and replay the
+        rows logged after its last checkpoint.
+        """
+        ip, svc = key
+        tenant = self.tenants[key]
+        detector, dstore = ad.load_model(tenant.instance_dir)
+        if detector is None:
+            detector = AnomalyDetector(ip=ip, svc_type=svc, **self.params)
+            logger.info("Anomaly Detector of {}:{} successfully created.".format(ip, svc))
+        else:
+            logger.debug("Anomaly Detector of {}:{} successfully loaded.".format(ip, svc))
+        if dstore is None:
+            dstore = InputWindow(detector.rrcf.sequences)
+
+        replay = tenant.wal.pending()
+        if replay is not None:
+            ad.detection(detector, replay, None, dstore, logger, detector_logger)
+            tenant.dirty = True
+            logger.info("{} rows of the write-ahead log of {}:{} are replayed.".format(len(replay), ip, svc))
+        return detector, dstore
+
+    def _spill(self, key, state):
+        """
+        Registry eviction: save the detector if it has unsaved data and release it.
+        """
+        self.save(self.tenants[key], state)
+        logger.debug("Anomaly Detector of {}:{} is evicted. {}".format(key[0], key[1], self.registry))
+
+    def discover(self):
+        """
+        Attach every pair that has an input directory and no running detector.
+        :return: None
+        """
+        for input_dir in glob.glob(file_path.management_dir() + "/*/*/input/"):
+            ip, svc = input_dir.rstrip('/').split('/')[-3:-1]
+            if (ip, svc) not in self.tenants and not os.path.exists(
+                    file_path.run_dir() + "{}_{}.detector.run".format(ip, svc)):
+                self.attach(ip, svc)
+
+    def route(self, data, source=None, offsets=None):
+        """
+        Route input rows to the detectors by their (PGW_IP, SVC_TYPE) columns, keeping the order of the rows.
+        :param data: A Numpy array. Rows of [PGW_IP, DTmm, SVC_TYPE, UP, DN].
+        :param source: A Tuple. (ip, svc) of the input directory the rows were read from.
+        :param offsets: A Dictionary. Offsets of the input files the rows were read from (ad.stream_offsets); logged
+            by the detector of source.
+        :return: None
+        """
+        keys = [(row[0], row[2]) for row in data]
+        if offsets and source in self.tenants and source not in keys:
+            self.tenants[source].wal.append(data[:0], offsets=offsets)
+        for key in dict.fromkeys(keys):
+            tenant = self.tenants.get(key)
+            if tenant is None:
+                tenant = self.attach(*key)
+                if tenant is None:
+                    continue
+            rows = data[np.array([k == key for k in keys])]
+            try:
+                detector, dstore = self.registry.get(key)
+                # [*]Log the rows before they are applied.
+                tenant.wal.append(rows, offsets=offsets if key == source else None)
+                tenant.dirty = True
+                ad.detection(detector, rows, tenant.output_dir, dstore, logger,
+                             PairLogger(detector_logger, {'ip': tenant.ip, 'svc': tenant.svc}))
+                # [*]The detector grew; other detectors may have to leave memory.
+                self.registry.resize(key)
+            except Exception:
+                # [*]A failing detector is checkpointed and detached; the others keep running.
+                elogger.error("{}:{}\n{}".format(tenant.ip, tenant.svc, traceback.format_exc()))
+                self.detach(key)
+
+    def poll(self, ready=None):
+        """
+        Load the next input file of the detectors and run the detection.
+        :param ready: A Set. Input directories with a new file (see `wait`). Every detector is read if None.
+        :return:
+            An Integer. Number of loaded files.
+        """
+        loaded = 0
+        for key in list(self.tenants.keys()):
+            tenant = self.tenants[key]
+            if ready is not None and key not in self._pending and tenant.input_dir not in ready:
+                continue
+            data = ad.data_loader(tenant.input_dir, logger, **self.loader)
+            if data is None:
+                self._pending.discard(key)
+                continue
+            loaded += 1
+            # [*]One file (or chunk) is read per poll; more may be waiting.
+            self._pending.add(key)
+            self.route(data, source=key, offsets=ad.stream_offsets(tenant.input_dir))
+        return loaded
+
+    def wait(self, timeout):
+        """
+        Sleep until an input file of a detector arrives, or for timeout seconds. Returns at once if a detector may
+        still have files to read.
+        :param timeout: A Float. Seconds.
+        :return:
+            The input directories with a new file, or None if every detector has to be read (see Watcher.wait).
+        """
+        return self.watcher.wait(0 if self._pending else timeout)
+
+    def save_due(self):
+        """
+        Checkpoint the detectors that received data and were not saved for save_interval seconds.
+        :return: None
+        """
+        now = timeit.default_timer()
+        for tenant in list(self.tenants.values()):
+            if tenant.dirty and now - tenant.last_save >= self.save_interval:
+                self.save(tenant)
+        logger.debug("Registry: {}".format(self.registry.stats()))
+
+    def close(self):
+        """
+        Checkpoint and detach all detectors.
+        :return: None
+        """
+        for key in list(self.tenants.keys()):
+            try:
+                self.detach(key)
+            except Exception:
+                elogger.error(traceback.format_exc())
+        self.watcher.close()
+
+
+class Clean(GracefulKiller):
+    def exit_gracefully(self, signum, frame):
+        # [*]Process killed by command or Keyboard Interrupt. The main loop detaches the detectors.
+        slogger.info("detector host is end.")
+        self.kill_now = True
+
+
+def main(host, pairs, discover=False, discover_interval=60):
+    """
+    Work flow:
+        1) Attach the given pairs (and discovered ones).
+        2) While roof
+            2-1) Check logger's date.
+            2-2) Load the next input file of the detectors that got one, and route its rows.
+            2-3) Checkpoint detectors that are due.
+            2-4) Sleep until an input file arrives (at most 1 second).
+        3) Checkpoint and detach all detectors.
+
+    :param host: A DetectorHost object.
+    :param pairs: A List. (ip, svc) pairs to serve.
+    :param discover: A Boolean. Also serve every pair that has an input directory.
+    :param discover_interval: An Integer. Seconds between directory scans for new pairs.
+    :return: None.
+    """
+    global slogger, logger, elogger, detector_logger
+    global today, tomorrow
+
+    killer = Clean()
+
+    for ip, svc in pairs:
+        host.attach(ip, svc)
+    last_discover = None
+    ready = None
+
+    try:
+        while not killer.kill_now:
+            # [*]If Day pass by create a new log file.
+            today = datetime.now().date()
+            if today >= tomorrow:
+                tomorrow = today + timedelta(days=1)
+                logger = FileLogger('detector_host_info', log_path=file_path.log_dir() +
+                                    'detector_host_{}.log'.format(today), level=LOG_LEVEL).get_instance()
+                elogger = FileLogger('detector_host_error', log_path=file_path.log_dir() +
+                                     'detector_host_error_{}.log'.format(today), level='WARNING').get_instance()
+                detector_logger = FileLogger('detector_host_detector', log_path=file_path.log_dir() +
+                                             'detector_host_detector_{}.log'.format(today),
+                                             level=LOG_LEVEL).get_instance()
+
+            if discover and (last_discover is None or
+                             timeit.default_timer() - last_discover >= discover_interval):
+                host.discover()
+                last_discover = timeit.default_timer()
+
+            stime = timeit.default_timer()
+            loaded = host.poll(ready)
+            if loaded:
+                logger.info("Detection of {} files required time: {}".format(loaded, timeit.default_timer() - stime))
+                logger.info("Registry: {}".format(host.registry.stats()))
+            host.save_due()
+            ready = host.wait(1)
+    except Exception:
+        elogger.error(traceback.format_exc())
+        slogger.error("Detector host didn't work properly. Check your error log.")
+    finally:
+        host.close()
+
+
+def parse_pair(value):
+    ip, _, svc = value.rpartition(':')
+    if not ip or not svc:
+        raise argparse.ArgumentTypeError("Pair should be IP:SVC. We have \'{}\'".format(value))
+    return ip, svc
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CDR anomaly detection host of many detectors.')
+    parser.add_argument('--id', type=str, help='ID of ML processor', default="main")
+    parser.add_argument('--pair', type=parse_pair, action='append', default=[],
+                        help='IP:SVC pair to serve. Repeat for more pairs.')
+    parser.add_argument('--discover', action='store_true',
+                        help='Serve every pair that has an input directory and no running detector.')
+    parser.add_argument('--discover_interval', type=int, help='Seconds between scans for new pairs.(Default: 60)',
+                        default=60)
+    parser.add_argument('--save_interval', type=int,
+                        help='Seconds between checkpoints of a detector that got data.(Default: 600)', default=600)
+    parser.add_argument('--max_models', type=int, help='Detectors kept in memory.(Default: unlimited)', default=None)
+    parser.add_argument('--memory_budget', type=int,
+                        help='Estimated memory of the detectors kept in memory, in MB.(Default: unlimited)',
+                        default=None)
+    parser.add_argument('--backlog', action='store_true',
+                        help='Read all ready input files of a detector at once (catch-up mode).')
+    parser.add_argument('--backlog_rows', type=int, help='Rows read at once in backlog mode.(Default: unlimited)',
+                        default=None)
+    parser.add_argument('--backlog_seconds', type=float,
+                        help='Seconds spent reading files at once in backlog mode.(Default: unlimited)', default=None)
+    parser.add_argument('--chunk_rows', type=int,
+                        help='Rows read from an input file at once, for huge files.(Default: whole file)',
+                        default=None)
+
+    # [*]Hyper parameters of new detectors.
+    parser.add_argument('--trees', type=int, help='Number of trees.(Default:80)', default=80)
+    parser.add_argument('--seq', type=int, help='Sequences to observe.(Default: 6)', default=6)
+    parser.add_argument('--leaves', type=int, help='Leaf size to memorize.(Default: 864)', default=864)
+    parser.add_argument('--q', type=float, help='Quantile value.(Default: 0.99)', default=0.99)
+    parser.add_argument('--log', type=str, help='Set log level', default="INFO")
+    parser.add_argument('--engine', type=str, help='Tree engine; object, array, forest or sharded.(Default: object)',
+                        default="object", choices=['object', 'array', 'forest', 'sharded'])
+    parser.add_argument('--workers', type=int, help='Worker processes of the sharded engine.(Default: CPU count)',
+                        default=None)
+    parser.add_argument('--hash_index', action='store_true',
+                        help='Find duplicate points with a hash index instead of a tree query.')
+    parser.add_argument('--seed', type=int, help='Random seed of new models.(Default: None)', default=None)
+    parser.add_argument('--threshold', type=str, help='Threshold engine; exact or p2 (approximate).(Default: exact)',
+                        default="exact", choices=['exact', 'p2'])
+
+    args = parser.parse_args()
+
+    file_path.IDX = args.id
+    LOG_LEVEL = args.log
+
+    if not args.pair and not args.discover:
+        mk.debug_info("Give at least one --pair or --discover.", m_type="ERROR")
+        raise SystemExit
+
+    for directory in (file_path.log_dir(), file_path.run_dir(), file_path.final_output_path()):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    slogger = StreamLogger('detector_host_stream_logger', level=SLOG_LEVEL).get_instance()
+
+    # [*]Every day logging in different fie.
+    today = datetime.now().date()
+    tomorrow = today + timedelta(days=1)
+
+    logger = FileLogger('detector_host_info', log_path=file_path.log_dir() + 'detector_host_{}.log'.format(today),
+                        level=LOG_LEVEL).get_instance()
+    elogger = FileLogger('detector_host_error', log_path=file_path.log_dir() +
+                         'detector_host_error_{}.log'.format(today), level='WARNING').get_instance()
+    detector_logger = FileLogger('detector_host_detector', log_path=file_path.log_dir() +
+                                 'detector_host_detector_{}.log'.format(today), level=LOG_LEVEL).get_instance()
+
+    mk.debug_info("Detector host start running.")
+    main(DetectorHost(args.trees, args.leaves, args.seq, args.q, engine=args.engine, workers=args.workers,
+                      hash_index=args.hash_index, seed=args.seed, threshold_engine=args.threshold,
+                      save_interval=args.save_interval, max_models=args.max_models,
+                      memory_budget=args.memory_budget * 1024 * 1024 if args.memory_budget else None,
+                      backlog=args.backlog, backlog_rows=args.backlog_rows, backlog_seconds=args.backlog_seconds,
+                      chunk_rows=args.chunk_rows),
+         args.pair, discover=args.discover, discover_interval=args.discover_interval)
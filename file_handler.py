@@ -7,20 +7,23 @@
 """
 
 import pandas as pd
+import numpy as np
 import csv
 import glob
-import time
 import config.file_path as fp
 import os
 import traceback
 import timeit
 import utils.marker as mk
 import shutil
+import signal
 import argparse
+import multiprocessing as mp
 
 from datetime import datetime, timedelta
 from utils.logger import FileLogger
 from utils.graceful_killer import GracefulKiller
+from utils.watcher import Watcher
 
 
 class Clean(GracefulKiller):
@@ -32,61 +35,177 @@ class Clean(GracefulKiller):
         # raise SystemExit
 
 
-def file_handler(in_file):
+def partition(df):
     """
-    Read an original file and convert to trainable file. If finish converting, remove the original file.
-    :param in_file: A String. Input file path.
-    :return: None
+    Split the rows by (PGW_IP, SVC_TYPE) in one pass: a single sort, then slices between the group boundaries.
+    :param df: A DataFrame. Columns PGW_IP, DTmm, SVC_TYPE, UP, DN.
+    :return:
+        A List of (ip, svc, rows) tuples; rows are lists in DTmm order (file order for equal DTmm).
     """
-    df = pd.read_csv(in_file, delimiter='|', header=None, names=['PGW_IP', 'DTmm', 'SVC_TYPE', 'UP', 'DN'],
-                     dtype={
-                         "PGW_IP": str,
-                         "DTmm": str,
-                         "SVC_TYPE": str,
-                         "UP": float,
-                         "DN": float
-                     })
-
-    # Drop Empty Rows
-    elogger.warning("Empty filed data is occurred: \n{}".format(df[df.isnull().any(axis=1)]))
-    df = df.dropna()
-
-    ip_addr = df['PGW_IP'].unique().tolist()
-    svc_type = df['SVC_TYPE'].unique().tolist()
-
-    # NOTE: For every single IPs.
-    for ip in ip_addr:
-        # NOTE: For every single services.
-        for svc in svc_type:
-            output_path = fp.input_dir(ip, svc)
+    if df.empty:
+        return []
+    df = df.sort_values(['PGW_IP', 'SVC_TYPE', 'DTmm'], kind='stable')
+    keys = df[['PGW_IP', 'SVC_TYPE']].to_numpy()
+    rows = df.values.tolist()
+
+    # [*]Start of every group, and the end of the last one.
+    bounds = np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1
+    bounds = [0] + bounds.tolist() + [len(rows)]
+    return [(keys[start][0], keys[start][1], rows[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class PartitionBuffers(object):
+    def __init__(self, name, flush_rows=10000, max_rows=100000):
+        """ Append buffers of the (ip, svc) partitions of an original file read in chunks.
+
+        A buffer is appended to its partition file when it holds flush_rows rows, and every buffer is when they
+        hold max_rows rows together, so memory stays bounded whatever the file size. The markers (.INFO) are
+        written once the whole original file is partitioned (see `publish`).
+
+        Args:
+            :param name: A String. File name of the partition files.
+            :param flush_rows: An Integer. Rows buffered per partition before they are written.
+            :param max_rows: An Integer. Rows buffered over all partitions before they are written.
+        """
+        self.name = name
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.rows = 0
+        self._buffers = {}
+        # [*](ip, svc) -> [output path, last DTmm written, rows written in DTmm order].
+        self._files = {}
+        # [*]Partition files read back and sorted by `close`; 0 when the original file is in time order.
+        self.resorted = 0
+
+    def __repr__(self):
+        return "PartitionBuffers(partitions={}, buffered={}, resorted={})".format(len(self._files), self.rows,
+                                                                                  self.resorted)
+
+    def add(self, df):
+        """
+        Route the rows of a chunk to their partition buffers.
+        :param df: A DataFrame. Columns PGW_IP, DTmm, SVC_TYPE, UP, DN.
+        :return: None
+        """
+        for ip, svc, selected in partition(df):
+            buffer = self._buffers.setdefault((ip, svc), [])
+            buffer.extend(selected)
+            self.rows += len(selected)
+            if len(buffer) >= self.flush_rows:
+                self.flush((ip, svc))
+        if self.rows >= self.max_rows:
+            for key in list(self._buffers.keys()):
+                self.flush(key)
+
+    def flush(self, key):
+        """
+        Append the buffered rows of a partition to its file, in DTmm order.
+        :param key: A Tuple. (ip, svc).
+        :return: None
+        """
+        selected = self._buffers.pop(key)
+        self.rows -= len(selected)
+        # [*]Chunks are sorted one by one; rows of equal DTmm keep their file order.
+        selected.sort(key=lambda row: row[1])
+        if key not in self._files:
+            output_path = fp.input_dir(*key)
+            # [*]Other workers may create it meanwhile.
+            os.makedirs(output_path, exist_ok=True)
+            self._files[key] = [output_path + self.name, selected[0][1], True]
+        state = self._files[key]
+        if selected[0][1] < state[1]:
+            # [*]Older rows than the ones written; the file is sorted by `close`.
+            state[2] = False
+        state[1] = max(state[1], selected[-1][1])
+
+        with open(state[0], 'a') as out:
+            writer = csv.writer(out, delimiter='|')
+            writer.writerows(selected)
+        logger.debug("{} :: {} rows are appended to {}".format(key[1], len(selected), state[0]))
+
+    def close(self):
+        """
+        Write the remaining rows.
+        :return:
+            A List. Paths of the partition files.
+        """
+        for key in list(self._buffers.keys()):
+            self.flush(key)
+        for output_path, _, ordered in self._files.values():
+            if not ordered:
+                # [*]Only this partition is read back (rows of the original file were not in time order).
+                with open(output_path) as file:
+                    lines = file.readlines()
+                lines.sort(key=lambda line: line.split('|')[1])
+                with open(output_path, 'w') as out:
+                    out.writelines(lines)
+                self.resorted += 1
+                logger.info("Partition file is sorted: {}".format(output_path))
 
-            # NOTE: If output path doesn't exist, create one.
-            if not os.path.exists(output_path):
-                os.makedirs(output_path)
+            # [*]Log
+            logger.info("Successfully write the file: {}".format(output_path))
+        return [state[0] for state in self._files.values()]
 
-            selected = df.loc[(df['PGW_IP'] == ip) & (df['SVC_TYPE'] == svc)]
 
-            selected = selected.sort_values(['DTmm']).reset_index(drop=True)
-            selected = selected.values.tolist()
+def read_original(in_file, chunk_rows=None):
+    """
+    Read an original file.
+    :param in_file: A String. Input file path.
+    :param chunk_rows: An Integer. Rows per chunk. The whole file if None.
+    :return:
+        - A DataFrame, if chunk_rows is None.
+        - A chunk reader (iterator of DataFrames) otherwise.
+    """
+    return pd.read_csv(in_file, delimiter='|', header=None, names=['PGW_IP', 'DTmm', 'SVC_TYPE', 'UP', 'DN'],
+                       dtype={
+                           "PGW_IP": str,
+                           "DTmm": str,
+                           "SVC_TYPE": str,
+                           "UP": float,
+                           "DN": float
+                       }, chunksize=chunk_rows)
 
-            if len(selected) > 0:
-                # [*]Output file path
-                output_path = output_path + '{}.DAT'.format(datetime.now())
 
-                with open(output_path, 'w') as out:
-                    writer = csv.writer(out, delimiter='|')
-                    for s in selected:
-                        writer.writerow(s)
+def drop_empty(df):
+    """
+    Drop (and log) the rows with an empty field.
+    :param df: A DataFrame.
+    :return:
+        A DataFrame.
+    """
+    empty = df.isnull().any(axis=1)
+    if empty.any():
+        elogger.warning("Empty filed data is occurred: \n{}".format(df[empty]))
+    return df[~empty]
 
-                with open(output_path + ".INFO", "w") as out:
-                    out.write("")
 
-                # [*]Log
-                logger.info("Successfully write the file: {}".format(output_path))
-                logger.debug("Successfully write the info file: {}".format(output_path + ".INFO"))
-                logger.debug("{} :: {}".format(svc, selected))
-            else:
-                logger.info("Service type doesn't have any data: {}".format(svc))
+def file_handler(in_file, name=None, chunk_rows=None, flush_rows=10000, markers=True):
+    """
+    Read an original file and convert to trainable file. If finish converting, remove the original file.
+    With chunk_rows the file is streamed: chunk_rows rows are read at a time and routed to PartitionBuffers, so
+    the memory doesn't grow with the file.
+    :param in_file: A String. Input file path.
+    :param name: A String. File name of the partition files. '<now>.DAT' if None.
+    :param chunk_rows: An Integer. Rows read at once. The whole file if None.
+    :param flush_rows: An Integer. Rows buffered per (ip, svc) before they are written, with chunk_rows.
+    :param markers: A Boolean. Write the markers (.INFO) of the partition files. If False, the caller publishes
+        them (see `publish`).
+    :return:
+        A List. Paths of the partition files.
+    """
+    if name is None:
+        name = '{}.DAT'.format(datetime.now())
+    if chunk_rows is not None:
+        buffers = PartitionBuffers(name, flush_rows=flush_rows, max_rows=chunk_rows)
+        with read_original(in_file, chunk_rows) as reader:
+            for chunk in reader:
+                buffers.add(drop_empty(chunk))
+        paths = buffers.close()
+        logger.debug("Partitioned: {}".format(buffers))
+    else:
+        paths = _write_partitions(drop_empty(read_original(in_file)), name)
+    if markers:
+        publish(paths)
 
     # [*]Log
     logger.info("Job is finished: {}".format(in_file))
@@ -99,16 +218,112 @@ def file_handler(in_file):
     # [*]If clearly finished, remove original file.
     os.remove(in_file)
     logger.debug("Files are deleted successfully: {}".format(in_file))
+    return paths
+
+
+def _write_partitions(df, name):
+    """
+    Write one partition file for every (ip, svc) pair of a whole original file.
+    :param df: A DataFrame. Columns PGW_IP, DTmm, SVC_TYPE, UP, DN.
+    :param name: A String. File name of the partition files.
+    :return:
+        A List. Paths of the partition files.
+    """
+    paths = []
+    # NOTE: Only the (ip, svc) pairs present in the file; each is written once.
+    for ip, svc, selected in partition(df):
+        output_path = fp.input_dir(ip, svc)
+
+        # NOTE: If output path doesn't exist, create one (other workers may create it meanwhile).
+        os.makedirs(output_path, exist_ok=True)
+
+        # [*]Output file path
+        output_path = output_path + name
+
+        with open(output_path, 'w') as out:
+            writer = csv.writer(out, delimiter='|')
+            writer.writerows(selected)
+        paths.append(output_path)
+
+        # [*]Log
+        logger.info("Successfully write the file: {}".format(output_path))
+        logger.debug("{} :: {}".format(svc, selected))
+    return paths
+
+
+def publish(paths):
+    """
+    Write the markers (.INFO) of partition files; a detector reads a partition file once its marker exists.
+    :param paths: A List. Paths of the partition files.
+    :return: None
+    """
+    for path in paths:
+        with open(path + ".INFO", "w") as out:
+            out.write("")
+        logger.debug("Successfully write the info file: {}".format(path + ".INFO"))
+
+
+def _init_worker():
+    # [*]Signals are handled by the main process, which finishes the files being converted before it exits.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _convert(job):
+    """
+    file_handler in a worker process; the markers are published by the main process.
+    :param job: A Tuple. (input file path, file name of the partition files, chunk_rows, flush_rows).
+    :return:
+        A List. Paths of the partition files.
+    """
+    in_file, name, chunk_rows, flush_rows = job
+    return file_handler(in_file, name=name, chunk_rows=chunk_rows, flush_rows=flush_rows, markers=False)
+
+
+def convert_files(files, workers=1, chunk_rows=None, flush_rows=10000):
+    """
+    Convert original files, in parallel with workers > 1.
+    The partition files of the n-th file are named '<start time>-<n>.DAT', so the files of a (ip, svc) pair sort
+    in the order of their original files whichever worker finishes first. Their markers are published in that
+    order as well, so a detector never sees a file before the ones preceding it.
+    :param files: A List. Input file paths, in order.
+    :param workers: An Integer. Worker processes.
+    :param chunk_rows: An Integer. Rows read at once (see file_handler). The whole file if None.
+    :param flush_rows: An Integer. Rows buffered per (ip, svc) before they are written, with chunk_rows.
+    :return: None
+    """
+    stamp = datetime.now()
+    jobs = [(f, '{}-{:06d}.DAT'.format(stamp, sequence), chunk_rows, flush_rows) for sequence, f in enumerate(files)]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            publish(_convert(job))
+        return
+
+    # [*]A pool per batch: the workers fork with the current (daily) loggers.
+    with mp.get_context('fork').Pool(min(workers, len(jobs)), initializer=_init_worker) as pool:
+        # [*]Results in the order of the files.
+        for paths in pool.imap(_convert, jobs):
+            publish(paths)
 
 
 def main():
     global today, tomorrow
     global logger, elogger
     global LOG_LEVEL, ID
+    global CHUNK_ROWS, FLUSH_ROWS, WORKERS
+
+    # [*]Wakes the loop when an original file arrives. None: the input directory has to be read.
+    watcher = Watcher()
+    watcher.watch(fp.original_input_path())
+    ready = None
 
     while not killer.kill_now:
+        # [*]Nothing is read (and no directory checked) while the watcher reports no new file.
+        idle = ready is not None and not ready
+
         # [*]If file doesn't exist, make one.
-        directory_check()
+        if not idle:
+            directory_check()
         # [*]If Day pass by create a new log file.
         today = datetime.now().date()
         if today >= tomorrow:
@@ -123,7 +338,7 @@ def main():
 
         try:
             # [*]File read & check
-            info_list = glob.glob(fp.original_input_path() + '*.INFO')
+            info_list = [] if idle else glob.glob(fp.original_input_path() + '*.INFO')
             if info_list:
                 logger.debug("Info files: {}".format(info_list))
                 stime = timeit.default_timer()
@@ -135,8 +350,7 @@ def main():
                 file = sorted(file)
                 logger.debug("Loaded files: {}".format(file))
 
-                for f in file:
-                    file_handler(f)
+                convert_files(file, workers=WORKERS, chunk_rows=CHUNK_ROWS, flush_rows=FLUSH_ROWS)
 
                 for il in info_list:
                     # [*]If clearly finished, remove original file.
@@ -144,7 +358,8 @@ def main():
                 logger.debug("Info files are removed: {}".format(info_list))
                 etime = timeit.default_timer()
                 logger.info("Main job's running time: {}".format(etime-stime))
-            time.sleep(1)
+            # [*]Sleep until a .INFO file is created (at most 1 second).
+            ready = watcher.wait(1)
         except Exception:
             # [*]Log the errors.
             elogger.error(traceback.format_exc())
@@ -184,10 +399,21 @@ if __name__ == '__main__':
 
     # [*]Hyper parameters.
     parser.add_argument('--log', type=str, help='Set the log level', default="INFO")
+    parser.add_argument('--chunk_rows', type=int,
+                        help='Stream original files, reading this many rows at once.(Default: whole file)',
+                        default=None)
+    parser.add_argument('--flush_rows', type=int,
+                        help='Rows buffered per (ip, svc) before they are written, when streaming.(Default: 10000)',
+                        default=10000)
+    parser.add_argument('--workers', type=int, help='Worker processes converting original files.(Default: 1)',
+                        default=1)
     args = parser.parse_args()
 
     fp.IDX = args.id
     LOG_LEVEL = args.log
+    CHUNK_ROWS = args.chunk_rows
+    FLUSH_ROWS = args.flush_rows
+    WORKERS = args.workers
 
     # [*]If file doesn't exist, make one.
     directory_check()
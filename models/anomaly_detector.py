@@ -9,7 +9,10 @@
 import json
 import csv
 import os
+import numpy as np
 import config.file_path as fp
+import models.shingle as shingle
+import models.threshold as threshold
 
 from models.rrcf_cls import RRCF
 from utils.queue import Queue
@@ -27,7 +30,8 @@ class AnomalyDetector(object):
         4) Writing a result in file.
     """
 
-    def __init__(self, num_trees, leaves_size, sequences, quantile=0.99, ip='Unknown', svc_type='Unknown'):
+    def __init__(self, num_trees, leaves_size, sequences, quantile=0.99, ip='Unknown', svc_type='Unknown',
+                 engine='object', workers=None, hash_index=False, random_state=None, threshold_engine='exact'):
         """
         Initialize the rrcf module, maximum threshold duration, and quantile value.
         :param num_trees: An integer. The number of trees.
@@ -36,9 +40,15 @@ class AnomalyDetector(object):
         :param quantile: An float. Quantile value.
         :param ip: A String. IP address of p-gateway.
         :param svc_type: A String. Service type.
+        :param engine: A String. Tree engine of the RRCF model.
+        :param workers: An integer. Worker processes of the 'sharded' engine.
+        :param hash_index: A Boolean. Hash index for duplicate points of the per-tree engines.
+        :param random_state: An integer. Seed of the RRCF model. Not reproducible if None.
+        :param threshold_engine: A String. Streaming quantile of the threshold, one of threshold.THRESHOLD_ENGINES.
         """
         # [*]Create RRCF realtime detection object.
-        self.rrcf = RRCF(num_trees, sequences, leaves_size)
+        self.rrcf = RRCF(num_trees, sequences, leaves_size, engine=engine, workers=workers,
+                         hash_index=hash_index, random_state=random_state)
         # [*]Update duration of threshold value.
         self.max_threshold_duration = sequences * 24 * 60 * 30  # 30 days sequences = (24 hours * 60 minutes * 30 days)
         # [*]Collecting anomaly scores
@@ -47,11 +57,22 @@ class AnomalyDetector(object):
         self.aq = AnomayQueue(sequences)
         # [*]Sensitiveness of anomaly score.
         self.quantile = quantile
+        # [*]Quantile of the scores the threshold is computed from (always a prefix of anomaly_score).
+        self.threshold_engine = threshold.make_engine(threshold_engine, quantile)
 
         # [*]For writing file.
         self.ip = ip
         self.svc_type = svc_type
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'threshold_engine' not in state:
+            # [*]Detectors pickled before threshold engines: rebuild from the scores. Past the growing phase the
+            #    content only matters at the next rollover, which resets it anyway.
+            self.threshold_engine = threshold.make_engine('exact', self.quantile)
+            self.threshold_engine.reset(
+                item[1] for item in self.anomaly_score[:min(len(self.anomaly_score), self.max_threshold_duration - 1)])
+
     def compute_anomaly_score(self, date, data, output_path, dlogger):
         """
         Calculate anomaly score, calculate threshold, and determine anomaly.
@@ -71,41 +92,108 @@ class AnomalyDetector(object):
         # [*]Determine anomaly.
         output_result = self._determine_anomaly()
 
-        if output_result['percentage'] == 'observing':
-            final_result = [self.ip, date[-1], self.svc_type, data[-1][0], data[-1][1],
-                            output_result['score'], output_result['estimate']]
-        elif output_result['percentage'] == 'Normal':
-            final_result = [self.ip, date[-1], self.svc_type, data[-1][0], data[-1][1],
-                            output_result['score'], output_result['estimate']]
-        else:
-            final_result = [self.ip, date[-1], self.svc_type, data[-1][0], data[-1][1],
-                            output_result['score'], output_result['estimate'], output_result['percentage'][-1]]
-
         # [*]log the result
         dlogger.info(output_result)
 
         # [*]Write the result in a file.
+        self._write_results(output_path, [self._result_row(date[-1], data[-1], output_result)], dlogger)
+
+    def compute_anomaly_scores(self, dates, data, output_path, dlogger):
+        """
+        Batch version of compute_anomaly_score for a block of consecutive rows (e.g. a backlog after an outage).
+        Every window of `sequences` rows is scored in order, with the same thresholds and decisions as calling
+        compute_anomaly_score for each window, and all results are written in one file.
+        :param dates: A numpy array. Date and time of each row.
+        :param data: A numpy array (n x d). Consecutive rows; the first window ends at row `sequences`.
+        :param output_path: A String. The path of output result. If None, only the state is updated (replay of
+            rows whose results were already written).
+        :return:
+            An Integer. The number of scored windows.
+        """
+        points = shingle.shingle_view(np.asarray(data, dtype=np.float64), self.rrcf.sequences, flat=True)
+        last_rows = data[self.rrcf.sequences - 1:]
+        last_dates = np.asarray(dates).tolist()[self.rrcf.sequences - 1:]
+
+        # [*]Scores of the whole block; the trees are updated in one loop.
+        scores = self.rrcf.anomaly_score_batch(last_dates, points, with_date=True)
+
+        # [*]The threshold and the anomaly queue still advance per window, since each decision depends on them.
+        self._check_anomaly_score_dir()
+        rows = []
+        output_results = []
+        for (date, score), row in zip(scores, last_rows):
+            self.anomaly_score.append([date, score])
+            self._update_threshold()
+            output_result = self._determine_anomaly()
+            output_results.append(output_result)
+            rows.append(self._result_row(date, row, output_result))
+        if output_path is None:
+            return len(rows)
+
+        # [*]log the results
+        dlogger.info("\n".join(str(output_result) for output_result in output_results))
+
+        # [*]Write the results in a file.
+        self._write_results(output_path, rows, dlogger)
+        return len(rows)
+
+    def _result_row(self, date, row, output_result):
+        """
+        Output line of one window.
+        :param date: A String. Date and time of the last row of the window.
+        :param row: A numpy array. The last row of the window (UP, DN).
+        :param output_result: A Dictionary. Result of _determine_anomaly.
+        :return:
+            A List.
+        """
+        if output_result['percentage'] == 'observing':
+            return [self.ip, date, self.svc_type, row[0], row[1],
+                    output_result['score'], output_result['estimate']]
+        elif output_result['percentage'] == 'Normal':
+            return [self.ip, date, self.svc_type, row[0], row[1],
+                    output_result['score'], output_result['estimate']]
+        else:
+            return [self.ip, date, self.svc_type, row[0], row[1],
+                    output_result['score'], output_result['estimate'], output_result['percentage'][-1]]
+
+    def _write_results(self, output_path, rows, dlogger):
+        """
+        Write result lines and the .INFO file that marks them complete.
+        :param output_path: A String. The path of output result.
+        :param rows: A List. Lines of _result_row.
+        :return: None
+        """
         with open(output_path, 'w') as file:
             csv_writer = csv.writer(file, delimiter='|')
-            csv_writer.writerow(final_result)
+            csv_writer.writerows(rows)
             dlogger.debug("{} is written successfully.".format(output_path))
 
         with open(output_path + ".INFO", 'w') as file:
             file.write("")
             dlogger.debug("{} is written successfully.".format(output_path+".INFO"))
 
+    def _check_anomaly_score_dir(self):
+        # [*] Make anomaly directory if doesn't exist.
+        if not os.path.exists(fp.anomaly_score_dir(self.ip, self.svc_type)):
+            os.makedirs(fp.anomaly_score_dir(self.ip, self.svc_type))
+
     def _calculate_threshold(self):
         """
         Calculate threshold and update in this object.
         :return: None
         """
-        # [*] Make anomaly directory if doesn't exist.
-        if not os.path.exists(fp.anomaly_score_dir(self.ip, self.svc_type)):
-            os.makedirs(fp.anomaly_score_dir(self.ip, self.svc_type))
+        self._check_anomaly_score_dir()
+        self._update_threshold()
 
+    def _update_threshold(self):
+        """
+        Update the threshold with the last anomaly score, and archive the scores every 30 days.
+        :return: None
+        """
         if len(self.anomaly_score) < self.max_threshold_duration:
             # [*]If less than 30 days it will update threshold.
-            self.rrcf.threshold = self.rrcf.calc_threshold(self.anomaly_score, self.quantile, with_data=False)
+            self.threshold_engine.insert(self.anomaly_score[-1][1])
+            self.rrcf.threshold = self.threshold_engine.value()
 
         # [*]After 30 days, re-calculates threshold.
         if len(self.anomaly_score) >= (self.max_threshold_duration * 2):
@@ -118,7 +206,9 @@ class AnomalyDetector(object):
             with open(anomaly_score_path, 'w') as file:
                 json.dump(self.anomaly_score[:self.max_threshold_duration], file)
             self.anomaly_score = self.anomaly_score[self.max_threshold_duration:]
-            self.rrcf.threshold = self.rrcf.calc_threshold(self.anomaly_score, self.quantile, with_data=False)
+            # [*]Restart the quantile from the remaining scores (once per rollover).
+            self.threshold_engine.reset(item[1] for item in self.anomaly_score)
+            self.rrcf.threshold = self.threshold_engine.value()
 
     def _determine_anomaly(self):
         """
@@ -192,14 +282,11 @@ class AnomayQueue(Queue):
         super().__init__(size)
         self.active_mode = False
 
-    def clear(self):
-        self.indexList = []
-
     def anomaly_determination(self, base):
         anomaly_counter = 0
-        for item in self.indexList:
+        for item in self:
             if item[1] == 'anomaly':
                 anomaly_counter += 1
         p = round(anomaly_counter / base, 3)
-        percentage = [self.indexList[0][0], self.indexList[-1][0], p]
+        percentage = [self[0][0], self[-1][0], p]
         return percentage
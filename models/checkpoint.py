@@ -0,0 +1,530 @@
+"""
+@ File name: checkpoint.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Versioned flat-array checkpoints of detectors.
+
+A checkpoint is an uncompressed .npz file. Every tree, forest and queue is flattened into a few NumPy arrays, and the
+scalars and the layout of the object graph go into a JSON header stored in the '__header__' array. Nothing is
+pickled, so loading needs no per-node unpickling and `np.load(allow_pickle=False)` is enough.
+
+Supported objects: AnomalyDetector, RRCF, RCTree, ArrayRCTree, RCForest, ShardedForest and the input window
+(a utils.queue.InputWindow, or a Queue of [date, values] items of older versions).
+
+Usage:
+    checkpoint.save(INSTANCE_DIR + "model.npz", anomaly_detector)
+    anomaly_detector = checkpoint.load(INSTANCE_DIR + "model.npz")
+
+Convert existing pickles (from the repository root):
+    python3 -m models.checkpoint ../SVCTYPE_1/management/*/*/instance/*.pkl
+"""
+import argparse
+import json
+import os
+import dill
+import numpy as np
+import utils.marker as marker
+
+import models.rrcf as rrcf
+import models.rrcf_array as rrcf_array
+import models.threshold as threshold
+from models.anomaly_detector import AnomalyDetector, AnomayQueue
+from models.rcforest import RCForest
+from models.random_stream import RandomStream, BLOCK_SIZE
+from models.rrcf_cls import RRCF
+from models.sharded_forest import ShardedForest
+from utils.queue import Queue, InputWindow
+from utils.timer import CallTimer
+
+FORMAT = 'rrcf-checkpoint'
+# NOTE: Bump the version whenever the layout changes, and keep `load` able to read the older versions.
+#       1: initial layout.
+#       2: RandomStream generators and the seed sequence of RRCF.
+#       3: Threshold engine of AnomalyDetector.
+VERSION = 3
+
+
+def save(path, obj, compress=False):
+    """
+    Write an object into a checkpoint file. The file is replaced atomically.
+    :param path: A String. Checkpoint path (.npz).
+    :param obj: A supported object (see module docstring).
+    :param compress: A Boolean. Deflate the arrays. Smaller files, slower save and load.
+    :return: None
+    """
+    arrays = {}
+    header = {'format': FORMAT, 'version': VERSION, 'root': _pack(obj, arrays, '')}
+    arrays['__header__'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        if compress:
+            np.savez_compressed(file, **arrays)
+        else:
+            np.savez(file, **arrays)
+    os.replace(temp_path, path)
+
+
+def load(path):
+    """
+    Read an object from a checkpoint file.
+    :param path: A String. Checkpoint path (.npz).
+    :return: The restored object.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if '__header__' not in data.files:
+            raise ValueError("{} is not a checkpoint file.".format(path))
+        header = json.loads(data['__header__'].tobytes().decode('utf-8'))
+        if header.get('format') != FORMAT:
+            raise ValueError("{} is not a checkpoint file.".format(path))
+        if header['version'] > VERSION:
+            raise ValueError("Checkpoint version {} of {} is newer than supported version {}.".format(
+                header['version'], path, VERSION))
+        arrays = {name: data[name] for name in data.files}
+    return _unpack(header['root'], arrays, '')
+
+
+def convert(source, target=None, compress=False):
+    """
+    Convert a pickled model or input window (model.pkl, dstore.pkl) into a checkpoint.
+    :param source: A String. Pickle path.
+    :param target: A String. Checkpoint path. Defaults to the source path with an .npz extension.
+    :param compress: A Boolean. Deflate the arrays.
+    :return:
+        A String. Checkpoint path.
+    """
+    if target is None:
+        target = os.path.splitext(source)[0] + '.npz'
+    with open(source, 'rb') as file:
+        obj = dill.load(file)
+    save(target, obj, compress=compress)
+    return target
+
+
+def _key(prefix, name):
+    return prefix + '/' + name if prefix else name
+
+
+def _pack(obj, arrays, prefix):
+    """
+    Flatten an object into arrays (keys under prefix) and return its JSON meta data.
+    """
+    if obj is None:
+        return None
+    if isinstance(obj, list):
+        return _pack_list(obj, arrays, prefix)
+    try:
+        packer = _PACKERS[type(obj)]
+    except KeyError:
+        raise ValueError("Checkpoint doesn't support {} objects.".format(type(obj).__name__))
+    return packer(obj, arrays, prefix)
+
+
+def _unpack(meta, arrays, prefix):
+    if meta is None:
+        return None
+    try:
+        unpacker = _UNPACKERS[meta['type']]
+    except KeyError:
+        raise ValueError("Unknown checkpoint object type \'{}\'.".format(meta['type']))
+    return unpacker(meta, arrays, prefix)
+
+
+def _pack_list(items, arrays, prefix):
+    """
+    A list of objects (e.g. the trees of a forest) shares its arrays: field k of every item is concatenated into one
+    array, and '<field>#len' holds the length of each item's part (-1 if the item has no such field).
+    """
+    parts = []
+    metas = []
+    for item in items:
+        part = {}
+        metas.append(_pack(item, part, ''))
+        parts.append(part)
+    fields = sorted(set().union(*parts)) if parts else []
+    for field in fields:
+        present = [part[field] for part in parts if field in part]
+        arrays[_key(prefix, field)] = np.concatenate(present)
+        arrays[_key(prefix, field) + '#len'] = np.array(
+            [len(part[field]) if field in part else -1 for part in parts], dtype=np.int64)
+    return {'type': 'list', 'items': metas, 'fields': fields}
+
+
+def _unpack_list(meta, arrays, prefix):
+    parts = [{} for _ in meta['items']]
+    for field in meta['fields']:
+        data = arrays[_key(prefix, field)]
+        start = 0
+        for part, length in zip(parts, arrays[_key(prefix, field) + '#len'].tolist()):
+            if length >= 0:
+                part[field] = data[start:start + length]
+                start += length
+    return [_unpack(item, part, '') for item, part in zip(meta['items'], parts)]
+
+
+def _pack_rng(rng, arrays, prefix):
+    if isinstance(rng, RandomStream):
+        # NOTE: Only the unused part of the current block is stored.
+        bit_generator_state, block, pos = rng.get_state()
+        arrays[_key(prefix, 'rng')] = block[pos:]
+        return {'type': 'RandomStream', 'bit_generator': bit_generator_state, 'block_size': rng.block_size}
+    # NOTE: Trees without a seed share the global numpy generator, whose state is not part of the model.
+    if not isinstance(rng, np.random.RandomState):
+        return {'type': 'global'}
+    _, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    arrays[_key(prefix, 'rng')] = keys
+    return {'type': 'RandomState', 'pos': int(pos), 'has_gauss': int(has_gauss),
+            'cached_gaussian': float(cached_gaussian)}
+
+
+def _unpack_rng(meta, arrays, prefix):
+    if meta['type'] == 'global':
+        return np.random
+    if meta['type'] == 'RandomStream':
+        # NOTE: Streams of older versions (4096 variates per block) get the current, smaller block size; the unused
+        #       variates of their block are used first.
+        rng = RandomStream(block_size=min(meta['block_size'], BLOCK_SIZE))
+        rng.set_state((meta['bit_generator'], arrays[_key(prefix, 'rng')], 0))
+        return rng
+    rng = np.random.RandomState()
+    rng.set_state(('MT19937', arrays[_key(prefix, 'rng')], meta['pos'], meta['has_gauss'], meta['cached_gaussian']))
+    return rng
+
+
+def _labels(leaves):
+    """
+    Index labels of a leaves dict as an integer array.
+    """
+    labels = np.array(list(leaves), dtype=object)
+    if not all(isinstance(label, (int, np.integer)) for label in labels):
+        raise ValueError("Checkpoint supports integer leaf indexes only.")
+    return labels.astype(np.int64)
+
+
+def _pack_rctree(tree, arrays, prefix):
+    """
+    The Branch/Leaf graph is stored in preorder with the left child first, so the left child of a branch always
+    sits right after it and the parent array alone fixes the shape of the tree.
+    """
+    meta = {'type': 'RCTree', 'ndim': tree.ndim, 'rng': _pack_rng(tree.rng, arrays, prefix),
+            'hash_index': getattr(tree, '_point_index', None) is not None,
+            'hash_tolerance': getattr(tree, 'hash_tolerance', None)}
+    if tree.root is None:
+        return meta
+    nodes = []
+    slot_of = {}
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        slot_of[id(node)] = len(nodes)
+        nodes.append(node)
+        if isinstance(node, rrcf.Branch):
+            stack.append(node.r)
+            stack.append(node.l)
+    size = len(nodes)
+    parent = np.full(size, -1, dtype=np.int32)
+    cut_dim = np.full(size, -1, dtype=np.int32)
+    cut_val = np.zeros(size, dtype=np.float64)
+    count = np.empty(size, dtype=np.int64)
+    leaf_i = np.full(size, -1, dtype=np.int64)
+    bbox = np.empty((size, 2, tree.ndim), dtype=np.float64)
+    for slot, node in enumerate(nodes):
+        if node.u is not None:
+            parent[slot] = slot_of[id(node.u)]
+        count[slot] = node.n
+        if isinstance(node, rrcf.Branch):
+            cut_dim[slot] = node.q
+            cut_val[slot] = node.p
+            bbox[slot] = node.b
+        else:
+            leaf_i[slot] = node.i
+            bbox[slot] = node.x
+    arrays[_key(prefix, 'parent')] = parent
+    arrays[_key(prefix, 'cut_dim')] = cut_dim
+    arrays[_key(prefix, 'cut_val')] = cut_val
+    arrays[_key(prefix, 'count')] = count
+    arrays[_key(prefix, 'leaf_i')] = leaf_i
+    arrays[_key(prefix, 'bbox')] = bbox
+    arrays[_key(prefix, 'labels')] = _labels(tree.leaves)
+    arrays[_key(prefix, 'label_slot')] = np.array([slot_of[id(leaf)] for leaf in tree.leaves.values()],
+                                                  dtype=np.int32)
+    return meta
+
+
+def _unpack_rctree(meta, arrays, prefix):
+    tree = rrcf.RCTree(hash_index=meta['hash_index'], hash_tolerance=meta['hash_tolerance'])
+    tree.rng = _unpack_rng(meta['rng'], arrays, prefix)
+    tree.ndim = meta['ndim']
+    if _key(prefix, 'parent') not in arrays:
+        return tree
+    parent = arrays[_key(prefix, 'parent')].tolist()
+    cut_dim = arrays[_key(prefix, 'cut_dim')].tolist()
+    cut_val = arrays[_key(prefix, 'cut_val')].tolist()
+    count = arrays[_key(prefix, 'count')].tolist()
+    leaf_i = arrays[_key(prefix, 'leaf_i')].tolist()
+    bbox = arrays[_key(prefix, 'bbox')]
+    nodes = [None] * len(parent)
+    for slot, up_slot in enumerate(parent):
+        up = nodes[up_slot] if up_slot != -1 else None
+        if cut_dim[slot] == -1:
+            node = rrcf.Leaf(i=leaf_i[slot], u=up, x=bbox[slot, 0].copy(), n=count[slot])
+        else:
+            node = rrcf.Branch(q=cut_dim[slot], p=cut_val[slot], u=up, n=count[slot], b=bbox[slot].copy())
+        if up is None:
+            tree.root = node
+        elif up_slot + 1 == slot:
+            up.l = node
+        else:
+            up.r = node
+        nodes[slot] = node
+    labels = arrays[_key(prefix, 'labels')].tolist()
+    label_slot = arrays[_key(prefix, 'label_slot')].tolist()
+    tree.leaves = {label: nodes[slot] for label, slot in zip(labels, label_slot)}
+    if tree._point_index is not None:
+        for leaf in tree.leaves.values():
+            tree._point_index.setdefault(rrcf_array.point_key(leaf.x, tree.hash_tolerance), leaf)
+    return tree
+
+
+_ARRAY_TREE_FIELDS = ('parent', 'left', 'right', 'count', 'cut_dim', 'cut_val', 'bbox')
+
+
+def _pack_array_tree(tree, arrays, prefix):
+    meta = {'type': 'ArrayRCTree', 'ndim': tree.ndim, 'root': int(tree.root), 'capacity': tree.capacity,
+            'initial_capacity': tree._initial_capacity, 'rng': _pack_rng(tree.rng, arrays, prefix),
+            'hash_index': tree._point_index is not None, 'hash_tolerance': tree.hash_tolerance}
+    if tree.ndim is None:
+        return meta
+    for name in _ARRAY_TREE_FIELDS:
+        arrays[_key(prefix, name)] = getattr(tree, name)
+    arrays[_key(prefix, 'free')] = np.array(tree._free, dtype=np.int32)
+    arrays[_key(prefix, 'labels')] = _labels(tree.leaves)
+    arrays[_key(prefix, 'label_slot')] = np.array(list(tree.leaves.values()), dtype=np.int32)
+    return meta
+
+
+def _unpack_array_tree(meta, arrays, prefix):
+    tree = rrcf_array.ArrayRCTree(capacity=meta['initial_capacity'], hash_index=meta['hash_index'],
+                                  hash_tolerance=meta['hash_tolerance'])
+    tree.rng = _unpack_rng(meta['rng'], arrays, prefix)
+    if meta['ndim'] is None:
+        return tree
+    tree._allocate(meta['ndim'])
+    for name in _ARRAY_TREE_FIELDS:
+        setattr(tree, name, arrays[_key(prefix, name)].copy())
+    tree.capacity = meta['capacity']
+    tree.root = meta['root']
+    tree._free = arrays[_key(prefix, 'free')].tolist()
+    labels = arrays[_key(prefix, 'labels')].tolist()
+    tree.leaves = dict(zip(labels, arrays[_key(prefix, 'label_slot')].tolist()))
+    if tree._point_index is not None:
+        for slot in tree.leaves.values():
+            tree._point_index.setdefault(rrcf_array.point_key(tree.bbox[slot, 0], tree.hash_tolerance), slot)
+    return tree
+
+
+_FOREST_FIELDS = ('root', 'parent', 'left', 'right', 'count', 'cut_dim', 'cut_val', 'bbox', 'free', 'leaf_of')
+
+
+def _pack_forest(forest, arrays, prefix):
+    meta = {'type': 'RCForest', 'num_trees': forest.num_trees, 'leaves_size': forest.leaves_size,
+            'ndim': forest.ndim, 'rng': _pack_rng(forest.rng, arrays, prefix)}
+    if forest.ndim is None:
+        return meta
+    meta.update({'capacity': forest.capacity, 'free_top': forest.free_top})
+    for name in _FOREST_FIELDS:
+        arrays[_key(prefix, name)] = getattr(forest, name)
+    arrays[_key(prefix, 'free_keys')] = np.array(forest._free_keys, dtype=np.int64)
+    arrays[_key(prefix, 'labels')] = _labels(forest.leaves)
+    arrays[_key(prefix, 'label_key')] = np.array(list(forest.leaves.values()), dtype=np.int64)
+    return meta
+
+
+def _unpack_forest(meta, arrays, prefix):
+    forest = RCForest(meta['num_trees'], meta['leaves_size'])
+    forest.rng = _unpack_rng(meta['rng'], arrays, prefix)
+    if meta['ndim'] is None:
+        return forest
+    forest.ndim = meta['ndim']
+    forest.capacity = meta['capacity']
+    forest.free_top = meta['free_top']
+    for name in _FOREST_FIELDS:
+        setattr(forest, name, arrays[_key(prefix, name)].copy())
+    forest._free_keys = arrays[_key(prefix, 'free_keys')].tolist()
+    labels = arrays[_key(prefix, 'labels')].tolist()
+    forest.leaves = dict(zip(labels, arrays[_key(prefix, 'label_key')].tolist()))
+    forest._point_index = {}
+    for key in forest.leaves.values():
+        leaf = forest.leaf_of[:, key].astype(np.int64)
+        forest._point_index.setdefault(rrcf_array.point_key(forest.bbox[0, leaf[0], 0]), leaf)
+    return forest
+
+
+def _pack_sharded(forest, arrays, prefix):
+    arrays[_key(prefix, 'labels')] = _labels(forest.leaves)
+    return {'type': 'ShardedForest', 'num_trees': forest.num_trees, 'leaves_size': forest.leaves_size,
+            'workers': forest.workers, 'ndim': forest.ndim,
+            'shards': _pack_list(forest.shards(), arrays, _key(prefix, 'shards'))}
+
+
+def _unpack_sharded(meta, arrays, prefix):
+    # NOTE: Built without __init__, which would create empty shards; workers start on the first update.
+    forest = ShardedForest.__new__(ShardedForest)
+    forest.num_trees = meta['num_trees']
+    forest.leaves_size = meta['leaves_size']
+    forest.workers = meta['workers']
+    forest.ndim = meta['ndim']
+    forest.leaves = dict.fromkeys(arrays[_key(prefix, 'labels')].tolist())
+    forest.timer = CallTimer()
+    forest._shards = _unpack_list(meta['shards'], arrays, _key(prefix, 'shards'))
+    forest._procs = None
+    forest._failure = None
+    return forest
+
+
+def _pack_rrcf(model, arrays, prefix):
+    arrays[_key(prefix, 'index_queue')] = np.fromiter(model.index_queue, dtype=np.int64, count=len(model.index_queue))
+    threshold = None if model.threshold is None else float(model.threshold)
+    return {'type': 'RRCF', 'num_trees': model.num_trees, 'sequences': model.sequences,
+            'leaves_size': model.leaves_size, 'engine': model.engine, 'workers': model.workers,
+            'hash_index': model.hash_index, 'threshold': threshold, 'index_queue_size': model.index_queue.size,
+            'random_state': model.random_state, 'seed_sequence': _pack_seed_sequence(model._seed_sequence),
+            'forest': _pack(model.forest, arrays, _key(prefix, 'forest'))}
+
+
+def _pack_seed_sequence(seed_sequence):
+    entropy = seed_sequence.entropy
+    return {'entropy': entropy if isinstance(entropy, int) else list(entropy),
+            'spawn_key': list(seed_sequence.spawn_key), 'pool_size': seed_sequence.pool_size,
+            'n_children_spawned': seed_sequence.n_children_spawned}
+
+
+def _unpack_seed_sequence(meta):
+    return np.random.SeedSequence(meta['entropy'], spawn_key=meta['spawn_key'], pool_size=meta['pool_size'],
+                                  n_children_spawned=meta['n_children_spawned'])
+
+
+def _unpack_rrcf(meta, arrays, prefix):
+    model = RRCF(meta['num_trees'], meta['sequences'], meta['leaves_size'], engine=meta['engine'],
+                 workers=meta['workers'], hash_index=meta['hash_index'], random_state=meta.get('random_state'))
+    if meta.get('seed_sequence') is not None:
+        model._seed_sequence = _unpack_seed_sequence(meta['seed_sequence'])
+    model.threshold = meta['threshold']
+    model.index_queue = Queue(size=meta['index_queue_size'])
+    model.index_queue.indexList = arrays[_key(prefix, 'index_queue')].tolist()
+    model.forest = _unpack(meta['forest'], arrays, _key(prefix, 'forest'))
+    return model
+
+
+def _pack_detector(detector, arrays, prefix):
+    arrays[_key(prefix, 'score_date')] = np.array([item[0] for item in detector.anomaly_score], dtype=str)
+    arrays[_key(prefix, 'score')] = np.array([item[1] for item in detector.anomaly_score], dtype=np.float64)
+    arrays[_key(prefix, 'aq_date')] = np.array([item[0] for item in detector.aq], dtype=str)
+    arrays[_key(prefix, 'aq_anomaly')] = np.array([item[1] == 'anomaly' for item in detector.aq],
+                                                  dtype=bool)
+    return {'type': 'AnomalyDetector', 'max_threshold_duration': detector.max_threshold_duration,
+            'quantile': detector.quantile, 'ip': detector.ip, 'svc_type': detector.svc_type,
+            'aq_size': detector.aq.size, 'aq_active_mode': detector.aq.active_mode,
+            'threshold_engine': _pack_threshold_engine(detector.threshold_engine),
+            'rrcf': _pack_rrcf(detector.rrcf, arrays, _key(prefix, 'rrcf'))}
+
+
+def _unpack_detector(meta, arrays, prefix):
+    detector = AnomalyDetector.__new__(AnomalyDetector)
+    detector.rrcf = _unpack_rrcf(meta['rrcf'], arrays, _key(prefix, 'rrcf'))
+    detector.max_threshold_duration = meta['max_threshold_duration']
+    detector.anomaly_score = [[date, score] for date, score in zip(arrays[_key(prefix, 'score_date')].tolist(),
+                                                                   arrays[_key(prefix, 'score')].tolist())]
+    detector.aq = AnomayQueue(meta['aq_size'])
+    detector.aq.active_mode = meta['aq_active_mode']
+    detector.aq.indexList = [[date, 'anomaly' if anomaly else 'normal']
+                             for date, anomaly in zip(arrays[_key(prefix, 'aq_date')].tolist(),
+                                                      arrays[_key(prefix, 'aq_anomaly')].tolist())]
+    detector.quantile = meta['quantile']
+    detector.ip = meta['ip']
+    detector.svc_type = meta['svc_type']
+    detector.threshold_engine = _unpack_threshold_engine(meta.get('threshold_engine'), detector)
+    return detector
+
+
+def _pack_threshold_engine(engine):
+    """
+    An exact engine always holds a prefix of the detector's scores, so only its length is stored.
+    """
+    if isinstance(engine, threshold.P2Quantile):
+        return {'type': 'p2', 'count': engine.count, 'heights': [float(h) for h in engine.heights],
+                'positions': list(engine.positions), 'desired': list(engine.desired)}
+    return {'type': 'exact', 'count': len(engine)}
+
+
+def _unpack_threshold_engine(meta, detector):
+    scores = [item[1] for item in detector.anomaly_score]
+    if meta is None:
+        # NOTE: Checkpoints before version 3 used the exact quantile of the scores of the growing phase.
+        meta = {'type': 'exact', 'count': min(len(scores), detector.max_threshold_duration - 1)}
+    engine = threshold.make_engine(meta['type'], detector.quantile)
+    if meta['type'] == 'p2':
+        engine.count = meta['count']
+        engine.heights = meta['heights']
+        engine.positions = meta['positions']
+        engine.desired = meta['desired']
+    else:
+        engine.reset(scores[:meta['count']])
+    return engine
+
+
+def _pack_window(window, arrays, prefix):
+    """
+    The input window of anomaly_detection. Queues of [date, values] items (older versions) are stored the same way.
+    """
+    if isinstance(window, Queue):
+        window = InputWindow.from_queue(window)
+    dates, values = window.window()
+    arrays[_key(prefix, 'date')] = np.array(dates.tolist(), dtype=str)
+    arrays[_key(prefix, 'values')] = np.array(values, dtype=np.float64)
+    return {'type': 'Window', 'size': window.size, 'width': window.width}
+
+
+def _unpack_window(meta, arrays, prefix):
+    window = InputWindow(meta['size'], meta.get('width', 2))
+    dates = arrays[_key(prefix, 'date')]
+    if len(dates):
+        window.extend(np.array(dates.tolist(), dtype=object), arrays[_key(prefix, 'values')])
+    return window
+
+
+_PACKERS = {
+    rrcf.RCTree: _pack_rctree,
+    rrcf_array.ArrayRCTree: _pack_array_tree,
+    RCForest: _pack_forest,
+    ShardedForest: _pack_sharded,
+    RRCF: _pack_rrcf,
+    AnomalyDetector: _pack_detector,
+    Queue: _pack_window,
+    InputWindow: _pack_window,
+}
+
+_UNPACKERS = {
+    'list': _unpack_list,
+    'RCTree': _unpack_rctree,
+    'ArrayRCTree': _unpack_array_tree,
+    'RCForest': _unpack_forest,
+    'ShardedForest': _unpack_sharded,
+    'RRCF': _unpack_rrcf,
+    'AnomalyDetector': _unpack_detector,
+    'Window': _unpack_window,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert pickled models and input windows into checkpoints.')
+    parser.add_argument('pickles', type=str, nargs='+', help='model.pkl / dstore.pkl files to convert.')
+    parser.add_argument('--compress', action='store_true', help='Deflate the checkpoint arrays.')
+    args = parser.parse_args()
+
+    for pickle_path in args.pickles:
+        npz_path = convert(pickle_path, compress=args.compress)
+        marker.debug_info("{} ({} bytes) -> {} ({} bytes)".format(
+            pickle_path, os.path.getsize(pickle_path), npz_path, os.path.getsize(npz_path)))
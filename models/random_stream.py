@@ -0,0 +1,175 @@
+"""
+@ File name: random_stream.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+import numpy as np
+
+_SCALARS = (float, int, np.integer)
+# NOTE: Variates per block. Every tree has its own stream, so the block is kept small (about 8 KB).
+BLOCK_SIZE = 256
+
+
+class RandomStream(object):
+    """
+    Buffered random source for the cuts of trees and forests.
+
+    Uniform variates are drawn from a `numpy.random.Generator` in blocks of `block_size` and handed out one by one
+    (or a slice at a time), so a cut costs a list lookup instead of a NumPy call. It provides the subset of the
+    RandomState interface the trees use: `uniform`, `random_sample` and `choice`.
+
+    Parameters:
+    -----------
+    seed: int, SeedSequence or None (optional)
+          Seed of the generator. If None, fresh entropy is taken from the OS.
+    block_size: int (optional) (default=256)
+                Number of variates drawn per block.
+
+    Example:
+    --------
+    >>> rng = RandomStream(0)
+    >>> rng.uniform(0, 2.5)
+    >>> rng.choice(3, p=[0.2, 0.3, 0.5])
+    """
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE):
+        self.generator = np.random.default_rng(seed)
+        self.block_size = int(block_size)
+        # NOTE: The first draw finds the (empty) block used up and fills it.
+        self._values = []
+        self._pos = 0
+        self._end = 0
+
+    def __repr__(self):
+        return "RandomStream({}, block_size={})".format(type(self.generator.bit_generator).__name__,
+                                                        self.block_size)
+
+    def __getstate__(self):
+        # NOTE: The block is not pickled. The unused variates are given back by stepping a copy of the PCG64
+        #       generator back, so the unpickled stream draws them again; other generators keep their block.
+        state = self.__dict__.copy()
+        unused = self._end - self._pos
+        if unused and not isinstance(self.generator.bit_generator, np.random.PCG64):
+            return state
+        if unused:
+            bit_generator = np.random.PCG64()
+            bit_generator.state = self.generator.bit_generator.state
+            bit_generator.advance((1 << 128) - unused)
+            state['generator'] = np.random.Generator(bit_generator)
+        state['_values'] = []
+        state['_pos'] = 0
+        state['_end'] = 0
+        return state
+
+    def _refill(self):
+        """
+        Draw the next block.
+        """
+        self._values = self.generator.random(self.block_size).tolist()
+        self._pos = 0
+        self._end = self.block_size
+
+    def _take(self, size):
+        """
+        Returns the next `size` variates as a NumPy array.
+        """
+        # NOTE: The rest of the block is used before the next one is drawn, so the stream is the plain sequence of
+        #       the generator whatever the sizes drawn (see __getstate__).
+        values = self._values[self._pos:self._pos + size]
+        self._pos += len(values)
+        missing = size - len(values)
+        if missing >= self.block_size:
+            values += self.generator.random(missing).tolist()
+        elif missing:
+            self._refill()
+            values += self._values[:missing]
+            self._pos = missing
+        return np.array(values, dtype=np.float64)
+
+    def random_sample(self, size=None):
+        """
+        Uniform variates in [0, 1).
+        :param size: An integer. Number of variates; a single float if None.
+        :return:
+            A Float or a Numpy array.
+        """
+        if size is None:
+            if self._pos >= self._end:
+                self._refill()
+            value = self._values[self._pos]
+            self._pos += 1
+            return value
+        return self._take(int(size))
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        """
+        Uniform variates in [low, high), computed like `RandomState.uniform`.
+        :param low: A Float or a Numpy array. Lower bounds.
+        :param high: A Float or a Numpy array. Upper bounds.
+        :param size: An integer. Number of variates. Defaults to one per element of the broadcast bounds.
+        :return:
+            A Float if the bounds are scalars and size is None, else a Numpy array.
+        """
+        # NOTE: isinstance is much cheaper than np.ndim on this path; np.float64 is a float.
+        if size is None and isinstance(high, _SCALARS) and isinstance(low, _SCALARS):
+            if self._pos >= self._end:
+                self._refill()
+            value = self._values[self._pos]
+            self._pos += 1
+            return low + (high - low) * value
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        shape = np.broadcast(low, high).shape if size is None else (size,)
+        return low + (high - low) * self._take(int(np.prod(shape))).reshape(shape)
+
+    def choice(self, a, p=None):
+        """
+        One element of range(a) (or of a), drawn with probabilities p by inverting their cumulative sum.
+        :param a: An integer or a sequence.
+        :param p: A Numpy array. Probabilities of each element. Uniform if None.
+        :return:
+            An element of range(a) or of a.
+        """
+        n = a if isinstance(a, (int, np.integer)) else len(a)
+        if p is None:
+            k = min(int(self.random_sample() * n), n - 1)
+        else:
+            cdf = np.cumsum(p)
+            k = min(int(np.searchsorted(cdf, self.random_sample() * cdf[-1], side='right')), n - 1)
+        return k if isinstance(a, (int, np.integer)) else a[k]
+
+    def get_state(self):
+        """
+        Returns the state of the stream: the generator state, the current block and the position in it.
+        """
+        return self.generator.bit_generator.state, np.array(self._values[:self._end], dtype=np.float64), self._pos
+
+    def set_state(self, state):
+        """
+        Restore a state of `get_state`. The block may be given without its used part (block[pos:], pos=0), and may
+        be longer than block_size (blocks of older versions); the stream refills once it is used up.
+        """
+        bit_generator_state, block, pos = state
+        self.generator.bit_generator.state = bit_generator_state
+        self._values = np.asarray(block, dtype=np.float64)[int(pos):].tolist()
+        self._pos = 0
+        self._end = len(self._values)
+
+
+def check_random_state(random_state):
+    """
+    Random source of a tree or forest.
+    :param random_state: An int, SeedSequence, RandomStream, RandomState or None.
+        If int or SeedSequence, a RandomStream seeded by it;
+        If RandomStream or RandomState instance, random_state itself;
+        If None, the RandomState instance used by np.random.
+    :return:
+        A random source with `uniform` and `choice`.
+    """
+    if isinstance(random_state, (int, np.integer, np.random.SeedSequence)):
+        return RandomStream(random_state)
+    if isinstance(random_state, (RandomStream, np.random.RandomState)):
+        return random_state
+    return np.random
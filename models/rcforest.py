@@ -0,0 +1,424 @@
+"""
+@ File name: rcforest.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+import timeit
+import numpy as np
+import models.rrcf_array as rrcf_array
+
+from models.random_stream import check_random_state
+from utils.timer import CallTimer
+
+
+class RCForest(object):
+    """
+    Robust random cut forest whose trees are updated together.
+
+    Every tree of the forest holds the same points, so inserting or forgetting a point is one forest-wide
+    operation. The nodes of all trees are kept in (num_trees x capacity) NumPy arrays and each step of an
+    insert or delete is done for every tree at once: the bbox checks and random cuts of one tree level are
+    computed for all trees still descending, and the count/bbox/CoDisp updates climb all trees in lock step.
+
+    Parameters:
+    -----------
+    num_trees: int
+               Number of trees.
+    leaves_size: int
+                 Maximum number of points in the forest. Arrays grow if it is exceeded.
+    random_state: int, SeedSequence, RandomStream, RandomState instance or None (optional) (default=None)
+        Random number generator used for the cuts of all trees (see `models.random_stream.check_random_state`).
+
+    Attributes:
+    -----------
+    leaves: dict
+            Dict mapping leaf index (user-specified) to its key slot.
+    root: np.ndarray (num_trees,)
+          Slot of the root node of each tree (-1 if empty).
+    parent, left, right, count, cut_dim, cut_val: np.ndarray (num_trees x capacity)
+          Node arrays of every tree, as in `models.rrcf_array.ArrayRCTree`.
+    bbox: np.ndarray (num_trees x capacity x 2 x d)
+          Bounding box of every node.
+    leaf_of: np.ndarray (num_trees x leaves_size)
+             Slot of the leaf holding each key slot, per tree.
+    timer: CallTimer
+           Execution time of `update` calls.
+
+    Example:
+    --------
+    >>> forest = RCForest(num_trees=80, leaves_size=864)
+    >>> for i, x in enumerate(points):
+    ...     forget = (i - 864) if len(forest.leaves) >= 864 else None
+    ...     score = forest.update(x, index=i, forget=forget)
+    """
+
+    def __init__(self, num_trees, leaves_size, random_state=None):
+        self.rng = check_random_state(random_state)
+        self.num_trees = num_trees
+        self.leaves_size = leaves_size
+        self.leaves = {}
+        self.ndim = None
+        self.timer = CallTimer()
+        self._trees = np.arange(num_trees)
+
+    def __len__(self):
+        return self.num_trees
+
+    def __repr__(self):
+        return "RCForest(trees={}, leaves={}, {})".format(self.num_trees, len(self.leaves), self.timer)
+
+    def _allocate(self, ndim):
+        """
+        Allocate empty node arrays for points of dimension ndim.
+        """
+        num_trees = self.num_trees
+        keys = max(self.leaves_size, 1)
+        capacity = 2 * keys
+        self.ndim = ndim
+        self.capacity = capacity
+        self.root = np.full(num_trees, -1, dtype=np.int64)
+        self.parent = np.full((num_trees, capacity), -1, dtype=np.int32)
+        self.left = np.full((num_trees, capacity), -1, dtype=np.int32)
+        self.right = np.full((num_trees, capacity), -1, dtype=np.int32)
+        self.count = np.zeros((num_trees, capacity), dtype=np.int64)
+        self.cut_dim = np.zeros((num_trees, capacity), dtype=np.int32)
+        self.cut_val = np.zeros((num_trees, capacity), dtype=np.float64)
+        self.bbox = np.zeros((num_trees, capacity, 2, ndim), dtype=np.float64)
+        # NOTE: All trees hold the same points, so they always have the same number of nodes
+        #       and their free stacks share one height.
+        self.free = np.tile(np.arange(capacity - 1, -1, -1, dtype=np.int32), (num_trees, 1))
+        self.free_top = capacity
+        self.leaf_of = np.full((num_trees, keys), -1, dtype=np.int32)
+        # NOTE: Hash index from point key (see rrcf_array.point_key) to the leaf slot of that point in each tree.
+        self._point_index = {}
+        self._free_keys = list(range(keys - 1, -1, -1))
+
+    def _grow(self):
+        """
+        Double the number of key and node slots.
+        """
+        num_trees = self.num_trees
+        old_keys = self.leaf_of.shape[1]
+        old = self.capacity
+        self.leaf_of = np.concatenate([self.leaf_of, np.full((num_trees, old_keys), -1, dtype=np.int32)], axis=1)
+        self._free_keys.extend(range(2 * old_keys - 1, old_keys - 1, -1))
+
+        self.parent = np.concatenate([self.parent, np.full((num_trees, old), -1, dtype=np.int32)], axis=1)
+        self.left = np.concatenate([self.left, np.full((num_trees, old), -1, dtype=np.int32)], axis=1)
+        self.right = np.concatenate([self.right, np.full((num_trees, old), -1, dtype=np.int32)], axis=1)
+        self.count = np.concatenate([self.count, np.zeros((num_trees, old), dtype=np.int64)], axis=1)
+        self.cut_dim = np.concatenate([self.cut_dim, np.zeros((num_trees, old), dtype=np.int32)], axis=1)
+        self.cut_val = np.concatenate([self.cut_val, np.zeros((num_trees, old))], axis=1)
+        self.bbox = np.concatenate([self.bbox, np.zeros((num_trees, old, 2, self.ndim))], axis=1)
+        free = np.empty((num_trees, 2 * old), dtype=np.int32)
+        free[:, :old] = np.arange(2 * old - 1, old - 1, -1, dtype=np.int32)
+        free[:, old:old + self.free_top] = self.free[:, :self.free_top]
+        self.free = free
+        self.free_top += old
+        self.capacity = 2 * old
+
+    def build(self, X, index_labels=None):
+        """
+        Replace the content of every tree by a tree bulk built over X with `rrcf_array.build_arrays`.
+        :param X: A Numpy array (n x d). Points.
+        :param index_labels: A sequence. Index of each point. Defaults to 0..n-1.
+        :return: None
+        """
+        X = np.asarray(X, dtype=np.float64)
+        X = X.reshape(X.shape[0], -1)
+        U, N, labels = rrcf_array.unique_points(X, index_labels)
+        self._allocate(X.shape[1])
+        while self.leaf_of.shape[1] < X.shape[0]:
+            self._grow()
+        self.leaves = {}
+        keys = []
+        rows = []
+        for row, row_labels in enumerate(labels):
+            for label in row_labels.tolist():
+                key = self._free_keys.pop()
+                self.leaves[label] = key
+                keys.append(key)
+                rows.append(row)
+        size = 0
+        unique_leaf = np.empty((self.num_trees, U.shape[0]), dtype=np.int64)
+        for tree in range(self.num_trees):
+            nodes = rrcf_array.build_arrays(U, N, self.rng, capacity=self.capacity)
+            for name in ('parent', 'left', 'right', 'count', 'cut_dim', 'cut_val', 'bbox'):
+                getattr(self, name)[tree] = nodes[name]
+            self.leaf_of[tree, keys] = nodes['leaf_of'][rows]
+            unique_leaf[tree] = nodes['leaf_of']
+            size = nodes['size']
+        self._point_index = {rrcf_array.point_key(U[row]): unique_leaf[:, row].copy() for row in range(U.shape[0])}
+        self.root[:] = 0
+        self.free_top = self.capacity - size
+        self.free[:, :self.free_top] = np.arange(self.capacity - 1, size - 1, -1, dtype=np.int32)
+
+    def _pop_nodes(self):
+        """
+        Take one node slot per tree from the free stacks.
+        """
+        self.free_top -= 1
+        return self.free[:, self.free_top].astype(np.int64)
+
+    def _push_nodes(self, nodes):
+        """
+        Give one node slot per tree back to the free stacks.
+        """
+        self.free[:, self.free_top] = nodes
+        self.free_top += 1
+
+    def update(self, point, index, forget=None):
+        """
+        Forget the oldest point, insert the new point and return its mean CoDisp over all trees.
+        :param point: A Numpy array. New point.
+        :param index: A Hashable. Index of new point.
+        :param forget: A Hashable. Index of the point to forget first. Nothing is forgotten if None.
+        :return:
+            - avg_codisp: A Float. The mean collusive displacement of the new point.
+        """
+        stime = timeit.default_timer()
+        if forget is not None:
+            self.forget_point(forget)
+        _, codisp = self.insert_and_codisp(point, index)
+        avg_codisp = codisp.sum() / self.num_trees
+        self.timer.record(timeit.default_timer() - stime)
+        return avg_codisp
+
+    def insert_point(self, point, index):
+        """
+        Inserts a point into every tree.
+        :param point: A Numpy array (1 x d).
+        :param index: A Hashable. Identifier of the new point.
+        :return:
+            - leaf: A Numpy array (num_trees,). Slot of the new leaf in each tree.
+        """
+        leaf, _ = self.insert_and_codisp(point, index)
+        return leaf
+
+    def insert_and_codisp(self, point, index):
+        """
+        Inserts a point into every tree and computes its CoDisp during the same walk.
+        :param point: A Numpy array (1 x d).
+        :param index: A Hashable. Identifier of the new point.
+        :return:
+            - leaf: A Numpy array (num_trees,). Slot of the new leaf in each tree.
+            - codisp: A Numpy array (num_trees,). Collusive displacement of the new point in each tree.
+        """
+        point = np.asarray(point, dtype=np.float64).ravel()
+        if self.ndim is None:
+            self._allocate(point.size)
+        elif point.size != self.ndim:
+            raise ValueError("Point must be same dimension as existing points in tree.")
+        if index in self.leaves:
+            raise KeyError("Index already exists in leaves dict.")
+        if not self._free_keys:
+            self._grow()
+        trees = self._trees
+        codisp = np.zeros(self.num_trees)
+        # NOTE: A duplicate point is a duplicate in every tree, so one dict lookup replaces the descent.
+        point_key = rrcf_array.point_key(point)
+        duplicate = self._point_index.get(point_key)
+        key = self._free_keys.pop()
+        self.leaves[index] = key
+
+        if duplicate is not None:
+            leaf = duplicate
+            self.leaf_of[:, key] = leaf
+            self.count[trees, leaf] += 1
+            self._update_upwards(leaf, self.parent[trees, leaf], point=None, codisp=codisp)
+            return leaf, codisp
+
+        # NOTE: First point of the forest.
+        if self.root[0] == -1:
+            leaf = self._pop_nodes()
+            self._init_leaf(leaf, point)
+            self.root[:] = leaf
+            self.leaf_of[:, key] = leaf
+            self._point_index[point_key] = leaf
+            return leaf, codisp
+
+        # NOTE: Descend all trees level by level until every tree found its cut.
+        bbox = self.bbox
+        node = self.root.copy()
+        up = np.full(self.num_trees, -1, dtype=np.int64)
+        cut_dim = np.empty(self.num_trees, dtype=np.int64)
+        cut_val = np.empty(self.num_trees, dtype=np.float64)
+        leaf_is_left = np.empty(self.num_trees, dtype=bool)
+        active = trees
+        current = node.copy()
+        while active.size:
+            b = bbox[active, current]
+            lo = np.minimum(b[:, 0], point)
+            span = np.maximum(b[:, 1], point)
+            span -= lo
+            np.cumsum(span, axis=1, out=span)
+            r = self.rng.uniform(0, span[:, -1])
+            dim = np.minimum((span < r[:, None]).sum(axis=1), self.ndim - 1)
+            k = np.arange(active.size)
+            cut = lo[k, dim] + span[k, dim] - r
+            is_left = cut <= b[k, 0, dim]
+            stop = is_left | (cut >= b[k, 1, dim])
+            if stop.any():
+                done = active[stop]
+                node[done] = current[stop]
+                cut_dim[done] = dim[stop]
+                cut_val[done] = cut[stop]
+                leaf_is_left[done] = is_left[stop]
+                go = ~stop
+                active = active[go]
+                current = current[go]
+            if active.size:
+                up[active] = current
+                go_left = point[self.cut_dim[active, current]] <= self.cut_val[active, current]
+                current = np.where(go_left, self.left[active, current], self.right[active, current]).astype(np.int64)
+
+        # NOTE: Link a new branch between each tree's node and its parent.
+        leaf = self._pop_nodes()
+        branch = self._pop_nodes()
+        self._init_leaf(leaf, point)
+        self.parent[trees, leaf] = branch
+        self.cut_dim[trees, branch] = cut_dim
+        self.cut_val[trees, branch] = cut_val
+        self.left[trees, branch] = np.where(leaf_is_left, leaf, node)
+        self.right[trees, branch] = np.where(leaf_is_left, node, leaf)
+        self.count[trees, branch] = self.count[trees, node] + 1
+        self.bbox[trees, branch, 0] = np.minimum(self.bbox[trees, node, 0], point)
+        self.bbox[trees, branch, 1] = np.maximum(self.bbox[trees, node, 1], point)
+        self.parent[trees, branch] = up
+        self.parent[trees, node] = branch
+        self._replace_child(up, node, branch)
+        self.leaf_of[:, key] = leaf
+        self._point_index[point_key] = leaf
+
+        # NOTE: Displacement of the new leaf is its sibling's count; the walk continues above the branch.
+        codisp[:] = self.count[trees, node]
+        self._update_upwards(branch, up, point=point, codisp=codisp)
+        return leaf, codisp
+
+    def forget_point(self, index):
+        """
+        Delete a point from every tree.
+        :param index: A Hashable. Index of the point.
+        :return:
+            - leaf: A Numpy array (num_trees,). Slot of the deleted leaf in each tree.
+        """
+        try:
+            key = self.leaves.pop(index)
+        except KeyError:
+            raise KeyError('Leaf must be a key to self.leaves')
+        trees = self._trees
+        leaf = self.leaf_of[:, key].astype(np.int64)
+        self.leaf_of[:, key] = -1
+        self._free_keys.append(key)
+
+        # NOTE: Duplicates are shared by all trees, so checking one tree is enough.
+        if self.count[0, leaf[0]] > 1:
+            self.count[trees, leaf] -= 1
+            self._update_upwards(leaf, self.parent[trees, leaf], inc=-1)
+            return leaf
+        del self._point_index[rrcf_array.point_key(self.bbox[0, leaf[0], 0])]
+        if self.root[0] == leaf[0]:
+            self._push_nodes(leaf)
+            self.root[:] = -1
+            return leaf
+
+        parent = self.parent[trees, leaf].astype(np.int64)
+        left = self.left[trees, parent]
+        sibling = np.where(left == leaf, self.right[trees, parent], left).astype(np.int64)
+        grandparent = self.parent[trees, parent].astype(np.int64)
+        self.parent[trees, sibling] = grandparent
+        self._replace_child(grandparent, parent, sibling)
+        self._push_nodes(parent)
+        self._push_nodes(leaf)
+        self._relax_upwards(grandparent)
+        return leaf
+
+    def codisp(self, index):
+        """
+        Compute collusive displacement of a point in every tree.
+        :param index: A Hashable. Index of the point.
+        :return:
+            - codisp: A Numpy array (num_trees,).
+        """
+        try:
+            key = self.leaves[index]
+        except KeyError:
+            raise KeyError('leaf must be a key to self.leaves')
+        leaf = self.leaf_of[:, key].astype(np.int64)
+        codisp = np.zeros(self.num_trees)
+        self._update_upwards(leaf, self.parent[self._trees, leaf], inc=0, codisp=codisp)
+        return codisp
+
+    def _init_leaf(self, leaf, point):
+        trees = self._trees
+        self.bbox[trees, leaf] = point
+        self.count[trees, leaf] = 1
+        self.parent[trees, leaf] = -1
+        self.left[trees, leaf] = -1
+        self.right[trees, leaf] = -1
+
+    def _replace_child(self, parent, child, new_child):
+        """
+        Replace child by new_child under parent in every tree; new_child becomes the root where parent is -1.
+        """
+        is_root = parent == -1
+        self.root[is_root] = new_child[is_root]
+        trees = self._trees[~is_root]
+        parent = parent[~is_root]
+        child = child[~is_root]
+        new_child = new_child[~is_root]
+        was_left = self.left[trees, parent] == child
+        self.left[trees[was_left], parent[was_left]] = new_child[was_left]
+        was_right = ~was_left
+        self.right[trees[was_right], parent[was_right]] = new_child[was_right]
+
+    def _update_upwards(self, child, up, inc=1, point=None, codisp=None):
+        """
+        Climb all trees from child to the root. On the way, add inc to the count of each ancestor,
+        expand its bbox with point and keep the maximum displacement ratio in codisp.
+        """
+        active = up != -1
+        trees = self._trees[active]
+        child = child[active]
+        up = up[active].astype(np.int64)
+        while trees.size:
+            if inc:
+                self.count[trees, up] += inc
+            if point is not None:
+                b = self.bbox[trees, up]
+                np.minimum(b[:, 0], point, out=b[:, 0])
+                np.maximum(b[:, 1], point, out=b[:, 1])
+                self.bbox[trees, up] = b
+            if codisp is not None:
+                left = self.left[trees, up]
+                sibling = np.where(left == child, self.right[trees, up], left)
+                ratio = self.count[trees, sibling] / self.count[trees, child]
+                codisp[trees] = np.maximum(codisp[trees], ratio)
+            child = up
+            up = self.parent[trees, up].astype(np.int64)
+            active = up != -1
+            if not active.all():
+                trees = trees[active]
+                child = child[active]
+                up = up[active]
+
+    def _relax_upwards(self, node):
+        """
+        Decrement counts and recompute bboxes from the children of every ancestor after a deletion.
+        """
+        active = node != -1
+        trees = self._trees[active]
+        node = node[active]
+        while trees.size:
+            self.count[trees, node] -= 1
+            left = self.left[trees, node]
+            right = self.right[trees, node]
+            self.bbox[trees, node, 0] = np.minimum(self.bbox[trees, left, 0], self.bbox[trees, right, 0])
+            self.bbox[trees, node, 1] = np.maximum(self.bbox[trees, left, 1], self.bbox[trees, right, 1])
+            node = self.parent[trees, node].astype(np.int64)
+            active = node != -1
+            if not active.all():
+                trees = trees[active]
+                node = node[active]
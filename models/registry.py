@@ -0,0 +1,161 @@
+"""
+@ File name: registry.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+from collections import OrderedDict
+
+# NOTE: Resident bytes per leaf of each tree: (fixed, per point dimension). Measured with tracemalloc on
+#       bootstrapped detectors (10 trees, 300-600 leaves, 6-12 dimensions).
+_LEAF_BYTES = {
+    'object': (640, 67),
+    'array': (160, 75),
+    'forest': (115, 37),
+    'sharded': (115, 37),
+}
+# NOTE: One [date, score] entry of AnomalyDetector.anomaly_score and its threshold engine copy.
+_SCORE_BYTES = 180
+
+
+def estimate_nbytes(detector):
+    """
+    Approximate resident memory of a detector: its trees and its collected anomaly scores.
+    :param detector: An Anomaly Detector object.
+    :return:
+        An Integer. Bytes.
+    """
+    model = detector.rrcf
+    fixed, per_dim = _LEAF_BYTES.get(model.engine, _LEAF_BYTES['object'])
+    leaves = min(len(model.index_queue), model.leaves_size)
+    ndim = model.sequences * 2
+    return model.num_trees * leaves * (fixed + per_dim * ndim) + len(detector.anomaly_score) * _SCORE_BYTES
+
+
+class DetectorRegistry(object):
+    """
+    Least recently used cache of detectors. Only the most recently used entries stay in memory; the others are
+    handed to `spill` (which saves them) and dropped, and `load` brings them back on the next `get`.
+
+    Parameters:
+    -----------
+    load: callable
+          load(key) -> value. Called on a miss.
+    spill: callable
+           spill(key, value). Called when an entry is evicted.
+    capacity: int (optional)
+              Maximum number of resident entries. Unlimited if None.
+    memory_budget: int (optional)
+                   Maximum estimated bytes of the resident entries. Unlimited if None.
+    size_of: callable (optional)
+             size_of(value) -> bytes. Estimated size of an entry, checked against memory_budget.
+
+    Example:
+    --------
+    >>> registry = DetectorRegistry(load, spill, capacity=100)
+    >>> detector = registry.get(('10.0.0.1', '1'))
+    >>> registry.stats()
+    """
+
+    def __init__(self, load, spill, capacity=None, memory_budget=None, size_of=None):
+        self.load = load
+        self.spill = spill
+        self.capacity = capacity
+        self.memory_budget = memory_budget
+        self.size_of = size_of
+        self._entries = OrderedDict()
+        self._nbytes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return "DetectorRegistry(resident={}, nbytes={}, hits={}, misses={}, evictions={})".format(
+            len(self._entries), self.nbytes, self.hits, self.misses, self.evictions)
+
+    def get(self, key):
+        """
+        Returns the entry of a key, loading it on a miss. The entry becomes the most recently used.
+        :param key: Hashable.
+        :return:
+            The value.
+        """
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        value = self.load(key)
+        self._entries[key] = value
+        self.resize(key)
+        return value
+
+    def peek(self, key):
+        """
+        Returns the entry of a key if it is resident, else None. The LRU order and counters are not changed.
+        """
+        return self._entries.get(key)
+
+    def resize(self, key):
+        """
+        Re-estimate the size of a resident entry (e.g. after it was updated) and evict others if needed.
+        :param key: Hashable.
+        :return: None
+        """
+        if self.size_of is not None:
+            nbytes = self.size_of(self._entries[key])
+            self.nbytes += nbytes - self._nbytes.get(key, 0)
+            self._nbytes[key] = nbytes
+        self._evict(keep=key)
+
+    def pop(self, key):
+        """
+        Remove an entry without spilling it.
+        :param key: Hashable.
+        :return:
+            The value, or None if it is not resident.
+        """
+        self.nbytes -= self._nbytes.pop(key, 0)
+        return self._entries.pop(key, None)
+
+    def items(self):
+        return list(self._entries.items())
+
+    def stats(self):
+        """
+        Returns the counters of the registry.
+        :return:
+            A Dictionary.
+        """
+        lookups = self.hits + self.misses
+        return {'resident': len(self._entries), 'nbytes': self.nbytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.}
+
+    def _over(self):
+        if self.capacity is not None and len(self._entries) > self.capacity:
+            return True
+        return self.memory_budget is not None and self.nbytes > self.memory_budget
+
+    def _evict(self, keep=None):
+        """
+        Spill the least recently used entries until the registry is within its limits. The entry `keep` (the one
+        in use) is never evicted.
+        """
+        while self._over():
+            key = next(iter(self._entries))
+            if key == keep:
+                if len(self._entries) == 1:
+                    return
+                self._entries.move_to_end(key)
+                continue
+            value = self.pop(key)
+            self.spill(key, value)
+            self.evictions += 1
@@ -1,4 +1,6 @@
 import numpy as np
+import models.rrcf_array as rrcf_array
+from models.random_stream import check_random_state
 
 
 class RCTree:
@@ -14,10 +16,16 @@ class RCTree:
     X: np.ndarray (n x d) (optional)
        Array containing n data points, each with dimension d.
        If no data provided, an empty tree is created.
-    random_state: int, RandomState instance or None (optional) (default=None)
-        If int, random_state is the seed used by the random number generator;
-        If RandomState instance, random_state is the random number generator;
+    random_state: int, SeedSequence, RandomStream, RandomState instance or None (optional) (default=None)
+        If int or SeedSequence, random_state is the seed of a buffered RandomStream;
+        If RandomStream or RandomState instance, random_state is the random number generator;
         If None, the random number generator is the RandomState instance used by np.random.
+    hash_index: bool (optional) (default=False)
+        If True, keep a dict from point key to leaf (see rrcf_array.point_key), so that
+        find_duplicate is a dict lookup instead of a root-to-leaf query.
+    hash_tolerance: float (optional) (default=None)
+        Quantization of the hash keys. The index serves inserts whose tolerance equals it;
+        other inserts fall back to query.
 
     Attributes:
     -----------
@@ -61,19 +69,22 @@ class RCTree:
     """
 
     def __init__(self, X=None, index_labels=None, precision=9, 
-                 random_state=None):
+                 random_state=None, hash_index=False, hash_tolerance=None):
         # Random number generation with provided seed
-        if isinstance(random_state, int):
-            self.rng = np.random.RandomState(random_state)
-        elif isinstance(random_state, np.random.RandomState):
-            self.rng = random_state
-        else:
-            self.rng = np.random
+        self.rng = check_random_state(random_state)
         # Initialize dict for leaves
         self.leaves = {}
         # Initialize tree root
         self.root = None
         self.ndim = None
+        # Initialize optional hash index of points
+        self.hash_tolerance = hash_tolerance
+        self._point_index = {} if hash_index else None
+        # Scratch buffers of the bbox kernels and bboxes of deleted branches for reuse
+        self._bbox_hat = None
+        self._span = None
+        self._mask = None
+        self._bbox_pool = []
         if X is not None:
             # Round data to avoid sorting errors
             X = np.around(X, decimals=precision)
@@ -81,30 +92,25 @@ class RCTree:
             if index_labels is None:
                 index_labels = np.arange(X.shape[0], dtype=int)
             self.index_labels = index_labels
-            # Check for duplicates
-            U, I, N = np.unique(X, return_inverse=True, return_counts=True,
-                                axis=0)
-            # If duplicates exist, take unique elements
-            if N.max() > 1:
-                n, d = U.shape
-                X = U
-            else:
-                n, d = X.shape
-                N = np.ones(n, dtype=np.int)
-                I = None
+            # Check for duplicates; build over unique points only
+            X, N, labels = rrcf_array.unique_points(X, index_labels)
             # Store dimension of dataset
-            self.ndim = d
-            # Set node above to None in case of bottom-up search
-            self.u = None
-            # Create RRC Tree
-            S = np.ones(n, dtype=np.bool)
-            self._mktree(X, S, N, I, parent=self)
-            # Remove parent of root
-            self.root.u = None
-            # Count all leaves under each branch
-            self._count_all_top_down(self.root)
-            # Set bboxes of all branches
-            self._get_bbox_top_down(self.root)
+            self.ndim = X.shape[1]
+            # Create RRC Tree (bulk built node arrays, converted to Branch/Leaf objects)
+            self._mktree(X, N, labels)
+            if self._point_index is not None:
+                for leaf in self.leaves.values():
+                    self._point_index.setdefault(rrcf_array.point_key(leaf.x, hash_tolerance), leaf)
+
+    def __setstate__(self, state):
+        # Trees pickled before the hash index was added have none
+        state.setdefault('hash_tolerance', None)
+        state.setdefault('_point_index', None)
+        state.setdefault('_bbox_hat', None)
+        state.setdefault('_span', None)
+        state.setdefault('_mask', None)
+        state.setdefault('_bbox_pool', [])
+        self.__dict__.update(state)
 
     def __repr__(self):
         depth = ""
@@ -138,79 +144,35 @@ class RCTree:
         print_tree(self.root)
         return treestr
 
-    def _cut(self, X, S, parent=None, side='l'):
-        # Find max and min over all d dimensions
-        xmax = X[S].max(axis=0)
-        xmin = X[S].min(axis=0)
-        # Compute l
-        l = xmax - xmin
-        l /= l.sum()
-        # Determine dimension to cut
-        q = self.rng.choice(self.ndim, p=l)
-        # Determine value for split
-        p = self.rng.uniform(xmin[q], xmax[q])
-        # Determine subset of points to left
-        S1 = (X[:, q] <= p) & (S)
-        # Determine subset of points to right
-        S2 = (~S1) & (S)
-        # Create new child node
-        child = Branch(q=q, p=p, u=parent)
-        # Link child node to parent
-        if parent is not None:
-            setattr(parent, side, child)
-        return S1, S2, child
-
-    def _mktree(self, X, S, N, I, parent=None, side='root', depth=0):
-        # Increment depth as we traverse down
-        depth += 1
-        # Create a cut according to definition 1
-        S1, S2, branch = self._cut(X, S, parent=parent, side=side)
-        # If S1 does not contain an isolated point...
-        if S1.sum() > 1:
-            # Recursively construct tree on S1
-            self._mktree(X, S1, N, I, parent=branch, side='l', depth=depth)
-        # Otherwise...
-        else:
-            # Create a leaf node from isolated point
-            i = np.asscalar(np.flatnonzero(S1))
-            leaf = Leaf(i=i, d=depth, u=branch, x=X[i, :], n=N[i])
-            # Link leaf node to parent
-            branch.l = leaf
-            # If duplicates exist...
-            if I is not None:
-                # Add a key in the leaves dict pointing to leaf for all duplicate indices
-                J = np.flatnonzero(I == i)
-                # Get index label
-                J = self.index_labels[J]
-                for j in J:
-                    self.leaves[j] = leaf
+    def _mktree(self, X, N, labels):
+        """
+        Build the tree from the node arrays of `rrcf_array.build_arrays`. Nodes come in preorder,
+        so the parent of every node already exists when the node is created.
+        """
+        nodes = rrcf_array.build_arrays(X, N, self.rng)
+        parent = nodes['parent']
+        left = nodes['left']
+        objects = [None] * nodes['size']
+        # Row of X held by each leaf slot
+        rows = np.empty(nodes['size'], dtype=np.int64)
+        rows[nodes['leaf_of']] = np.arange(X.shape[0])
+        for slot in range(nodes['size']):
+            up = objects[parent[slot]] if parent[slot] != -1 else None
+            if left[slot] == -1:
+                i = int(rows[slot])
+                node = Leaf(i=i, u=up, x=X[i, :], n=int(N[i]))
+                for j in labels[i].tolist():
+                    self.leaves[j] = node
             else:
-                i = self.index_labels[i]
-                self.leaves[i] = leaf
-        # If S2 does not contain an isolated point...
-        if S2.sum() > 1:
-            # Recursively construct tree on S2
-            self._mktree(X, S2, N, I, parent=branch, side='r', depth=depth)
-        # Otherwise...
-        else:
-            # Create a leaf node from isolated point
-            i = np.asscalar(np.flatnonzero(S2))
-            leaf = Leaf(i=i, d=depth, u=branch, x=X[i, :], n=N[i])
-            # Link leaf node to parent
-            branch.r = leaf
-            # If duplicates exist...
-            if I is not None:
-                # Add a key in the leaves dict pointing to leaf for all duplicate indices
-                J = np.flatnonzero(I == i)
-                # Get index label
-                J = self.index_labels[J]
-                for j in J:
-                    self.leaves[j] = leaf
+                node = Branch(q=int(nodes['cut_dim'][slot]), p=float(nodes['cut_val'][slot]), u=up,
+                              n=int(nodes['count'][slot]), b=nodes['bbox'][slot].copy())
+            if up is None:
+                self.root = node
+            elif left[parent[slot]] == slot:
+                up.l = node
             else:
-                i = self.index_labels[i]
-                self.leaves[i] = leaf
-        # Decrement depth as we traverse back up
-        depth -= 1
+                up.r = node
+            objects[slot] = node
 
     def map_leaves(self, node, op=(lambda x: None), *args, **kwargs):
         """
@@ -331,11 +293,17 @@ class RCTree:
             # Simply decrement the number of points in the leaf and for all branches above
             self._update_leaf_count_upwards(leaf, inc=-1)
             return self.leaves.pop(index)
+        # Remove the point from the hash index
+        if self._point_index is not None:
+            key = rrcf_array.point_key(leaf.x, self.hash_tolerance)
+            if self._point_index.get(key) is leaf:
+                del self._point_index[key]
         # Weird cases here:
         # If leaf is the root...
         if leaf is self.root:
             self.root = None
             self.ndim = None
+            self._bbox_pool = []
             return self.leaves.pop(index)
         # Find parent
         parent = leaf.u
@@ -344,6 +312,8 @@ class RCTree:
             sibling = parent.r
         else:
             sibling = parent.l
+        # The bbox of the deleted parent is reused by the next new branch
+        self._bbox_pool.append(parent.b)
         # If parent is the root...
         if parent is self.root:
             # Delete parent
@@ -351,11 +321,6 @@ class RCTree:
             # Set sibling as new root
             sibling.u = None
             self.root = sibling
-            # Update depths
-            if isinstance(sibling, Leaf):
-                sibling.d = 0
-            else:
-                self.map_leaves(sibling, op=self._increment_depth, inc=-1)
             return self.leaves.pop(index)
         # Find grandparent
         grandparent = parent.u
@@ -366,9 +331,7 @@ class RCTree:
             grandparent.l = sibling
         else:
             grandparent.r = sibling
-        # Update depths
         parent = grandparent
-        self.map_leaves(sibling, op=self._increment_depth, inc=-1)
         # Update leaf counts under each branch
         self._update_leaf_count_upwards(parent, inc=-1)
         # Update bounding boxes
@@ -385,6 +348,26 @@ class RCTree:
             node.n += inc
             node = node.u
 
+    def _increment_and_codisp_upwards(self, node):
+        """
+        Increments the leaf count of every branch above node and returns the largest
+        displacement ratio seen on the way (the CoDisp contribution above node).
+        """
+        co_displacement = 0
+        parent = node.u
+        while parent is not None:
+            parent.n += 1
+            if node is parent.l:
+                sibling = parent.r
+            else:
+                sibling = parent.l
+            result = sibling.n / node.n
+            if result > co_displacement:
+                co_displacement = result
+            node = parent
+            parent = node.u
+        return co_displacement
+
     def insert_point(self, point, index, tolerance=None):
         """
         Inserts a point into the tree, creating a new leaf
@@ -411,15 +394,49 @@ class RCTree:
         >>> x = np.random.randn(2)
         >>> tree.insert_point(x, index=0)
         """
+        leaf, _ = self.insert_and_codisp(point, index, tolerance=tolerance)
+        return leaf
+
+    def insert_and_codisp(self, point, index, tolerance=None):
+        """
+        Inserts a point into the tree and computes the collusive displacement of its leaf
+        on the same walk that updates the leaf counts above it.
+
+        Parameters:
+        -----------
+        point: np.ndarray (1 x d)
+        index: (Hashable type)
+               Identifier for new leaf in tree
+        tolerance: float
+                   Tolerance for determining duplicate points
+
+        Returns:
+        --------
+        leaf: Leaf
+              New leaf in tree
+        codisplacement: float
+                        Same as codisp(index) after the insert.
+
+        Example:
+        --------
+        # Create RCTree
+        >>> tree = RCTree()
+
+        # Insert a point and get its anomaly score
+        >>> x = np.random.randn(2)
+        >>> leaf, score = tree.insert_and_codisp(x, index=0)
+        """
         if not isinstance(point, np.ndarray):
             point = np.asarray(point)
         point = point.ravel()
         if self.root is None:
-            leaf = Leaf(x=point, i=index, d=0)
+            leaf = Leaf(x=point, i=index)
             self.root = leaf
             self.ndim = point.size
             self.leaves[index] = leaf
-            return leaf
+            if self._point_index is not None:
+                self._point_index[rrcf_array.point_key(point, self.hash_tolerance)] = leaf
+            return leaf, 0
         # If leaves already exist in tree, check dimensions of point
         try:
             assert (point.size == self.ndim)
@@ -434,30 +451,29 @@ class RCTree:
         # Check for duplicate points
         duplicate = self.find_duplicate(point, tolerance=tolerance)
         if duplicate:
-            self._update_leaf_count_upwards(duplicate, inc=1)
+            duplicate.n += 1
+            co_displacement = self._increment_and_codisp_upwards(duplicate)
             self.leaves[index] = duplicate
-            return duplicate
+            return duplicate, co_displacement
         # If tree has points and point is not a duplicate, continue with main algorithm...
         node = self.root
         parent = node.u
-        maxdepth = max([leaf.d for leaf in self.leaves.values()])
-        depth = 0
         branch = None
-        for _ in range(maxdepth + 1):
+        # The walk always ends at a leaf at the latest, where any cut separates the point from the leaf.
+        while True:
             bbox = node.b
             cut_dimension, cut = self._insert_point_cut(point, bbox)
             if cut <= bbox[0, cut_dimension]:
-                leaf = Leaf(x=point, i=index, d=depth)
+                leaf = Leaf(x=point, i=index)
                 branch = Branch(q=cut_dimension, p=cut, l=leaf, r=node,
                                 n=(leaf.n + node.n))
                 break
             elif cut >= bbox[-1, cut_dimension]:
-                leaf = Leaf(x=point, i=index, d=depth)
+                leaf = Leaf(x=point, i=index)
                 branch = Branch(q=cut_dimension, p=cut, l=node, r=leaf,
                                 n=(leaf.n + node.n))
                 break
             else:
-                depth += 1
                 if point[node.q] <= node.p:
                     parent = node
                     node = node.l
@@ -481,16 +497,18 @@ class RCTree:
         else:
             # If a new root was created, assign the attribute
             self.root = branch
-        # Increment depths below branch
-        self.map_leaves(branch, op=self._increment_depth, inc=1)
-        # Increment leaf count above branch
-        self._update_leaf_count_upwards(parent, inc=1)
+        # Increment leaf count above branch, computing CoDisp on the way.
+        # Right under the branch, the displacement of the new leaf is the old subtree.
+        co_displacement = max(node.n / leaf.n, self._increment_and_codisp_upwards(branch))
         # Update bounding boxes
+        branch.b = self._bbox_pool.pop() if self._bbox_pool else np.empty((2, self.ndim))
         self._tighten_bbox_upwards(branch)
         # Add leaf to leaves dict
         self.leaves[index] = leaf
+        if self._point_index is not None:
+            self._point_index[rrcf_array.point_key(point, self.hash_tolerance)] = leaf
         # Return inserted leaf for convenience
-        return leaf
+        return leaf, co_displacement
 
     def query(self, point, node=None):
         """
@@ -612,7 +630,7 @@ class RCTree:
             return 0
         node = leaf
         results = []
-        for _ in range(node.d):
+        while True:
             parent = node.u
             if parent is None:
                 break
@@ -696,22 +714,31 @@ class RCTree:
 
         Leaf(10)
         """
+        # Dict lookup if the hash index serves this tolerance
+        if self._point_index is not None and tolerance == self.hash_tolerance:
+            return self._point_index.get(rrcf_array.point_key(point, tolerance))
+        if not isinstance(point, np.ndarray):
+            point = np.asarray(point)
         nearest = self.query(point)
         if tolerance is None:
-            if (nearest.x == point).all():
+            mask = self._scratch(point.size)[2]
+            np.equal(nearest.x, point, out=mask)
+            if np.count_nonzero(mask) == point.size:
                 return nearest
         else:
             if np.isclose(nearest.x, point, rtol=tolerance).all():
                 return nearest
         return None
 
-    def _lr_branch_bbox(self, node):
+    def _lr_branch_bbox(self, node, out=None):
         """
-        Compute bbox of node based on bboxes of node's children.
+        Compute bbox of node based on bboxes of node's children, into out if given.
         """
-        bbox = np.vstack([np.minimum(node.l.b[0, :], node.r.b[0, :]),
-                          np.maximum(node.l.b[-1, :], node.r.b[-1, :])])
-        return bbox
+        if out is None:
+            out = np.empty((2, node.l.b.shape[1]))
+        np.minimum(node.l.b[0], node.r.b[0], out=out[0])
+        np.maximum(node.l.b[-1], node.r.b[-1], out=out[1])
+        return out
 
     def _get_bbox_top_down(self, node):
         """
@@ -758,12 +785,6 @@ class RCTree:
             else:
                 return self._query(point, node.r)
 
-    def _increment_depth(self, x, inc=1):
-        """
-        Primitive function for incrementing the depth attribute of a leaf.
-        """
-        x.d += (inc)
-
     def _accumulate(self, x, accumulator):
         """
         Primitive function for helping to count the number of points in a subtree.
@@ -788,23 +809,24 @@ class RCTree:
     def _tighten_bbox_upwards(self, node):
         """
         Called when new point is inserted. Expands bbox of all nodes above new point
-        if point is outside the existing bbox.
+        if point is outside the existing bbox. The bbox of node (the new branch) must be
+        allocated; all bboxes are updated in place.
         """
-        bbox = self._lr_branch_bbox(node)
-        node.b = bbox
+        bbox = self._lr_branch_bbox(node, out=node.b)
+        lower = bbox[0]
+        upper = bbox[1]
+        mask = self._scratch(bbox.shape[1])[2]
         node = node.u
+        # NOTE: np.count_nonzero on a scratch mask; ndarray.any() allocates reduction temporaries.
         while node:
-            lt = (bbox[0, :] < node.b[0, :])
-            gt = (bbox[-1, :] > node.b[-1, :])
-            lt_any = lt.any()
-            gt_any = gt.any()
-            if lt_any or gt_any:
-                if lt_any:
-                    node.b[0, :][lt] = bbox[0, :][lt]
-                if gt_any:
-                    node.b[-1, :][gt] = bbox[-1, :][gt]
-            else:
+            b = node.b
+            np.less(lower, b[0], out=mask)
+            lt_any = np.count_nonzero(mask)
+            np.greater(upper, b[1], out=mask)
+            if not (lt_any or np.count_nonzero(mask)):
                 break
+            np.minimum(b[0], lower, out=b[0])
+            np.maximum(b[1], upper, out=b[1])
             node = node.u
 
     def _relax_bbox_upwards(self, node, point):
@@ -812,14 +834,27 @@ class RCTree:
         Called when point is deleted. Contracts bbox of all nodes above deleted point
         if the deleted point defined the boundary of the bbox.
         """
+        mask = self._scratch(point.size)[2]
         while node:
-            bbox = self._lr_branch_bbox(node)
-            if not ((node.b[0, :] == point) | (node.b[-1, :] == point)).any():
-                break
-            node.b[0, :] = bbox[0, :]
-            node.b[-1, :] = bbox[-1, :]
+            b = node.b
+            np.equal(b[0], point, out=mask)
+            if not np.count_nonzero(mask):
+                np.equal(b[1], point, out=mask)
+                if not np.count_nonzero(mask):
+                    break
+            self._lr_branch_bbox(node, out=b)
             node = node.u
 
+    def _scratch(self, ndim):
+        """
+        Scratch buffers (bbox_hat, span, mask) of the bbox kernels, allocated once per tree.
+        """
+        if self._span is None or self._span.size != ndim:
+            self._bbox_hat = np.empty((2, ndim))
+            self._span = np.empty(ndim)
+            self._mask = np.empty(ndim, dtype=bool)
+        return self._bbox_hat, self._span, self._mask
+
     def _insert_point_cut(self, point, bbox):
         """
         Generates the cut dimension and cut value based on the InsertPoint algorithm.
@@ -845,21 +880,17 @@ class RCTree:
 
         (0, 0.9758881798109296)
         """
-        # Generate the bounding box
-        bbox_hat = np.empty(bbox.shape)
+        # Generate the bounding box (a leaf's bbox has a single row, so use rows 0 and -1)
+        bbox_hat, span_sum, _ = self._scratch(point.size)
         # Update the bounding box based on the internal point
-        bbox_hat[0, :] = np.minimum(bbox[0, :], point)
-        bbox_hat[-1, :] = np.maximum(bbox[-1, :], point)
-        b_span = bbox_hat[-1, :] - bbox_hat[0, :]
-        b_range = b_span.sum()
-        r = self.rng.uniform(0, b_range)
-        span_sum = np.cumsum(b_span)
-        cut_dimension = np.inf
-        for j in range(len(span_sum)):
-            if span_sum[j] >= r:
-                cut_dimension = j
-                break
-        if not np.isfinite(cut_dimension):
+        np.minimum(bbox[0], point, out=bbox_hat[0])
+        np.maximum(bbox[-1], point, out=bbox_hat[1])
+        np.subtract(bbox_hat[1], bbox_hat[0], out=span_sum)
+        np.cumsum(span_sum, out=span_sum)
+        r = self.rng.uniform(0, span_sum[-1])
+        # First dimension whose cumulative span reaches r
+        cut_dimension = int(np.searchsorted(span_sum, r))
+        if cut_dimension >= point.size:
             raise ValueError("Cut dimension is not finite.")
         cut = bbox_hat[0, cut_dimension] + span_sum[cut_dimension] - r
         return cut_dimension, cut
@@ -901,21 +932,34 @@ class Leaf:
     Attributes:
     -----------
     i: Index of leaf (user-specified)
-    d: Depth of leaf
+    d: Depth of leaf (derived from parent pointers, O(depth))
     u: Pointer to parent
     x: Original point (1 x d)
     n: Number of points in leaf (1 if no duplicates)
     b: Bounding box of point (1 x d)
     """
-    __slots__ = ['i', 'd', 'u', 'x', 'n', 'b']
+    __slots__ = ['i', 'u', 'x', 'n', 'b']
 
     def __init__(self, i, d=None, u=None, x=None, n=1):
         self.u = u
         self.i = i
-        self.d = d
         self.x = x
         self.n = n
         self.b = x.reshape(1, -1)
 
+    @property
+    def d(self):
+        depth = 0
+        node = self.u
+        while node is not None:
+            depth += 1
+            node = node.u
+        return depth
+
+    @d.setter
+    def d(self, value):
+        # Depth is not stored; assignments (e.g. from leaves pickled with a 'd' slot) are ignored.
+        pass
+
     def __repr__(self):
         return "Leaf({0})".format(self.i)
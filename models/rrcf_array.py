@@ -0,0 +1,745 @@
+"""
+@ File name: rrcf_array.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+import numpy as np
+from models.random_stream import check_random_state
+
+
+def point_key(point, tolerance=None):
+    """
+    Hashable key of a point for duplicate lookup.
+
+    Parameters:
+    -----------
+    point: np.ndarray (1 x d)
+    tolerance: float (optional)
+               If None, the key is the exact float64 bytes of the point (0.0 and -0.0 share a key).
+               Otherwise coordinates are quantized to a grid of this width, so points in the same
+               cell share a key.
+
+    Returns:
+    --------
+    key: bytes
+    """
+    point = np.asarray(point, dtype=np.float64).ravel()
+    if tolerance is None:
+        return (point + 0.).tobytes()
+    return np.floor(point / tolerance).astype(np.int64).tobytes()
+
+
+def unique_points(X, index_labels=None):
+    """
+    Collapse duplicate rows of X.
+
+    Parameters:
+    -----------
+    X: np.ndarray (n x d)
+    index_labels: sequence (optional)
+                  Index labels of the rows in X. Defaults to 0..n-1.
+
+    Returns:
+    --------
+    U: np.ndarray (m x d)
+       Unique rows.
+    N: np.ndarray (m,)
+       Number of duplicates of each unique row.
+    labels: list of np.ndarray
+            Index labels of the rows of X equal to each unique row.
+    """
+    if index_labels is None:
+        index_labels = np.arange(X.shape[0], dtype=int)
+    index_labels = np.asarray(index_labels)
+    U, I, N = np.unique(X, return_inverse=True, return_counts=True, axis=0)
+    if N.max() == 1:
+        # No duplicates; keep the original row order.
+        return X, np.ones(X.shape[0], dtype=np.int64), [index_labels[i:i + 1] for i in range(X.shape[0])]
+    grouped = index_labels[np.argsort(I.ravel(), kind='stable')]
+    return U, N, np.split(grouped, np.cumsum(N)[:-1])
+
+
+def build_arrays(X, N, rng, capacity=None):
+    """
+    Build the node arrays of a random cut tree over unique points in one pass.
+
+    The tree is built top-down without recursion. A single permutation of row indices is partitioned segment by
+    segment, so every level only touches the rows under the node being cut. Nodes are numbered in preorder;
+    the random cuts are drawn in the same order as a recursive left-first construction.
+
+    Parameters:
+    -----------
+    X: np.ndarray (n x d)
+       Unique points.
+    N: np.ndarray (n,)
+       Number of duplicates of each point.
+    rng: random number generator with `choice` and `uniform` (RandomState or RandomStream)
+    capacity: int (optional)
+              Number of node slots to allocate. At least 2n - 1.
+
+    Returns:
+    --------
+    nodes: dict
+           'parent', 'left', 'right', 'count', 'cut_dim', 'cut_val', 'bbox' node arrays (root in slot 0),
+           'size' (number of used slots) and 'leaf_of' (slot of the leaf of each row of X).
+    """
+    n, d = X.shape
+    size = 2 * n - 1
+    capacity = max(capacity or 0, size)
+    parent = np.full(capacity, -1, dtype=np.int32)
+    left = np.full(capacity, -1, dtype=np.int32)
+    right = np.full(capacity, -1, dtype=np.int32)
+    count = np.zeros(capacity, dtype=np.int64)
+    cut_dim = np.zeros(capacity, dtype=np.int32)
+    cut_val = np.zeros(capacity, dtype=np.float64)
+    bbox = np.zeros((capacity, 2, d), dtype=np.float64)
+    leaf_of = np.empty(n, dtype=np.int64)
+    order = np.arange(n)
+    slot = 0
+    # Stack of (start, end, parent slot, is right child) segments of order.
+    stack = [(0, n, -1, False)]
+    while stack:
+        start, end, up, is_right = stack.pop()
+        node = slot
+        slot += 1
+        parent[node] = up
+        if up != -1:
+            if is_right:
+                right[up] = node
+            else:
+                left[up] = node
+        segment = order[start:end]
+        if end - start == 1:
+            i = segment[0]
+            bbox[node, 0] = X[i]
+            bbox[node, 1] = X[i]
+            count[node] = N[i]
+            leaf_of[i] = node
+            continue
+        points = X[segment]
+        xmin = points.min(axis=0)
+        xmax = points.max(axis=0)
+        bbox[node, 0] = xmin
+        bbox[node, 1] = xmax
+        count[node] = N[segment].sum()
+        # Cut dimension proportional to the span, cut value uniform within it.
+        span = xmax - xmin
+        q = rng.choice(d, p=span / span.sum())
+        p = rng.uniform(xmin[q], xmax[q])
+        cut_dim[node] = q
+        cut_val[node] = p
+        mask = points[:, q] <= p
+        lhs = segment[mask]
+        rhs = segment[~mask]
+        split = start + lhs.size
+        order[start:split] = lhs
+        order[split:end] = rhs
+        stack.append((split, end, node, True))
+        stack.append((start, split, node, False))
+    return {'parent': parent, 'left': left, 'right': right, 'count': count, 'cut_dim': cut_dim,
+            'cut_val': cut_val, 'bbox': bbox, 'size': size, 'leaf_of': leaf_of}
+
+
+class ArrayRCTree:
+    """
+    Robust random cut tree stored as a structure of arrays.
+
+    Same algorithm as `models.rrcf.RCTree`, but instead of a graph of `Branch`/`Leaf` objects every node lives in
+    a slot of preallocated NumPy arrays. Slots of removed nodes are recycled through a free list and the arrays
+    grow by doubling when the free list runs out, so a tree with a bounded number of leaves allocates no memory
+    once it reaches its steady state.
+
+    Parameters:
+    -----------
+    X: np.ndarray (n x d) (optional)
+       Array containing n data points, each with dimension d. The tree is bulk built with `build_arrays`.
+    index_labels: sequence (optional)
+                  Index labels of the rows in X. Defaults to 0..n-1.
+    random_state: int, SeedSequence, RandomStream, RandomState instance or None (optional) (default=None)
+        Same as `models.rrcf.RCTree`.
+    capacity: int (optional) (default=64)
+              Number of node slots allocated up front.
+    hash_index: bool (optional) (default=False)
+                Keep a dict from point key to leaf so duplicates are found without a tree traversal.
+    hash_tolerance: float (optional) (default=None)
+                    Quantization of the hash keys (see `point_key`). The index serves inserts whose
+                    tolerance equals it; other inserts fall back to `query`.
+
+    Attributes:
+    -----------
+    root: int
+          Slot of the root node (-1 if the tree is empty).
+    leaves: dict
+            Dict mapping leaf index (user-specified) to the slot of its leaf.
+    ndim: int
+          dimension of points in the tree
+    parent, left, right: np.ndarray (capacity,)
+                         Slot of the parent/left child/right child of each node (-1 if none).
+                         Leaves are the nodes whose left child is -1.
+    count: np.ndarray (capacity,)
+           Number of points under each node.
+    cut_dim, cut_val: np.ndarray (capacity,)
+                      Dimension and value of the cut of each branch.
+    bbox: np.ndarray (capacity x 2 x d)
+          Bounding box of each node. For a leaf both rows hold the point itself.
+
+    Example:
+    --------
+    >>> tree = ArrayRCTree()
+    >>> for i, x in enumerate(np.random.randn(100, 2)):
+    ...     tree.insert_point(x, index=i)
+    >>> tree.codisp(99)
+    >>> tree.forget_point(0)
+    """
+
+    def __init__(self, X=None, index_labels=None, precision=9, random_state=None, capacity=64,
+                 hash_index=False, hash_tolerance=None):
+        # Random number generation with provided seed
+        self.rng = check_random_state(random_state)
+        self.leaves = {}
+        self.root = -1
+        self.ndim = None
+        self.capacity = 0
+        self._initial_capacity = max(int(capacity), 2)
+        self.parent = None
+        self.left = None
+        self.right = None
+        self.count = None
+        self.cut_dim = None
+        self.cut_val = None
+        self.bbox = None
+        self._free = []
+        self.hash_tolerance = hash_tolerance
+        self._point_index = {} if hash_index else None
+        if X is not None:
+            X = np.around(np.asarray(X, dtype=np.float64), decimals=precision)
+            if index_labels is None:
+                index_labels = np.arange(X.shape[0], dtype=int)
+            self.index_labels = index_labels
+            self._build(X, index_labels)
+
+    def __setstate__(self, state):
+        # Trees pickled before the hash index was added have none.
+        state.setdefault('hash_tolerance', None)
+        state.setdefault('_point_index', None)
+        if '_mask' not in state and state.get('ndim') is not None:
+            state['_mask'] = np.empty(state['ndim'], dtype=bool)
+        self.__dict__.update(state)
+
+    def __repr__(self):
+        return "ArrayRCTree(leaves={}, nodes={}, capacity={})".format(
+            len(self.leaves), self.capacity - len(self._free), self.capacity)
+
+    def _allocate(self, ndim):
+        """
+        Allocate empty node arrays for points of dimension ndim.
+        """
+        capacity = self._initial_capacity
+        self.ndim = ndim
+        self.capacity = capacity
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.left = np.full(capacity, -1, dtype=np.int32)
+        self.right = np.full(capacity, -1, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.cut_dim = np.zeros(capacity, dtype=np.int32)
+        self.cut_val = np.zeros(capacity, dtype=np.float64)
+        self.bbox = np.zeros((capacity, 2, ndim), dtype=np.float64)
+        self._free = list(range(capacity - 1, -1, -1))
+        # Scratch buffers of the cut kernel.
+        self._bbox_hat = np.empty((2, ndim), dtype=np.float64)
+        self._span = np.empty(ndim, dtype=np.float64)
+        self._mask = np.empty(ndim, dtype=bool)
+
+    def _build(self, X, index_labels):
+        """
+        Replace the content of the tree by a bulk built tree over X.
+        """
+        U, N, labels = unique_points(X, index_labels)
+        self._allocate(U.shape[1])
+        nodes = build_arrays(U, N, self.rng, capacity=self.capacity)
+        self.capacity = nodes['parent'].size
+        for name in ('parent', 'left', 'right', 'count', 'cut_dim', 'cut_val', 'bbox'):
+            setattr(self, name, nodes[name])
+        self._free = list(range(self.capacity - 1, nodes['size'] - 1, -1))
+        self.root = 0
+        self.leaves = {}
+        for slot, row_labels in zip(nodes['leaf_of'], labels):
+            for label in row_labels.tolist():
+                self.leaves[label] = int(slot)
+        if self._point_index is not None:
+            self._point_index = {}
+            for row, slot in enumerate(nodes['leaf_of']):
+                self._point_index.setdefault(point_key(U[row], self.hash_tolerance), int(slot))
+
+    def _grow(self):
+        """
+        Double the number of node slots.
+        """
+        old = self.capacity
+        new = old * 2
+        self.parent = np.concatenate([self.parent, np.full(new - old, -1, dtype=np.int32)])
+        self.left = np.concatenate([self.left, np.full(new - old, -1, dtype=np.int32)])
+        self.right = np.concatenate([self.right, np.full(new - old, -1, dtype=np.int32)])
+        self.count = np.concatenate([self.count, np.zeros(new - old, dtype=np.int64)])
+        self.cut_dim = np.concatenate([self.cut_dim, np.zeros(new - old, dtype=np.int32)])
+        self.cut_val = np.concatenate([self.cut_val, np.zeros(new - old, dtype=np.float64)])
+        self.bbox = np.concatenate([self.bbox, np.zeros((new - old, 2, self.ndim), dtype=np.float64)])
+        self._free.extend(range(new - 1, old - 1, -1))
+        self.capacity = new
+
+    def _new_node(self):
+        """
+        Take a slot from the free list, growing the arrays if necessary.
+        """
+        if not self._free:
+            self._grow()
+        return self._free.pop()
+
+    def _release(self, node):
+        """
+        Give a slot back to the free list.
+        """
+        self.parent[node] = -1
+        self.left[node] = -1
+        self.right[node] = -1
+        self.count[node] = 0
+        self._free.append(node)
+
+    def _get_leaf(self, leaf):
+        try:
+            return self.leaves[leaf]
+        except KeyError:
+            raise KeyError('leaf must be a key to self.leaves')
+
+    def is_leaf(self, node):
+        """
+        Returns True if the slot holds a leaf.
+        """
+        return self.left[node] == -1
+
+    def point(self, node):
+        """
+        Returns the point stored in a leaf slot (view, 1 x d).
+        """
+        return self.bbox[node, 0]
+
+    def sibling(self, node):
+        """
+        Returns the slot of the other child of the node's parent.
+        """
+        parent = self.parent[node]
+        if self.left[parent] == node:
+            return self.right[parent]
+        return self.left[parent]
+
+    def depth(self, leaf):
+        """
+        Depth of a leaf, derived by climbing parent pointers.
+
+        Parameters:
+        -----------
+        leaf: index of leaf
+
+        Returns:
+        --------
+        depth: int
+        """
+        node = self._get_leaf(leaf)
+        depth = 0
+        parent = self.parent
+        node = parent[node]
+        while node != -1:
+            depth += 1
+            node = parent[node]
+        return depth
+
+    def forget_point(self, index):
+        """
+        Delete leaf from tree
+
+        Parameters:
+        -----------
+        index: (Hashable type)
+               Index of leaf in tree
+
+        Returns:
+        --------
+        leaf: int
+              Slot of the deleted leaf
+        """
+        try:
+            leaf = self.leaves[index]
+        except KeyError:
+            raise KeyError('Leaf must be a key to self.leaves')
+        # If duplicate points exist, simply decrement the count of the leaf and of all branches above
+        if self.count[leaf] > 1:
+            self._update_leaf_count_upwards(leaf, inc=-1)
+            return self.leaves.pop(index)
+        if self._point_index is not None:
+            key = point_key(self.bbox[leaf, 0], self.hash_tolerance)
+            if self._point_index.get(key) == leaf:
+                del self._point_index[key]
+        # If leaf is the root...
+        if leaf == self.root:
+            self._release(leaf)
+            self.root = -1
+            self.ndim = None
+            return self.leaves.pop(index)
+        parent = self.parent[leaf]
+        sibling = self.sibling(leaf)
+        # If parent is the root, the sibling becomes the new root
+        if parent == self.root:
+            self.parent[sibling] = -1
+            self.root = sibling
+            self._release(parent)
+            self._release(leaf)
+            return self.leaves.pop(index)
+        # Short-circuit grandparent to sibling
+        grandparent = self.parent[parent]
+        self.parent[sibling] = grandparent
+        if self.left[grandparent] == parent:
+            self.left[grandparent] = sibling
+        else:
+            self.right[grandparent] = sibling
+        # Update leaf counts and bounding boxes above the removed branch
+        self._update_leaf_count_upwards(grandparent, inc=-1)
+        self._relax_bbox_upwards(grandparent, self.bbox[leaf, 0])
+        self._release(parent)
+        self._release(leaf)
+        return self.leaves.pop(index)
+
+    def insert_point(self, point, index, tolerance=None):
+        """
+        Inserts a point into the tree, creating a new leaf
+
+        Parameters:
+        -----------
+        point: np.ndarray (1 x d)
+        index: (Hashable type)
+               Identifier for new leaf in tree
+        tolerance: float
+                   Tolerance for determining duplicate points
+
+        Returns:
+        --------
+        leaf: int
+              Slot of the new leaf in tree
+        """
+        leaf, _ = self.insert_and_codisp(point, index, tolerance=tolerance)
+        return leaf
+
+    def insert_and_codisp(self, point, index, tolerance=None):
+        """
+        Inserts a point into the tree and computes the collusive displacement of its leaf
+        on the same walk that updates the counts above it.
+
+        Parameters:
+        -----------
+        point: np.ndarray (1 x d)
+        index: (Hashable type)
+               Identifier for new leaf in tree
+        tolerance: float
+                   Tolerance for determining duplicate points
+
+        Returns:
+        --------
+        leaf: int
+              Slot of the new leaf in tree
+        codisplacement: float
+                        Same as codisp(index) after the insert.
+        """
+        point = np.asarray(point, dtype=np.float64).ravel()
+        if self.root == -1:
+            if self.bbox is None or self.bbox.shape[2] != point.size:
+                self._allocate(point.size)
+            self.ndim = point.size
+            leaf = self._new_node()
+            self.bbox[leaf, 0] = point
+            self.bbox[leaf, 1] = point
+            self.count[leaf] = 1
+            self.root = leaf
+            self.leaves[index] = leaf
+            if self._point_index is not None:
+                self._point_index[point_key(point, self.hash_tolerance)] = leaf
+            return leaf, 0.
+        # If leaves already exist in tree, check dimensions of point
+        if point.size != self.ndim:
+            raise ValueError("Point must be same dimension as existing points in tree.")
+        # Check for existing index in leaves dict
+        if index in self.leaves:
+            raise KeyError("Index already exists in leaves dict.")
+        # Check for duplicate points
+        duplicate = self.find_duplicate(point, tolerance=tolerance)
+        if duplicate is not None:
+            self.count[duplicate] += 1
+            co_displacement = self._increment_and_codisp_upwards(duplicate)
+            self.leaves[index] = duplicate
+            return duplicate, co_displacement
+        # If tree has points and point is not a duplicate, continue with main algorithm...
+        bbox = self.bbox
+        node = self.root
+        parent = -1
+        while True:
+            cut_dimension, cut = self._insert_point_cut(point, bbox[node])
+            if cut <= bbox[node, 0, cut_dimension]:
+                leaf_is_left = True
+                break
+            elif cut >= bbox[node, 1, cut_dimension]:
+                leaf_is_left = False
+                break
+            parent = node
+            if point[self.cut_dim[node]] <= self.cut_val[node]:
+                node = self.left[node]
+            else:
+                node = self.right[node]
+        leaf = self._new_node()
+        branch = self._new_node()
+        # Arrays may have been reallocated by _new_node.
+        bbox = self.bbox
+        bbox[leaf, 0] = point
+        bbox[leaf, 1] = point
+        self.count[leaf] = 1
+        self.parent[leaf] = branch
+        self.cut_dim[branch] = cut_dimension
+        self.cut_val[branch] = cut
+        if leaf_is_left:
+            self.left[branch] = leaf
+            self.right[branch] = node
+        else:
+            self.left[branch] = node
+            self.right[branch] = leaf
+        self.count[branch] = self.count[node] + 1
+        np.minimum(bbox[node, 0], point, out=bbox[branch, 0])
+        np.maximum(bbox[node, 1], point, out=bbox[branch, 1])
+        self.parent[branch] = parent
+        self.parent[node] = branch
+        # Right under the branch, the displacement of the new leaf is the old subtree.
+        co_displacement = float(self.count[node])
+        if parent == -1:
+            # If a new root was created, assign the attribute
+            self.root = branch
+        else:
+            if self.left[parent] == node:
+                self.left[parent] = branch
+            else:
+                self.right[parent] = branch
+            # Increment leaf count above branch computing CoDisp on the way, and expand bounding boxes
+            co_displacement = max(co_displacement, self._increment_and_codisp_upwards(branch))
+            self._tighten_bbox_upwards(parent, point)
+        self.leaves[index] = leaf
+        if self._point_index is not None:
+            self._point_index[point_key(point, self.hash_tolerance)] = leaf
+        return leaf, co_displacement
+
+    def query(self, point, node=None):
+        """
+        Search for leaf nearest to point
+
+        Parameters:
+        -----------
+        point: np.ndarray (1 x d)
+               Point to search for
+        node: int
+              Slot to start from. Defaults to root node
+
+        Returns:
+        --------
+        nearest: int
+                 Slot of the leaf nearest to queried point in the tree
+        """
+        point = np.asarray(point).ravel()
+        if node is None:
+            node = self.root
+        left = self.left
+        while left[node] != -1:
+            if point[self.cut_dim[node]] <= self.cut_val[node]:
+                node = left[node]
+            else:
+                node = self.right[node]
+        return node
+
+    def disp(self, leaf):
+        """
+        Compute displacement at leaf
+
+        Parameters:
+        -----------
+        leaf: index of leaf
+
+        Returns:
+        --------
+        displacement: int
+                      Displacement if leaf is removed
+        """
+        node = self._get_leaf(leaf)
+        if node == self.root:
+            return 0
+        return int(self.count[self.sibling(node)])
+
+    def codisp(self, leaf):
+        """
+        Compute collusive displacement at leaf
+
+        Parameters:
+        -----------
+        leaf: index of leaf
+
+        Returns:
+        --------
+        codisplacement: float
+                        Collusive displacement if leaf is removed.
+        """
+        node = self._get_leaf(leaf)
+        if node == self.root:
+            return 0
+        parent = self.parent
+        left = self.left
+        right = self.right
+        count = self.count
+        co_displacement = 0.
+        up = parent[node]
+        while up != -1:
+            sibling = right[up] if left[up] == node else left[up]
+            result = count[sibling] / count[node]
+            if result > co_displacement:
+                co_displacement = result
+            node = up
+            up = parent[node]
+        return float(co_displacement)
+
+    def get_bbox(self, branch=None):
+        """
+        Bounding box of all points underneath a given node.
+
+        Parameters:
+        -----------
+        branch: int
+                Starting slot. Defaults to root of tree.
+
+        Returns:
+        --------
+        bbox: np.ndarray (2 x d)
+        """
+        if branch is None:
+            branch = self.root
+        return self.bbox[branch].copy()
+
+    def find_duplicate(self, point, tolerance=None):
+        """
+        If point is a duplicate of existing point in the tree, return the slot of the leaf containing the point,
+        else return None. Uses the hash index when it serves the given tolerance.
+        """
+        if self._point_index is not None and tolerance == self.hash_tolerance:
+            return self._point_index.get(point_key(point, tolerance))
+        nearest = self.query(point)
+        if tolerance is None:
+            if (self.bbox[nearest, 0] == point).all():
+                return nearest
+        else:
+            if np.isclose(self.bbox[nearest, 0], point, rtol=tolerance).all():
+                return nearest
+        return None
+
+    def _update_leaf_count_upwards(self, node, inc=1):
+        """
+        Called after inserting or removing leaves. Updates the stored count of points beneath each node.
+        """
+        count = self.count
+        parent = self.parent
+        while node != -1:
+            count[node] += inc
+            node = parent[node]
+
+    def _increment_and_codisp_upwards(self, node):
+        """
+        Increments the count of every node above node and returns the largest displacement ratio
+        seen on the way (the CoDisp contribution above node).
+        """
+        count = self.count
+        parent = self.parent
+        left = self.left
+        right = self.right
+        co_displacement = 0.
+        up = parent[node]
+        while up != -1:
+            count[up] += 1
+            sibling = right[up] if left[up] == node else left[up]
+            result = count[sibling] / count[node]
+            if result > co_displacement:
+                co_displacement = result
+            node = up
+            up = parent[node]
+        return float(co_displacement)
+
+    def _tighten_bbox_upwards(self, node, point):
+        """
+        Called when new point is inserted. Expands bbox of all nodes above new point
+        if point is outside the existing bbox.
+        """
+        bbox = self.bbox
+        parent = self.parent
+        mask = self._mask
+        while node != -1:
+            b = bbox[node]
+            np.less(point, b[0], out=mask)
+            lt_any = np.count_nonzero(mask)
+            np.greater(point, b[1], out=mask)
+            if not (lt_any or np.count_nonzero(mask)):
+                break
+            np.minimum(b[0], point, out=b[0])
+            np.maximum(b[1], point, out=b[1])
+            node = parent[node]
+
+    def _relax_bbox_upwards(self, node, point):
+        """
+        Called when point is deleted. Contracts bbox of all nodes above deleted point
+        if the deleted point defined the boundary of the bbox.
+        """
+        bbox = self.bbox
+        parent = self.parent
+        mask = self._mask
+        while node != -1:
+            b = bbox[node]
+            np.equal(b[0], point, out=mask)
+            if not np.count_nonzero(mask):
+                np.equal(b[1], point, out=mask)
+                if not np.count_nonzero(mask):
+                    break
+            l = self.left[node]
+            r = self.right[node]
+            np.minimum(bbox[l, 0], bbox[r, 0], out=b[0])
+            np.maximum(bbox[l, 1], bbox[r, 1], out=b[1])
+            node = parent[node]
+
+    def _insert_point_cut(self, point, bbox):
+        """
+        Generates the cut dimension and cut value based on the InsertPoint algorithm.
+
+        Parameters:
+        -----------
+        point: np.ndarray (1 x d)
+               New point to be inserted.
+        bbox: np.ndarray(2 x d)
+              Bounding box of point set S.
+
+        Returns:
+        --------
+        cut_dimension: int
+                       Dimension to cut over.
+        cut: float
+             Value of cut.
+        """
+        bbox_hat = self._bbox_hat
+        span = self._span
+        np.minimum(bbox[0], point, out=bbox_hat[0])
+        np.maximum(bbox[1], point, out=bbox_hat[1])
+        np.subtract(bbox_hat[1], bbox_hat[0], out=span)
+        np.cumsum(span, out=span)
+        r = self.rng.uniform(0, span[-1])
+        cut_dimension = int(np.searchsorted(span, r))
+        if cut_dimension >= self.ndim:
+            raise ValueError("Cut dimension is not finite.")
+        cut = bbox_hat[0, cut_dimension] + span[cut_dimension] - r
+        return cut_dimension, cut
@@ -6,15 +6,66 @@
 @ Company: Ntels Co., Ltd
 """
 import models.rrcf as rrcf
+import models.rrcf_array as rrcf_array
 import models.shingle as shingle
+import itertools
+import signal
 import timeit
+import traceback
+import multiprocessing as mp
+import numpy as np
 import pandas as pd
 import utils.marker as marker
+from multiprocessing import shared_memory
+from models.rcforest import RCForest
+from models.sharded_forest import ShardedForest
 from utils.queue import Queue
+from utils.timer import CallTimer
+
+# NOTE: Tree engines. 'object' keeps the Branch/Leaf object graph, 'array' keeps the nodes in NumPy arrays,
+#       'forest' updates all trees at once with an RCForest, 'sharded' splits the trees across worker processes.
+ENGINES = ('object', 'array', 'forest', 'sharded')
+
+
+def _train_trees(conn, rows, sequences, leaves_size, trees, start=0):
+    """
+    Worker of the parallel training. It streams all points of the shared rows through its trees, exactly like
+    the serial training does, and sends back the CoDisp of every tree and point together with the trees.
+    :param conn: A Connection object. Result pipe to the parent.
+    :param rows: A Numpy array (n x d). Training rows in shared memory.
+    :param sequences: An integer. Shingle size.
+    :param leaves_size: An integer. The size of leaves.
+    :param trees: A List. The trees of this worker.
+    :param start: An integer. Index of the first point; the trees hold the points before it.
+    :return: None
+    """
+    # [*]Signals are handled by the parent process only.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        points = shingle.shingle_view(rows, size=sequences, flat=True)
+        codisp = np.empty((len(trees), len(points)), dtype=np.float64)
+        # [*]Indexes are consecutive, so the queue of the points already in the trees is rebuilt from start.
+        index_queue = Queue(size=leaves_size)
+        for index in range(max(start - leaves_size, 0), start):
+            index_queue.put(index)
+        remove_index = None
+        for k, (index, point) in enumerate(zip(range(start, start + len(points)), points)):
+            if index_queue.full():
+                remove_index = index_queue.get()
+            for t, tree in enumerate(trees):
+                if len(tree.leaves) >= leaves_size:
+                    tree.forget_point(remove_index)
+                _, codisp[t, k] = tree.insert_and_codisp(point, index=index)
+            index_queue.put(index)
+        conn.send((codisp, trees))
+    except Exception:
+        conn.send(traceback.format_exc())
+    conn.close()
 
 
 class RRCF(object):
-    def __init__(self, num_trees, sequences, leaves_size):
+    def __init__(self, num_trees, sequences, leaves_size, engine='object', workers=None, hash_index=False,
+                 random_state=None):
         """Create RRCF object that contains train and emit anomaly scores.
 
         Args:
@@ -24,75 +75,309 @@ class RRCF(object):
                 However, if the shingle size is too large, then smaller scale anomalies might be lost.
             :param leaves_size: An integer. This parameter dictates how many randomly sampled training data points are sent
                 to each tree.
+            :param engine: A String. Tree engine, one of ENGINES.
+            :param workers: An integer. Number of worker processes of the 'sharded' engine. Defaults to CPU count.
+            :param hash_index: A Boolean. Find duplicate points of the 'object' and 'array' engines with a dict
+                lookup instead of a tree query. The 'forest' and 'sharded' engines always do.
+            :param random_state: An integer. Seed of the cuts. Every tree (or forest) gets its own RandomStream
+                spawned from it, so runs with the same seed are reproducible. Fresh OS entropy if None.
         """
+        if engine not in ENGINES:
+            marker.debug_info("Invalid engine \'{}\'. Choose one of {}".format(engine, ENGINES), m_type="ERROR")
+            raise SystemExit()
         self.num_trees = num_trees
         self.sequences = sequences
         self.leaves_size = leaves_size
         self.index_queue = Queue(size=self.leaves_size)
         self.forest = None
         self.threshold = None
+        self.engine = engine
+        self.workers = workers
+        self.hash_index = hash_index
+        self.random_state = random_state
+        # NOTE: Seeds of the trees of every forest built by this model are spawned from this sequence.
+        self._seed_sequence = np.random.SeedSequence(random_state)
+        # NOTE: Execution time of anomaly_score calls.
+        self.timer = CallTimer()
+
+    def __setstate__(self, state):
+        # NOTE: Models pickled before the engine option was added use the object engine.
+        state.setdefault('engine', 'object')
+        state.setdefault('timer', CallTimer())
+        state.setdefault('workers', None)
+        state.setdefault('hash_index', False)
+        state.setdefault('random_state', None)
+        state.setdefault('_seed_sequence', np.random.SeedSequence())
+        self.__dict__.update(state)
+
+    def _new_tree(self, seed, X=None, index_labels=None):
+        """
+        Create a tree of the configured engine, bulk built over X if given.
+        :param seed: A SeedSequence. Seed of the tree's RandomStream.
+        :param X: A Numpy array (n x d). Points to build the tree from.
+        :param index_labels: A sequence. Index of each point.
+        :return: An RCTree or ArrayRCTree object.
+        """
+        if self.engine == 'array':
+            # NOTE: A full tree holds (2 * leaves - 1) nodes.
+            return rrcf_array.ArrayRCTree(X=X, index_labels=index_labels, random_state=seed,
+                                          capacity=2 * self.leaves_size, hash_index=self.hash_index)
+        return rrcf.RCTree(X=X, index_labels=index_labels, random_state=seed, hash_index=self.hash_index)
+
+    def _new_forest(self):
+        """
+        Create an empty forest of the configured engine.
+        :return: A list of trees, an RCForest or a ShardedForest object.
+        """
+        if self.engine == 'forest':
+            return RCForest(self.num_trees, self.leaves_size, random_state=self._seed_sequence.spawn(1)[0])
+        if self.engine == 'sharded':
+            return ShardedForest(self.num_trees, self.leaves_size, workers=self.workers,
+                                 random_state=self._seed_sequence.spawn(1)[0])
+        return [self._new_tree(seed) for seed in self._seed_sequence.spawn(self.num_trees)]
 
-    def train_rrcf(self, date_time, data, timer=False):
+    def train_rrcf(self, date_time, data, timer=False, stream=False, workers=None):
         """
         Training the RRCF(Robust Random Cut Forest) model using given data.
         Args:
             :param date_time: A Datatime object. Date and time for data recorded.
             :param data: A Numpy object. The n-dimension data for input.
             :param timer: A Boolean. Returns training time.
+            :param stream: A Boolean. Returns a generator of (date, avg_codisp) that trains one point per step,
+                so nothing is kept per point. The timer is not used in this mode.
+            :param workers: An integer. Train disjoint subsets of the trees in this many processes ('object' and
+                'array' engines). The result is identical to serial training.
             :return:
                 - avg_codisp: A dictionary. The Collusive displacement(anomaly score)
                 - training time
+                - generator: If stream is True.
+        """
+        if not self._start_training():
+            return None
+
+        # NOTE: Build a sequences points; a strided view of the data, flattened like insert_point does.
+        points = shingle.shingle_view(data, size=self.sequences, flat=True)
+        # NOTE: The date of a point is the date of its last row.
+        dates = date_time.iloc[self.sequences-1:] if hasattr(date_time, 'iloc') else date_time[self.sequences-1:]
+
+        parallel = workers is not None and workers > 1 and self.engine in ('object', 'array')
+        if stream and not parallel:
+            return self._train_points(dates, points)
+
+        # NOTE: Timer for function execution time.
+        train_start = timeit.default_timer()
+
+        # NOTE: The average of Collusive Displacement(CoDisp) of each point.
+        if parallel:
+            scores = self._train_parallel(data, len(points), workers)
+        else:
+            scores = np.empty(len(points), dtype=np.float64)
+            for index, (_, score) in enumerate(self._train_points(dates, points)):
+                scores[index] = score
+
+        if stream:
+            return zip(dates, scores.tolist())
+        avg_codisp = dict(zip(dates, scores.tolist()))
+
+        # NOTE: Timer for function execution time.
+        train_end = timeit.default_timer()
+
+        if timer:
+            return avg_codisp, train_end-train_start
+        else:
+            return avg_codisp
+
+    def train_rrcf_chunks(self, chunks, workers=None):
+        """
+        Generator that trains the model on consecutive blocks of rows (e.g. `pandas.read_csv(..., chunksize=n)`),
+        so the training data never has to fit in memory. The last sequences - 1 rows of a block are carried over
+        to the next one, so the points are those of train_rrcf on the concatenated rows.
+        Args:
+            :param chunks: An iterable of (date_time, data) blocks of rows.
+            :param workers: An integer. Train disjoint subsets of the trees of every block in this many processes
+                ('object' and 'array' engines). The trees go to the workers and back once per block, so large
+                blocks pay off best. The result is identical to serial training.
+            :return:
+                - generator: (date, avg_codisp) of each point.
+        """
+        if not self._start_training():
+            return
+
+        parallel = workers is not None and workers > 1 and self.engine in ('object', 'array')
+        # NOTE: The dates are shingled like the rows; the date of a point is the date of its last row.
+        date_chunks, data_chunks = itertools.tee(chunks)
+        dates = shingle.shingle_chunks((np.asarray(date_time) for date_time, _ in date_chunks), self.sequences)
+        blocks = shingle.shingle_chunks((np.asarray(data, dtype=np.float64) for _, data in data_chunks),
+                                        self.sequences, flat=True, rows=True)
+        start = 0
+        for date_windows, (data, points) in zip(dates, blocks):
+            if parallel:
+                scores = self._train_parallel(data, len(points), workers, start=start)
+                yield from zip(date_windows[:, -1], scores.tolist())
+            else:
+                yield from self._train_points(date_windows[:, -1], points, start=start)
+            start += len(points)
+
+    def _start_training(self):
+        """
+        Build a new forest and index queue for training; asks first if a forest already exists.
+        :return:
+            A Boolean. False if the existing forest is kept.
         """
         if self.forest is not None:
             flag = input("[@] Warning:\n"
                          "\tForest is already exist. Do you want to override? y/[n]: ") or 'n'
             if flag.lower() != 'y':
-                return None
+                return False
 
-        # NOTE: Timer for function execution time.
-        train_start = timeit.default_timer()
-
-        self.forest = []
         # NOTE: Build a forest.
-        for _ in range(self.num_trees):
-            tree = rrcf.RCTree()
-            self.forest.append(tree)
+        self.forest = self._new_forest()
+        self.index_queue = Queue(size=self.leaves_size)
+        return True
+
+    def _train_parallel(self, data, num_points, workers, start=0):
+        """
+        Train the trees of self.forest in worker processes over a shared memory copy of the rows, then merge the
+        trained trees back in order. The CoDisp are averaged in tree order, so the scores are bit-identical to
+        the serial training.
+        :param data: A Numpy array (n x d). Training rows.
+        :param num_points: An integer. Number of points (shingles).
+        :param workers: An integer. Number of worker processes.
+        :param start: An integer. Index of the first point (see train_rrcf_chunks).
+        :return:
+            A Numpy array (num_points). The average CoDisp of each point.
+        """
+        data = np.asarray(data, dtype=np.float64)
+        workers = min(workers, self.num_trees)
+        groups = np.array_split(np.arange(self.num_trees), workers)
+
+        context = mp.get_context('fork')
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        conns = []
+        procs = []
+        try:
+            rows = np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)
+            rows[:] = data
+            for group in groups:
+                parent_conn, child_conn = context.Pipe()
+                trees = [self.forest[k] for k in group]
+                process = context.Process(target=_train_trees,
+                                          args=(child_conn, rows, self.sequences, self.leaves_size, trees, start),
+                                          name="rrcf_train_{}".format(group[0]), daemon=True)
+                process.start()
+                child_conn.close()
+                conns.append(parent_conn)
+                procs.append(process)
 
-        # NOTE: Build a sequences points.
-        points = shingle.shingle(data, size=self.sequences)
+            # NOTE: Every worker is read and joined before a failure is raised, so none outlives the shared rows.
+            replies = []
+            for group, conn in zip(groups, conns):
+                try:
+                    replies.append(conn.recv())
+                except EOFError:
+                    replies.append("Worker of trees {}..{} exited without a reply.".format(group[0], group[-1]))
+            for process in procs:
+                process.join()
+            failures = [reply for reply in replies if isinstance(reply, str)]
+            if failures:
+                raise RuntimeError("Training worker failed:\n{}".format('\n'.join(failures)))
+            forest = []
+            codisp = []
+            for reply in replies:
+                codisp.append(reply[0])
+                forest += reply[1]
+        finally:
+            # NOTE: Workers still running after an error in this process (e.g. KeyboardInterrupt) are stopped.
+            for process in procs:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            for conn in conns:
+                conn.close()
+            rows = None
+            shm.close()
+            shm.unlink()
 
-        # NOTE: Initialize the average of Collusive Displacement(CoDisp).
-        avg_codisp = {}
+        self.forest = forest
+        scores = np.zeros(num_points, dtype=np.float64)
+        for tree_codisp in np.concatenate(codisp):
+            scores += tree_codisp / self.num_trees
+
+        # NOTE: The index queue ends as in the serial training, with the last leaves_size indexes.
+        self.index_queue = Queue(size=self.leaves_size)
+        for index in range(max(start + num_points - self.leaves_size, 0), start + num_points):
+            self.index_queue.put(index)
+        return scores
+
+    def _train_points(self, dates, points, start=0):
+        """
+        Generator that streams points through the forest.
+        :param dates: A sequence. The date of each point.
+        :param points: A Numpy array. Flattened shingles.
+        :param start: An integer. Index of the first point.
+        :return:
+            - generator: (date, avg_codisp) of each point.
+        """
         remove_index = None
 
-        for index, point in enumerate(points):
+        for index, (date, point) in enumerate(zip(dates, points), start):
             # NOTE: For each tree in the forest...
             if self.index_queue.full():
                 # NOTE: If leaves are full, get first index in queue(FIFO).
                 remove_index = self.index_queue.get()
 
-            for tree in self.forest:
-                # NOTE: If tree is above permitted size, drop the oldest point (FIFO)
-                if len(tree.leaves) >= self.leaves_size:
-                    tree.forget_point(remove_index)
-                # NOTE: Insert the new point into the tree
-                tree.insert_point(point, index=index)
+            if self.engine in ('forest', 'sharded'):
+                # NOTE: Forget, insert and CoDisp for all trees at once.
+                forget = remove_index if len(self.forest.leaves) >= self.leaves_size else None
+                avg_codisp = self.forest.update(point, index, forget=forget)
+            else:
+                avg_codisp = 0
+                for tree in self.forest:
+                    # NOTE: If tree is above permitted size, drop the oldest point (FIFO)
+                    if len(tree.leaves) >= self.leaves_size:
+                        tree.forget_point(remove_index)
+                    # NOTE: Insert the new point into the tree and compute its CoDisp on the same walk
+                    _, codisp = tree.insert_and_codisp(point, index=index)
 
-                # NOTE: Compute CoDisp on the new point and take the average among all trees
-                if not date_time[index+self.sequences-1] in avg_codisp:
-                    avg_codisp[date_time[index+self.sequences-1]] = 0
-                avg_codisp[date_time[index+self.sequences-1]] += tree.codisp(index) / self.num_trees
+                    # NOTE: Take the average CoDisp among all trees
+                    avg_codisp += codisp / self.num_trees
 
             # NOTE: Insert new points
             self.index_queue.put(index)
+            yield date, avg_codisp
 
-        # NOTE: Timer for function execution time.
-        train_end = timeit.default_timer()
+    def bootstrap(self, data, timer=False):
+        """
+        Build the forest at once from the last `leaves_size` shingles of the data, instead of streaming every
+        point through insert_point. Afterwards anomaly_score continues as if those shingles had been streamed.
+        :param data: A Numpy array. The n-dimension data for input. (Needs leaves_size + sequences - 1 rows
+            for a full window.)
+        :param timer: A Boolean. Returns build time.
+        :return:
+            - build time, if timer is True.
+        """
+        build_start = timeit.default_timer()
 
-        if timer:
-            return avg_codisp, train_end-train_start
+        # NOTE: Last leaves_size shingles, flattened like insert_point does.
+        data = data[-(self.leaves_size + self.sequences - 1):]
+        points = shingle.shingle_view(data, size=self.sequences, flat=True)
+        labels = list(range(len(points)))
+
+        if self.engine in ('forest', 'sharded'):
+            self.forest = self._new_forest()
+            self.forest.build(points, labels)
         else:
-            return avg_codisp
+            self.forest = [self._new_tree(seed, X=points, index_labels=labels)
+                           for seed in self._seed_sequence.spawn(self.num_trees)]
+
+        # NOTE: The index queue holds the inserted indexes in FIFO order.
+        self.index_queue = Queue(size=self.leaves_size)
+        for index in labels:
+            self.index_queue.put(index)
+
+        build_end = timeit.default_timer()
+        if timer:
+            return build_end - build_start
 
     def anomaly_score(self, date, data, with_date=False):
         """
@@ -107,6 +392,48 @@ class RRCF(object):
         if self.forest is None:
             marker.debug_info("There is no pre-trained model. It will train the new model.", m_type="INFO")
 
+        stime = timeit.default_timer()
+        avg_codisp = self._score_point(data)
+        self.timer.record(timeit.default_timer() - stime)
+
+        if with_date is True:
+            return [date[-1], avg_codisp]
+        else:
+            return avg_codisp
+
+    def anomaly_score_batch(self, dates, points, with_date=False):
+        """
+        Compute the anomaly scores of a block of consecutive shingles, as if anomaly_score were called for each
+        of them in order.
+        :param dates: A sequence. The date of each shingle (of its last row).
+        :param points: A Numpy array (m x sequences*d or m x sequences x d). Consecutive shingles, e.g. a
+            shingle.shingle_view of the rows.
+        :param with_date: A Boolean. Returns [date, score] pairs if it is True.
+        :return:
+            - scores: A Numpy array (m). The Collusive displacement(anomaly score) of each shingle.
+            - [[date, score], ...]: If with_date is True.
+        """
+        if self.forest is None:
+            marker.debug_info("There is no pre-trained model. It will train the new model.", m_type="INFO")
+
+        scores = np.empty(len(points), dtype=np.float64)
+        for i, point in enumerate(points):
+            stime = timeit.default_timer()
+            scores[i] = self._score_point(point)
+            self.timer.record(timeit.default_timer() - stime)
+
+        if with_date is True:
+            return [[date, score] for date, score in zip(dates, scores.tolist())]
+        else:
+            return scores
+
+    def _score_point(self, data):
+        """
+        Forget the oldest point if the window is full, insert the new point and return its average CoDisp.
+        :param data: A Numpy array. One shingle.
+        :return:
+            A Float. The average CoDisp over the trees.
+        """
         avg_codisp = 0
         insert_index = -1
 
@@ -117,25 +444,27 @@ class RRCF(object):
         elif self.index_queue.empty():
             # NOTE: If queue is empty, initialize the index.
             index = 0
-            self.forest = []
             # NOTE: Build a forest.
-            for _ in range(self.num_trees):
-                tree = rrcf.RCTree()
-                self.forest.append(tree)
+            self.forest = self._new_forest()
         else:
             # NOTE: Get last number of index queue.
-            index = self.index_queue.indexList[-1]
+            index = self.index_queue[-1]
             index += 1
 
         # NOTE: Adding a node to the tree
-        for tree in self.forest:
-            if len(tree.leaves) >= self.leaves_size:
-                tree.forget_point(index)
-
+        if self.engine in ('forest', 'sharded'):
+            forget = index if len(self.forest.leaves) >= self.leaves_size else None
             insert_index = index % self.leaves_size
-            tree.insert_point(data, index=insert_index)
+            avg_codisp = self.forest.update(data, insert_index, forget=forget)
+        else:
+            for tree in self.forest:
+                if len(tree.leaves) >= self.leaves_size:
+                    tree.forget_point(index)
 
-            avg_codisp += tree.codisp(insert_index) / self.num_trees
+                insert_index = index % self.leaves_size
+                _, codisp = tree.insert_and_codisp(data, index=insert_index)
+
+                avg_codisp += codisp / self.num_trees
 
         if insert_index <= -1:
             marker.debug_info("Invalid \'insert_index\' value. We have \'{}\'".format(-1), m_type="ERROR")
@@ -143,11 +472,7 @@ class RRCF(object):
 
         # NOTE: Inserting new index number
         self.index_queue.put(insert_index)
-
-        if with_date is True:
-            return [date[-1], avg_codisp]
-        else:
-            return avg_codisp
+        return avg_codisp
 
     def calc_threshold(self, score, q, with_data=False):
         """
@@ -173,7 +498,7 @@ class RRCF(object):
         else:
             marker.debug_info('Invalid data type \'{}\''.format(type(score)), m_type='ERROR')
 
-        threshold = sdf.quantile(q=q)
+        threshold = sdf.quantile(q=q, numeric_only=True)
 
         if with_data:
             anomaly_result = sdf[sdf['Anomaly_score'] >= threshold['Anomaly_score']]
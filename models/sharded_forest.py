@@ -0,0 +1,274 @@
+"""
+@ File name: sharded_forest.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+import os
+import signal
+import timeit
+import traceback
+import weakref
+import multiprocessing as mp
+import numpy as np
+
+from multiprocessing import shared_memory
+from models.rcforest import RCForest
+from utils.timer import CallTimer
+
+
+def _shard_worker(conn, buffer, ndim, slot, shard, inherited=()):
+    """
+    Worker loop of one shard. It reads the point from shared memory, updates its RCForest and writes the
+    partial CoDisp sum into its result slot.
+    :param conn: A Connection object. Command pipe to the parent.
+    :param buffer: A Numpy array. Shared memory; [0:ndim] is the point, [ndim + slot] is the result of this shard.
+    :param ndim: An integer. Dimension of points.
+    :param slot: An integer. Shard number.
+    :param shard: An RCForest object. Trees of this shard.
+    :param inherited: A List. Parent ends of the pipes of this forest, inherited by the fork.
+    :return: None
+    """
+    # [*]Signals are handled by the parent process only.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # [*]Only the parent may hold the other end, so the pipe reaches EOF when the parent dies (kill -9, OOM).
+    for parent_conn in inherited:
+        parent_conn.close()
+    point = buffer[:ndim]
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            return
+        try:
+            if command[0] == 'update':
+                _, index, forget = command
+                if forget is not None:
+                    shard.forget_point(forget)
+                _, codisp = shard.insert_and_codisp(point, index)
+                buffer[ndim + slot] = codisp.sum()
+                conn.send(None)
+            elif command[0] == 'state':
+                conn.send(shard)
+            elif command[0] == 'close':
+                conn.close()
+                return
+        except Exception:
+            conn.send(traceback.format_exc())
+
+
+def _stop_workers(conns, procs, shm):
+    """
+    Stop the workers of a forest and release its shared memory.
+    """
+    for conn in conns:
+        try:
+            conn.send(('close',))
+            conn.close()
+        except OSError:
+            pass
+    for process in procs:
+        process.join()
+    shm.close()
+    shm.unlink()
+
+
+class ShardedForest(object):
+    """
+    Robust random cut forest whose trees are partitioned across persistent worker processes.
+
+    Each worker owns an RCForest with its share of the trees. For every point the parent writes the point into a
+    shared memory block, the workers update their shards in parallel and write their partial CoDisp sums back into
+    the same block, and the parent combines them into the mean CoDisp. Only a small command tuple goes through
+    the pipes; the point itself is never pickled.
+
+    Workers are started on the first update. When the forest is pickled (e.g. by `dill` in
+    `anomaly_detection.model_save`) the shards are fetched back from the workers, and an unpickled forest
+    restarts its workers on its first update. If a worker fails, its shard may be half updated: the workers are
+    stopped and the forest refuses any further use.
+
+    Parameters:
+    -----------
+    num_trees: int
+               Number of trees over all shards.
+    leaves_size: int
+                 Maximum number of points in the forest.
+    workers: int (optional)
+             Number of worker processes. Defaults to the number of CPUs.
+    random_state: int, SeedSequence or None (optional)
+                  Seed; every shard gets its own independent RandomStream spawned from it.
+    """
+
+    def __init__(self, num_trees, leaves_size, workers=None, random_state=None):
+        self.num_trees = num_trees
+        self.leaves_size = leaves_size
+        self.workers = max(1, min(workers or os.cpu_count() or 1, num_trees))
+        self.leaves = {}
+        self.ndim = None
+        self.timer = CallTimer()
+        # NOTE: Forked workers inherit the global numpy random state, so each shard needs its own seed.
+        if not isinstance(random_state, np.random.SeedSequence):
+            random_state = np.random.SeedSequence(random_state)
+        seeds = random_state.spawn(self.workers)
+        sizes = [len(s) for s in np.array_split(np.arange(num_trees), self.workers)]
+        self._shards = [RCForest(size, leaves_size, random_state=seed) for size, seed in zip(sizes, seeds)]
+        self._procs = None
+        # [*]Error of the worker failure that made the forest unusable.
+        self._failure = None
+
+    def __len__(self):
+        return self.num_trees
+
+    def __repr__(self):
+        return "ShardedForest(trees={}, workers={}, leaves={}, {})".format(
+            self.num_trees, self.workers, len(self.leaves), self.timer)
+
+    def __getstate__(self):
+        # NOTE: The fetched shards are only referenced by the state, so they are released once it is pickled.
+        state = self.__dict__.copy()
+        state['_shards'] = self.shards()
+        for key in ('_procs', '_conns', '_shm', '_buffer', '_finalizer'):
+            state.pop(key, None)
+        state['_procs'] = None
+        return state
+
+    def __setstate__(self, state):
+        # NOTE: Pickles of older versions have no failure attribute.
+        state.setdefault('_failure', None)
+        self.__dict__.update(state)
+
+    def _start(self, ndim):
+        """
+        Create the shared memory block and start one worker per shard.
+        """
+        self.ndim = ndim
+        context = mp.get_context('fork')
+        self._shm = shared_memory.SharedMemory(create=True, size=8 * (ndim + self.workers))
+        self._buffer = np.ndarray((ndim + self.workers,), dtype=np.float64, buffer=self._shm.buf)
+        self._conns = []
+        self._procs = []
+        for slot, shard in enumerate(self._shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_worker,
+                                      args=(child_conn, self._buffer, ndim, slot, shard, self._conns + [parent_conn]),
+                                      name="rrcf_shard_{}".format(slot), daemon=True)
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(process)
+        # NOTE: The workers own the shards from now on; the parent's copies would only go stale.
+        self._shards = None
+        # NOTE: Workers are stopped when the forest is garbage collected or the interpreter exits.
+        self._finalizer = weakref.finalize(self, _stop_workers, self._conns, self._procs, self._shm)
+
+    def _check(self):
+        if self._failure is not None:
+            raise RuntimeError("ShardedForest is unusable after a shard worker failed:\n{}".format(self._failure))
+
+    def _request(self, command):
+        """
+        Send a command to every worker and read their replies. On a failure all the pipes are still read, so none
+        is left with a stale reply, then the workers are stopped and the forest is marked unusable.
+        :param command: A Tuple. Command of _shard_worker.
+        :return:
+            A List of the replies, in shard order.
+        """
+        replies = []
+        for slot, conn in enumerate(self._conns):
+            try:
+                conn.send(command)
+                replies.append(None)
+            except OSError as e:
+                replies.append("Shard {} is gone: {!r}".format(slot, e))
+        for slot, conn in enumerate(self._conns):
+            if replies[slot] is not None:
+                continue
+            try:
+                replies[slot] = conn.recv()
+            except (EOFError, OSError) as e:
+                replies[slot] = "Shard {} is gone: {!r}".format(slot, e)
+        failures = [reply for reply in replies if isinstance(reply, str)]
+        if failures:
+            self._failure = '\n'.join(failures)
+            self._stop()
+            self._check()
+        return replies
+
+    def update(self, point, index, forget=None):
+        """
+        Forget the oldest point, insert the new point and return its mean CoDisp over all shards.
+        :param point: A Numpy array. New point.
+        :param index: A Hashable. Index of new point.
+        :param forget: A Hashable. Index of the point to forget first. Nothing is forgotten if None.
+        :return:
+            - avg_codisp: A Float. The mean collusive displacement of the new point.
+        """
+        self._check()
+        stime = timeit.default_timer()
+        point = np.asarray(point, dtype=np.float64).ravel()
+        if self._procs is None:
+            self._start(point.size)
+        elif point.size != self.ndim:
+            raise ValueError("Point must be same dimension as existing points in tree.")
+        self._buffer[:self.ndim] = point
+        self._request(('update', index, forget))
+        if forget is not None:
+            self.leaves.pop(forget, None)
+        self.leaves[index] = None
+        avg_codisp = self._buffer[self.ndim:].sum() / self.num_trees
+        self.timer.record(timeit.default_timer() - stime)
+        return avg_codisp
+
+    def build(self, X, index_labels=None):
+        """
+        Replace the content of every shard by trees bulk built over X. Running workers are stopped first and
+        restarted on the next update.
+        :param X: A Numpy array (n x d). Points.
+        :param index_labels: A sequence. Index of each point. Defaults to 0..n-1.
+        :return: None
+        """
+        X = np.asarray(X, dtype=np.float64)
+        X = X.reshape(X.shape[0], -1)
+        if index_labels is None:
+            index_labels = np.arange(X.shape[0], dtype=int)
+        self._check()
+        self.close()
+        for shard in self._shards:
+            shard.build(X, index_labels)
+        self.leaves = dict.fromkeys(np.asarray(index_labels).tolist())
+        self.ndim = X.shape[1]
+
+    def shards(self):
+        """
+        Returns the current RCForest of every shard, fetched from the workers if they are running. Fetched shards
+        are copies that the forest does not keep.
+        :return:
+            A List of RCForest objects.
+        """
+        self._check()
+        if self._procs is None:
+            return self._shards
+        return self._request(('state',))
+
+    def close(self):
+        """
+        Stop the workers and release the shared memory. The shards are kept, so the forest can continue later.
+        An unusable forest only stops its workers.
+        :return: None
+        """
+        if self._procs is None:
+            return
+        if self._failure is not None:
+            self._stop()
+            return
+        self._shards = self.shards()
+        self._stop()
+
+    def _stop(self):
+        if self._procs is None:
+            return
+        self._buffer = None
+        self._finalizer()
+        self._procs = None
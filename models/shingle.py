@@ -1,10 +1,13 @@
 from collections import deque
 import numpy as np
 
+from numpy.lib.stride_tricks import sliding_window_view
+
 
 def shingle(sequence, size):
     """
     Generator that yields shingles (a rolling window) of a given size.
+    NumPy arrays are shingled with `shingle_view`, so each shingle is a read-only view and nothing is copied.
 
     Parameters
     ----------
@@ -13,12 +16,78 @@ def shingle(sequence, size):
     size : int
            size of shingle (window)
     """
+    if isinstance(sequence, np.ndarray):
+        yield from shingle_view(sequence, size)
+        return
     iterator = iter(sequence)
-    init = (next(iterator) for _ in range(size))
-    window = deque(init, maxlen=size)
+    window = deque(maxlen=size)
+    for elem in iterator:
+        window.append(elem)
+        if len(window) == size:
+            break
     if len(window) < size:
         raise IndexError('Sequence smaller than window size')
     yield np.asarray(window)
     for elem in iterator:
         window.append(elem)
         yield np.asarray(window)
+
+
+def shingle_view(data, size, flat=False):
+    """
+    All shingles of an array as one strided, read-only view (no copy).
+
+    Parameters
+    ----------
+    data : np.ndarray (n x d)
+           Rows to be shingled
+    size : int
+           size of shingle (window)
+    flat : bool (optional) (default=False)
+           If True, each shingle is flattened to size * d values in row order (like `shingle(...).ravel()`).
+           A non C-contiguous input is copied once.
+
+    Returns
+    -------
+    shingles : np.ndarray (n - size + 1 x size x d), or (n - size + 1 x size * d) if flat
+    """
+    data = np.asarray(data)
+    if len(data) < size:
+        raise IndexError('Sequence smaller than window size')
+    if flat:
+        # Consecutive rows are adjacent in memory, so a flattened shingle is a contiguous slice of the data.
+        data = np.ascontiguousarray(data)
+        width = data[0].size
+        return sliding_window_view(data.reshape(-1), size * width)[::width]
+    if data.ndim == 1:
+        return sliding_window_view(data, size)
+    return np.moveaxis(sliding_window_view(data, size, axis=0), -1, 1)
+
+
+def shingle_chunks(chunks, size, flat=False, rows=False):
+    """
+    Generator that shingles a stream of row blocks (e.g. `pandas.read_csv(..., chunksize=n)`) that does not fit
+    in memory. It yields the shingles of each block as a view; the last size - 1 rows of a block are carried over,
+    so the shingles of all blocks together are those of the concatenated rows. Blocks too short for a shingle
+    yield nothing.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray (m x d)
+             Consecutive blocks of rows
+    size : int
+           size of shingle (window)
+    flat : bool (optional) (default=False)
+           Flatten each shingle (see `shingle_view`)
+    rows : bool (optional) (default=False)
+           Yield (block, shingles), the block being the shingled rows with the carried-over rows first
+    """
+    tail = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        if tail is not None and len(tail):
+            chunk = np.concatenate([tail, chunk])
+        if len(chunk) >= size:
+            shingles = shingle_view(chunk, size, flat=flat)
+            yield (chunk, shingles) if rows else shingles
+        tail = chunk[max(len(chunk) - size + 1, 0):]
@@ -0,0 +1,287 @@
+"""
+@ File name: threshold.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Streaming quantile engines for the anomaly threshold.
+
+    - ExactQuantile: exact quantile of a multiset with O(log n) insert and delete. Same value as
+      `pandas.Series.quantile(q)` (linear interpolation).
+    - P2Quantile: approximate quantile with O(1) update and constant memory (P-square algorithm,
+      R. Jain and I. Chlamtac, CACM 28(10), 1985).
+
+Both engines provide `insert`, `value`, `reset` (restart from a window of values, e.g. at a rollover) and `len`.
+Only ExactQuantile can delete a value (`remove`).
+"""
+import heapq
+import math
+import utils.marker as marker
+
+from collections import defaultdict
+
+# NOTE: Threshold engines. 'exact' reproduces the pandas quantile, 'p2' approximates it in constant memory.
+THRESHOLD_ENGINES = ('exact', 'p2')
+
+
+def make_engine(name, q):
+    """
+    Create a threshold engine.
+    :param name: A String. One of THRESHOLD_ENGINES.
+    :param q: A Float. Quantile (0 <= q <= 1).
+    :return:
+        An ExactQuantile or P2Quantile object.
+    """
+    if q < 0 or q > 1:
+        marker.debug_info("Quantile value \'q\' should be range in 0 < q < 1", m_type="ERROR")
+        raise SystemExit
+    if name == 'exact':
+        return ExactQuantile(q)
+    if name == 'p2':
+        return P2Quantile(q)
+    marker.debug_info("Invalid threshold engine \'{}\'. Choose one of {}".format(name, THRESHOLD_ENGINES),
+                      m_type="ERROR")
+    raise SystemExit
+
+
+def _lerp(a, b, t):
+    """
+    Linear interpolation between a and b, rounded like numpy's quantile (which pandas uses).
+    """
+    diff = b - a
+    if t >= 0.5:
+        return b - diff * (1 - t)
+    return a + diff * t
+
+
+def linear_quantile(sorted_values, q):
+    """
+    Quantile of sorted values with linear interpolation.
+    :param sorted_values: A List. Values in ascending order.
+    :param q: A Float. Quantile.
+    :return:
+        A Float. None if there are no values.
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return None
+    position = (n - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, n - 1)
+    return _lerp(sorted_values[lower], sorted_values[upper], position - lower)
+
+
+class ExactQuantile(object):
+    """
+    Exact q-quantile of a multiset of scores.
+
+    The values are split into two heaps: `_low` (a max-heap) holds the k + 1 smallest values, where k = floor((n-1)q)
+    is the rank of the lower interpolation point, and `_high` (a min-heap) holds the rest. The quantile only needs the
+    top of each heap. Deleted values are only counted in `_delayed` and dropped when they reach the top of a heap.
+    """
+
+    def __init__(self, q):
+        """
+        :param q: A Float. Quantile (0 <= q <= 1).
+        """
+        self.q = q
+        self._low = []
+        self._high = []
+        self._low_size = 0
+        self._high_size = 0
+        self._delayed = defaultdict(int)
+
+    def __len__(self):
+        return self._low_size + self._high_size
+
+    def __repr__(self):
+        return "ExactQuantile(q={}, n={}, value={})".format(self.q, len(self), self.value())
+
+    def reset(self, values=()):
+        """
+        Replace the content by the given values in O(n).
+        :param values: An iterable of Floats.
+        :return: None
+        """
+        values = sorted(values)
+        split = math.floor((len(values) - 1) * self.q) + 1 if values else 0
+        self._low = [-value for value in values[:split]]
+        self._high = values[split:]
+        heapq.heapify(self._low)
+        self._low_size = len(self._low)
+        self._high_size = len(self._high)
+        self._delayed = defaultdict(int)
+
+    def insert(self, value):
+        """
+        Add a value. O(log n).
+        :param value: A Float.
+        :return: None
+        """
+        if self._low_size and value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._rebalance()
+
+    def remove(self, value):
+        """
+        Delete one copy of a value that was inserted before. O(log n) amortized.
+        :param value: A Float.
+        :return: None
+        """
+        self._delayed[value] += 1
+        # NOTE: All values of _high are >= the top of _low, so a value up to that top is counted in _low.
+        if self._low_size and value <= -self._low[0]:
+            self._low_size -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_size -= 1
+            if self._high and value == self._high[0]:
+                self._prune(self._high, 1)
+        self._rebalance()
+
+    def value(self):
+        """
+        Current quantile.
+        :return:
+            A Float. None if empty.
+        """
+        n = len(self)
+        if n == 0:
+            return None
+        position = (n - 1) * self.q
+        lower = -self._low[0]
+        if self._high_size == 0:
+            return lower
+        return _lerp(lower, self._high[0], position - math.floor(position))
+
+    def _prune(self, heap, sign):
+        """
+        Pop deleted values from the top of a heap.
+        """
+        while heap:
+            value = sign * heap[0]
+            if self._delayed.get(value, 0) == 0:
+                break
+            self._delayed[value] -= 1
+            if self._delayed[value] == 0:
+                del self._delayed[value]
+            heapq.heappop(heap)
+
+    def _rebalance(self):
+        """
+        Move values between the heaps until _low holds exactly floor((n-1)q) + 1 values.
+        """
+        n = len(self)
+        target = math.floor((n - 1) * self.q) + 1 if n else 0
+        while self._low_size > target:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, -1)
+        while self._low_size < target:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._high_size -= 1
+            self._low_size += 1
+            self._prune(self._high, 1)
+        # NOTE: The tops must be live values for value() and insert().
+        self._prune(self._low, -1)
+        self._prune(self._high, 1)
+
+
+class P2Quantile(object):
+    """
+    Approximate q-quantile with the P-square algorithm: five markers track the minimum, q/2, q, (1+q)/2 quantiles
+    and the maximum, and their heights are adjusted with a piecewise parabolic formula on every value.
+    Values cannot be deleted; use `reset` to restart from a window.
+    """
+
+    def __init__(self, q):
+        """
+        :param q: A Float. Quantile (0 <= q <= 1).
+        """
+        self.q = q
+        self.reset()
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return "P2Quantile(q={}, n={}, value={})".format(self.q, self.count, self.value())
+
+    def reset(self, values=()):
+        """
+        Restart the estimate from the given values.
+        :param values: An iterable of Floats.
+        :return: None
+        """
+        q = self.q
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0., 2 * q, 4 * q, 2 + 2 * q, 4.]
+        self.increments = [0., q / 2, q, (1 + q) / 2, 1.]
+        for value in values:
+            self.insert(value)
+
+    def insert(self, value):
+        """
+        Add a value. O(1).
+        :param value: A Float.
+        :return: None
+        """
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            # NOTE: The first five values are the initial marker heights.
+            heights.append(value)
+            heights.sort()
+            return
+        positions = self.positions
+        # NOTE: Find the cell of the value, extending the extreme markers if needed.
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        # NOTE: Adjust the three middle markers.
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def value(self):
+        """
+        Current quantile estimate; exact while there are 5 values or fewer.
+        :return:
+            A Float. None if empty.
+        """
+        if self.count <= 5:
+            return linear_quantile(self.heights, self.q)
+        return self.heights[2]
+
+    def _parabolic(self, i, step):
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
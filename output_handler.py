@@ -10,7 +10,6 @@ import os
 import csv
 import pandas as pd
 import config.file_path as fp
-import time
 import traceback
 import glob
 import timeit
@@ -22,6 +21,7 @@ from multiprocessing import Process, Queue
 from utils.logger import StreamLogger, FileLogger
 from datetime import datetime, timedelta
 from utils.graceful_killer import GracefulKiller
+from utils.watcher import Watcher
 
 STREAM_LOG_LEVEL = "WARNING"
 
@@ -130,6 +130,10 @@ def main():
     global sleep_time
     global LOG_LEVEL, ID
 
+    # [*]Output directories with new results. None: every output directory has to be read.
+    watcher = Watcher()
+    ready = None
+
     while not killer.kill_now:
         directory_check()
         today = datetime.now().date()
@@ -156,8 +160,23 @@ def main():
             # [*]Get all files from management path.
             process_list = get_running_process()
 
+            # [*]Directories watched from now on are read once, for the results written before.
+            fresh = set()
+            for p, svc_list in process_list.items():
+                for svc in svc_list:
+                    if fp.output_dir(p, svc) not in watcher:
+                        watcher.watch(fp.output_dir(p, svc))
+                        fresh.add(fp.output_dir(p, svc))
+
+            if ready is not None:
+                # [*]Only the services that wrote a result since the last round are read.
+                ready = ready | fresh
+                process_list = {p: [svc for svc in svc_list if fp.output_dir(p, svc) in ready]
+                                for p, svc_list in process_list.items()}
+                process_list = {p: svc_list for p, svc_list in process_list.items() if svc_list}
+
             if not process_list:
-                time.sleep(sleep_time)
+                ready = watcher.gather(sleep_time)
                 continue
 
             slogger.debug("Got running process: {}".format(process_list))
@@ -182,8 +201,8 @@ def main():
             for mp in multi_process:
                 mp.join()
 
-            # [*] Sleep time to join.
-            time.sleep(sleep_time)
+            # [*] Sleep time to join. Results written meanwhile are read in the next round.
+            ready = watcher.gather(sleep_time)
 
             # [*] Collect data.
             final_data = []
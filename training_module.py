@@ -7,15 +7,20 @@
 """
 
 import pandas as pd
-import pickle
 import os
-import dill
+import csv
 import glob
+import timeit
 import config.pgw_ip_address as pgw_ip_list
 import utils.marker as marker
 import argparse
+import models.checkpoint as checkpoint
+import models.threshold as threshold
 from models.rrcf_cls import RRCF
 
+# NOTE: Rows before this date are training data.
+TRAIN_END = '2019-08-01'
+
 
 def data_separation(pgw_ip, svc_type):
     """
@@ -23,50 +28,106 @@ def data_separation(pgw_ip, svc_type):
     """
     df = pd.read_csv("./data/{}/{}.csv".format(pgw_ip, svc_type))
     df['DTmm'] = pd.to_datetime(df['DTmm'], format='%Y-%m-%d %H:%M')
-    df_train = df.loc[df['DTmm'] < '2019-08-01']
-    df_test = df.loc[df['DTmm'] >= '2019-08-01'].reset_index(drop=True)
+    df_train = df.loc[df['DTmm'] < TRAIN_END]
+    df_test = df.loc[df['DTmm'] >= TRAIN_END].reset_index(drop=True)
 
     return df_train, df_test
 
 
-def train_models(data, num_of_trees, sequences, num_of_leaves, quantile, write_file=False):
-    date = data['data']['DTmm']
-    train_data = data['data'][['Real_Up', 'Real_Dn']]
-    train_data = train_data.to_numpy()
-    o_rrcf = RRCF(num_trees=num_of_trees, sequences=sequences, leaves_size=num_of_leaves)
-    score, ftime = o_rrcf.train_rrcf(date, train_data, timer=True)
-    marker.debug_info("Required time: {}".format(ftime))
+def train_data_chunks(pgw_ip, svc_type, chunksize):
+    """
+    Training rows read from csv file in blocks, so the file never has to fit in memory.
+    :param chunksize: An integer. Rows per block.
+    :return:
+        - generator: (date, data) of each block.
+    """
+    reader = pd.read_csv("./data/{}/{}.csv".format(pgw_ip, svc_type), usecols=['DTmm', 'Real_Up', 'Real_Dn'],
+                         chunksize=chunksize)
+    for df in reader:
+        df['DTmm'] = pd.to_datetime(df['DTmm'], format='%Y-%m-%d %H:%M')
+        df = df.loc[df['DTmm'] < TRAIN_END]
+        if len(df.index):
+            yield df['DTmm'].to_numpy(), df[['Real_Up', 'Real_Dn']].to_numpy()
 
-    _ = o_rrcf.calc_threshold(score, quantile, with_data=False)
-    marker.debug_info("Threshold: {}".format(o_rrcf.threshold))
 
+def report_untrained(pgw_ip, svc_type, fname, error=None):
+    """
+    Record a model that could not be trained in error_report/untrained_model.txt.
+    :param pgw_ip: A String. PGW IP of the model.
+    :param svc_type: A String. Service type of the model.
+    :param fname: A String. Training data file of the model.
+    :param error: An Exception. Why the training failed; None if there are not enough data.
+    """
+    if error is not None:
+        marker.debug_info("PGW IP: {} / SVC_TYPE: {} / Error occurs: {}".format(pgw_ip, svc_type, error))
+    if not os.path.exists('./error_report/'):
+        os.mkdir('./error_report')
+    with open("./error_report/untrained_model.txt", "a") as file:
+        if error is None:
+            file.write("{}::{}\n".format(pgw_ip, fname))
+        else:
+            file.write("{}::{} - Error: {}\n".format(pgw_ip, fname, error))
+
+
+def train_models(data, num_of_trees, sequences, num_of_leaves, quantile, write_file=False, seed=None,
+                 threshold_engine='exact', workers=None):
+    """
+    Train a model and compute its threshold. The scores are streamed: each one is fed to the threshold engine
+    and, with write_file, appended to anomaly_scores.csv, so no score is kept in memory.
+    :param data: A Dictionary. 'pgw_ip', 'svc_type' and either 'data' (a DataFrame) or 'chunks' (blocks of
+        train_data_chunks).
+    :param threshold_engine: A String. 'exact', or 'p2' for constant memory.
+    :param workers: An integer. Processes that train the trees in parallel.
+    """
+    o_rrcf = RRCF(num_trees=num_of_trees, sequences=sequences, leaves_size=num_of_leaves, random_state=seed)
+    if 'chunks' in data:
+        scores = o_rrcf.train_rrcf_chunks(data['chunks'], workers=workers)
+    else:
+        date = data['data']['DTmm']
+        train_data = data['data'][['Real_Up', 'Real_Dn']]
+        train_data = train_data.to_numpy()
+        scores = o_rrcf.train_rrcf(date, train_data, stream=True, workers=workers)
+
+    instance_path = "./{}/{}/{}/".format(INSTANCE_DIR, data['pgw_ip'], data['svc_type'])
+    if write_file and not os.path.exists(instance_path):
+        marker.debug_info("Instance directory is not exist. Creating one...")
+        os.makedirs(instance_path)
+
+    engine = threshold.make_engine(threshold_engine, quantile)
+    stime = timeit.default_timer()
     if write_file:
-        instance_path = "./{}/{}/{}/".format(INSTANCE_DIR, data['pgw_ip'], data['svc_type'])
+        with open(instance_path + "anomaly_scores.csv", "w") as file:
+            csv_writer = csv.writer(file, delimiter='|')
+            for date, score in scores:
+                engine.insert(score)
+                csv_writer.writerow([date, score])
+    else:
+        for _, score in scores:
+            engine.insert(score)
+    ftime = timeit.default_timer() - stime
+    marker.debug_info("Required time: {}".format(ftime))
 
-        if not os.path.exists(instance_path):
-            marker.debug_info("Instance directory is not exist. Creating one...")
-            os.makedirs(instance_path)
+    if len(engine) == 0:
+        raise ValueError("Not enough training data for {} sequences.".format(sequences))
+    o_rrcf.threshold = engine.value()
+    marker.debug_info("Threshold: {}".format(o_rrcf.threshold))
 
+    if write_file:
         with open(instance_path + "hyper_parameter.txt", "w") as file:
             file.write("number of trees: {}\n".format(o_rrcf.num_trees))
             file.write("number of leaves: {}\n".format(o_rrcf.leaves_size))
             file.write("sequences: {}\n".format(o_rrcf.sequences))
             file.write("required time: {}\n".format(ftime))
 
-        with open(instance_path + "model.pkl", "wb") as output:
-            dill.dump(o_rrcf, output)
-
-        with open(instance_path + "anomaly_scores.dict", "wb") as file:
-            dill.dump(score, file)
+        checkpoint.save(instance_path + "model.npz", o_rrcf)
 
 
 def load(pgw_ip, svc_type):
-    with open('./{}/{}/{}/model.pkl'.format(INSTANCE_DIR, pgw_ip, svc_type), "rb") as file:
-        rrcf_object = pickle.load(file)
-    return rrcf_object
+    return checkpoint.load('./{}/{}/{}/model.npz'.format(INSTANCE_DIR, pgw_ip, svc_type))
 
 
-def main(num_of_trees, num_of_leaves, sequences, quantile=0.99):
+def main(num_of_trees, num_of_leaves, sequences, quantile=0.99, seed=None, threshold_engine='exact', chunksize=None,
+         workers=None):
     l_pgw_ip = pgw_ip_list.l_pgw_ip
 
     for pgw_ip in l_pgw_ip:
@@ -81,14 +142,25 @@ def main(num_of_trees, num_of_leaves, sequences, quantile=0.99):
 
             marker.debug_info("\t \'svc_type - {}\'".format(svc_type))
 
+            if chunksize:
+                # NOTE: Streamed from the file; too short data is reported by train_models.
+                data = {
+                    'pgw_ip': pgw_ip,
+                    'svc_type': svc_type,
+                    'chunks': train_data_chunks(pgw_ip, svc_type, chunksize)
+                }
+                try:
+                    train_models(data, num_of_trees, sequences, num_of_leaves, quantile, write_file=True, seed=seed,
+                                 threshold_engine=threshold_engine, workers=workers)
+                except Exception as e:
+                    report_untrained(pgw_ip, svc_type, fname, e)
+                continue
+
             df_train, df_test = data_separation(pgw_ip, svc_type)
 
             if len(df_train.index) < sequences:
                 # NOTE: If there are not enough data length, it will pass
-                if not os.path.exists('./error_report/'):
-                    os.mkdir('./error_report')
-                with open("./error_report/untrained_model.txt", "a") as file:
-                    file.write("{}::{}\n".format(pgw_ip, fname))
+                report_untrained(pgw_ip, svc_type, fname)
                 continue
 
             data = {
@@ -98,11 +170,10 @@ def main(num_of_trees, num_of_leaves, sequences, quantile=0.99):
             }
 
             try:
-                train_models(data, num_of_trees, sequences, num_of_leaves, quantile, write_file=True)
+                train_models(data, num_of_trees, sequences, num_of_leaves, quantile, write_file=True, seed=seed,
+                             threshold_engine=threshold_engine, workers=workers)
             except Exception as e:
-                marker.debug_info("PGW IP: {} / SVC_TYPE: {} / Error occurs: {}".format(pgw_ip, svc_type, e))
-                with open("./error_report/untrained_model.txt", "a") as file:
-                    file.write("{}::{} - Error: {}\n".format(pgw_ip, fname, e))
+                report_untrained(pgw_ip, svc_type, fname, e)
                 continue
 
 
@@ -112,9 +183,17 @@ if __name__ == "__main__":
     parser.add_argument('--sequences', type=int, help='Sequences to observe.(Default: 5)', default=5)
     parser.add_argument('--leaves', type=int, help='Leaf size to memorize.(Default: 1440)', default=1440)
     parser.add_argument('--dir_name', type=str, help='Directory name for object', default='instances')
+    parser.add_argument('--seed', type=int, help='Random seed.(Default: None)', default=None)
+    parser.add_argument('--threshold', type=str, default="exact", choices=['exact', 'p2'],
+                        help='Threshold engine; exact or p2 (constant memory).(Default: exact)')
+    parser.add_argument('--chunksize', type=int, help='Read training data in blocks of rows.(Default: whole file)',
+                        default=None)
+    parser.add_argument('--workers', type=int, help='Processes that train the trees in parallel.(Default: 1)',
+                        default=None)
 
     args = parser.parse_args()
 
     INSTANCE_DIR = args.dir_name
 
-    main(args.trees, args.leaves, args.sequences)
+    main(args.trees, args.leaves, args.sequences, seed=args.seed, threshold_engine=args.threshold,
+         chunksize=args.chunksize, workers=args.workers)
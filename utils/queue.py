@@ -5,6 +5,7 @@
 @ Author: DH.KIM
 @ Company: Ntels Co., Ltd
 """
+import numpy as np
 import utils.marker as marker
 
 
@@ -12,11 +13,59 @@ class Queue(object):
     def __init__(self, size=0):
         """ Customized queue list.
 
+        A ring buffer: put and get are O(1) and items are never shifted. With a size the buffer is allocated once;
+        without one (size=0) it doubles when it is full.
+
         Args:
             :param size: An integer. Max size of queue.
         """
         self.size = size
-        self.indexList = []
+        self._buffer = [None] * size
+        self._head = 0
+        self._count = 0
+
+    def __setstate__(self, state):
+        # [*]Queues pickled before the ring buffer keep their items in a list.
+        items = state.pop('indexList', None)
+        self.__dict__.update(state)
+        if items is not None:
+            self.indexList = items
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """
+        Iterates the items from the oldest to the newest without copying them.
+        """
+        capacity = len(self._buffer)
+        for i in range(self._count):
+            yield self._buffer[(self._head + i) % capacity]
+
+    def __getitem__(self, i):
+        """
+        The i-th oldest item; negative indexes count from the newest (queue[-1] is the last put).
+        """
+        if i < 0:
+            i += self._count
+        if i < 0 or i >= self._count:
+            raise IndexError("Queue index out of range")
+        return self._buffer[(self._head + i) % len(self._buffer)]
+
+    @property
+    def indexList(self):
+        """
+        The items as a list, oldest first. It is a copy; iterate or index the queue itself to avoid it.
+        """
+        return list(self)
+
+    @indexList.setter
+    def indexList(self, items):
+        items = list(items)
+        capacity = max(self.size, len(items))
+        self._buffer = items + [None] * (capacity - len(items))
+        self._head = 0
+        self._count = len(items)
 
     def put(self, index):
         """
@@ -27,10 +76,13 @@ class Queue(object):
                 - None or Error if buffer is full.
         """
         if self.size != 0:
-            if len(self.indexList) > self.size:
+            if self._count >= self.size:
                 marker.debug_info("Buffer overflow. Queue should not exceed the size.", m_type="ERROR")
                 raise SystemExit()
-        self.indexList.append(index)
+        elif self._count == len(self._buffer):
+            self._grow()
+        self._buffer[(self._head + self._count) % len(self._buffer)] = index
+        self._count += 1
 
     def get(self):
         """
@@ -39,20 +91,39 @@ class Queue(object):
             - value: Any type. First item in list.
             - SystemExit(): If Queue is empty
         """
-        if len(self.indexList) == 0:
+        if self._count == 0:
             marker.debug_info("Queue is empty", m_type="ERROR")
             raise SystemExit()
-        value = self.indexList[0]
-        self.indexList.remove(value)
+        value = self._buffer[self._head]
+        self._buffer[self._head] = None
+        self._head = (self._head + 1) % len(self._buffer)
+        self._count -= 1
         return value
 
+    def clear(self):
+        """
+        Remove all items. The buffer is kept.
+        :return: None
+        """
+        self._buffer = [None] * len(self._buffer)
+        self._head = 0
+        self._count = 0
+
+    def _grow(self):
+        """
+        Double the buffer of an unbounded queue, moving the items to the front.
+        """
+        items = list(self)
+        self._buffer = items + [None] * max(len(items), 8)
+        self._head = 0
+
     def empty(self):
         """
         Returns True if queue list is empty.
         :return:
             - Boolean
         """
-        if len(self.indexList) != 0:
+        if self._count != 0:
             return False
         else:
             return True
@@ -69,7 +140,7 @@ class Queue(object):
                               m_type="WARNING")
             return None
         else:
-            if len(self.indexList) >= self.size:
+            if self._count >= self.size:
                 return True
             else:
                 return False
@@ -80,7 +151,7 @@ class Queue(object):
         :return:
             An Integer. Queue length.
         """
-        return len(self.indexList)
+        return self._count
 
     def queue_status(self):
         """
@@ -94,3 +165,95 @@ class Queue(object):
             return 'empty'
         else:
             return str(self.queue_length())
+
+
+class InputWindow(object):
+    def __init__(self, size, width=2):
+        """ The last rows of input data: their dates and their values.
+
+        The rows are kept oldest first in preallocated arrays and shifted in place when new rows arrive, so the
+        window is always a contiguous view and nothing is allocated per row.
+
+        Args:
+            :param size: An integer. Number of rows kept (> 0).
+            :param width: An integer. Values per row.
+        """
+        if size <= 0:
+            marker.debug_info("InputWindow needs a positive size. We have \'{}\'".format(size), m_type="ERROR")
+            raise SystemExit()
+        self.size = size
+        self.width = width
+        self.dates = np.empty(size, dtype=object)
+        self.values = np.zeros((size, width), dtype=np.float64)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "InputWindow(size={}, dates={})".format(self.size, self.dates[:self._count].tolist())
+
+    @classmethod
+    def from_queue(cls, queue, width=2):
+        """
+        Migrate an input window of older versions: a Queue of [date, values] items.
+        :param queue: A Queue object.
+        :param width: An integer. Values per row.
+        :return:
+            An InputWindow object.
+        """
+        window = cls(queue.size, width)
+        items = list(queue)
+        if items:
+            window.extend(np.array([item[0] for item in items], dtype=object),
+                          np.array([np.asarray(item[1], dtype=np.float64) for item in items]))
+        return window
+
+    def window(self):
+        """
+        The rows from the oldest to the newest as views. They are only valid until the next extend.
+        :return:
+            - dates: A Numpy array (count).
+            - values: A Numpy array (count x width).
+        """
+        return self.dates[:self._count], self.values[:self._count]
+
+    def extend(self, dates, values):
+        """
+        Append rows; the oldest rows leave the window when it is full.
+        :param dates: A Numpy array (n). Date of each row.
+        :param values: A Numpy array (n x width). Values of each row.
+        :return: None
+        """
+        n = len(values)
+        if n >= self.size:
+            self.dates[:] = dates[n - self.size:]
+            self.values[:] = values[n - self.size:]
+            self._count = self.size
+            return
+        shift = max(self._count + n - self.size, 0)
+        if shift:
+            # [*]Roll the kept rows to the front.
+            kept = self._count - shift
+            self.dates[:kept] = self.dates[shift:self._count]
+            self.values[:kept] = self.values[shift:self._count]
+            self._count = kept
+        self.dates[self._count:self._count + n] = dates
+        self.values[self._count:self._count + n] = values
+        self._count += n
+
+    def full(self):
+        """
+        Returns True if the window holds size rows.
+        :return:
+            - Boolean
+        """
+        return self._count >= self.size
+
+    def empty(self):
+        """
+        Returns True if the window holds no row.
+        :return:
+            - Boolean
+        """
+        return self._count == 0
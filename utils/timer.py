@@ -0,0 +1,48 @@
+"""
+@ File name: timer.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+"""
+
+
+class CallTimer(object):
+    def __init__(self):
+        """ Accumulates the execution time of repeated calls. """
+        self.calls = 0
+        self.total = 0.
+        self.last = 0.
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, elapsed):
+        """
+        Record the execution time of one call.
+        :param elapsed: A float. Elapsed seconds.
+        :return: None
+        """
+        self.calls += 1
+        self.total += elapsed
+        self.last = elapsed
+        if self.minimum is None or elapsed < self.minimum:
+            self.minimum = elapsed
+        if self.maximum is None or elapsed > self.maximum:
+            self.maximum = elapsed
+
+    def mean(self):
+        """
+        Returns mean execution time per call.
+        :return:
+            A float. 0 if nothing is recorded.
+        """
+        if self.calls == 0:
+            return 0.
+        return self.total / self.calls
+
+    def reset(self):
+        self.__init__()
+
+    def __repr__(self):
+        return "CallTimer(calls={}, total={:.6f}s, mean={:.6f}s, last={:.6f}s)".format(
+            self.calls, self.total, self.mean(), self.last)
@@ -0,0 +1,301 @@
+"""
+@ File name: wal.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Write-ahead log of the input rows applied to a detector.
+
+Every input block is appended to the log before it is scored, so a detector killed without saving (kill -9, OOM)
+is recovered by loading its last snapshot and scoring the rows logged after it again. The log is split in
+segments (wal_<n>.log): a snapshot starts a new segment, and once it is written the segments it covers are
+removed.
+
+A snapshot (model.npz and dstore.npz) is written into a temporary directory that is renamed to snapshot_<n> when it
+is complete, n being the last segment it covers. A crash while it is written leaves the previous snapshot and the
+log untouched, so the rows are never applied twice and a model is never paired with an older input window.
+Instance directories of older versions (checkpoints in the directory itself, covered segment in `wal.snapshot`)
+are read until their first snapshot directory is written.
+
+Input files stay on disk until their last rows are logged. The log records how many rows of each of them it holds
+(`#<path>|<rows>` lines, see `offsets`), so after a crash the rows already logged are replayed and the file is read on
+from there instead of from its start.
+
+Usage:
+    wal = WriteAheadLog(INSTANCE_DIR)
+    rows = wal.pending()                # [*]Rows to replay after the last snapshot.
+    wal.append(data)                    # [*]Before scoring data.
+    if wal.due():
+        wal.snapshot(lambda path: save_model(path, anomaly_detector, dstore))
+    detector, dstore = load_model(latest_snapshot(INSTANCE_DIR)[1] or INSTANCE_DIR)
+"""
+import os
+import glob
+import shutil
+import signal
+import timeit
+import numpy as np
+import multiprocessing as mp
+import utils.marker as marker
+
+# [*]Covered segment of the snapshots of older versions, written in the instance directory itself.
+SNAPSHOT_FILE = 'wal.snapshot'
+SNAPSHOT_DIR = 'snapshot_'
+
+
+def latest_snapshot(directory):
+    """
+    The newest complete snapshot directory of an instance directory.
+    :param directory: A String. Instance directory.
+    :return:
+        - segment: An Integer. Last segment covered by the snapshot; -1 if there is none.
+        - path: A String. Snapshot directory path (with a trailing '/'), or None if there is none.
+    """
+    snapshots = glob.glob(os.path.join(directory, SNAPSHOT_DIR + '*'))
+    segments = [int(os.path.basename(path)[len(SNAPSHOT_DIR):]) for path in snapshots
+                if os.path.basename(path)[len(SNAPSHOT_DIR):].isdigit()]
+    if not segments:
+        return -1, None
+    segment = max(segments)
+    return segment, os.path.join(directory, SNAPSHOT_DIR + '{:08d}'.format(segment)) + '/'
+
+
+def _snapshot(save, directory, segment):
+    """
+    Write a snapshot into a temporary directory and publish it, with the last segment it covers, in one rename.
+    """
+    temp_path = os.path.join(directory, SNAPSHOT_DIR + 'tmp')
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    save(temp_path + '/')
+    os.rename(temp_path, os.path.join(directory, SNAPSHOT_DIR + '{:08d}'.format(segment)))
+
+
+def _background_snapshot(save, directory, segment):
+    """
+    _snapshot in a forked process, on a copy-on-write image of the detector at the time of the fork.
+    """
+    # [*]Signals are handled by the parent, which waits for the snapshot before it exits.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _snapshot(save, directory, segment)
+
+
+class WriteAheadLog(object):
+    def __init__(self, directory, interval=600):
+        """ Append-only log of the input rows of one detector, with periodic snapshots.
+
+        Args:
+            :param directory: A String. Instance directory of the detector.
+            :param interval: An Integer. Seconds between snapshots (see `due`).
+        """
+        self.directory = directory
+        self.interval = interval
+        self.last_snapshot = timeit.default_timer()
+        self._process = None
+        # [*]Rows appended since the last snapshot.
+        self.appended = 0
+        # [*]Input file path -> rows of it in the log.
+        self.offsets = {}
+        # [*]A new segment is always started, so a torn line can only be the last line of an old segment.
+        segments = self._segments()
+        self.segment = max(segments[-1] if segments else -1, self.snapshot_segment()) + 1
+        # [*]Segments of a snapshot finished after the last run stopped collecting it.
+        self._remove_covered()
+        self.offsets = self._read_offsets()
+
+    def __repr__(self):
+        return "WriteAheadLog(directory={}, segment={}, snapshot={})".format(self.directory, self.segment,
+                                                                             self.snapshot_segment())
+
+    def _path(self, segment):
+        return os.path.join(self.directory, 'wal_{:08d}.log'.format(segment))
+
+    def _segments(self):
+        """
+        Numbers of the segments on disk, in order.
+        """
+        files = glob.glob(os.path.join(self.directory, 'wal_*.log'))
+        return sorted(int(os.path.basename(file)[4:-4]) for file in files)
+
+    def snapshot_segment(self):
+        """
+        The last segment covered by the snapshot on disk.
+        :return:
+            An Integer. -1 if there is no snapshot.
+        """
+        segment, _ = latest_snapshot(self.directory)
+        if segment >= 0:
+            return segment
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return -1
+        with open(path) as file:
+            return int(file.read())
+
+    def append(self, rows, offsets=None):
+        """
+        Log the input rows before they are applied. One write, flushed to the OS so it survives a kill of the
+        process.
+        :param rows: A Numpy array. Input rows (PGW_IP, DTmm, SVC_TYPE, UP, DN) of data_loader.
+        :param offsets: A Dictionary. Input file path -> rows of it read so far, for the files the rows were read
+            from (see anomaly_detection.stream_offsets).
+        :return: None
+        """
+        lines = ''.join('|'.join(str(value) for value in row) + '\n' for row in rows)
+        if offsets:
+            self.offsets.update(offsets)
+            lines += self._offset_lines(offsets)
+        self._write(lines)
+        self.appended += len(rows)
+
+    def _write(self, lines):
+        # [*]The segment is opened for every block: a host runs thousands of logs, which must not each hold a file.
+        with open(self._path(self.segment), 'a') as file:
+            file.write(lines)
+
+    @staticmethod
+    def _offset_lines(offsets):
+        return ''.join('#{}|{}\n'.format(path, rows) for path, rows in offsets.items())
+
+    def _read_offsets(self):
+        """
+        The offsets recorded after the last snapshot, for the input files that still exist.
+        """
+        offsets = {}
+        snapshot = self.snapshot_segment()
+        for segment in self._segments():
+            if segment <= snapshot:
+                continue
+            with open(self._path(segment)) as file:
+                for line in file:
+                    if not line.startswith('#'):
+                        continue
+                    path, _, rows = line[1:].rstrip('\n').rpartition('|')
+                    try:
+                        offsets[path] = int(rows)
+                    except ValueError:
+                        # [*]A line cut by a crash.
+                        break
+        return {path: rows for path, rows in offsets.items() if os.path.exists(path)}
+
+    def pending(self):
+        """
+        The rows logged after the last snapshot, in order.
+        :return:
+            - rows: A Numpy array, like the rows of data_loader.
+            - None: If there is no such row.
+        """
+        rows = []
+        snapshot = self.snapshot_segment()
+        for segment in self._segments():
+            if segment <= snapshot:
+                continue
+            with open(self._path(segment)) as file:
+                for line in file:
+                    if line.startswith('#'):
+                        # [*]Offset of an input file (see `offsets`).
+                        continue
+                    values = line.rstrip('\n').split('|')
+                    try:
+                        rows.append([values[0], values[1], values[2], float(values[3]), float(values[4])])
+                    except (IndexError, ValueError):
+                        # [*]A line cut by a crash; nothing was applied after it.
+                        marker.debug_info("Torn line in {} is skipped: {}".format(self._path(segment), line),
+                                          m_type="WARNING")
+                        break
+        if not rows:
+            return None
+        return np.array(rows, dtype=object)
+
+    def due(self):
+        """
+        Returns True if a snapshot should be taken: rows were appended since the last one and the interval passed.
+        :return:
+            - Boolean
+        """
+        if self.appended == 0 or self.running():
+            return False
+        return timeit.default_timer() - self.last_snapshot >= self.interval
+
+    def running(self):
+        """
+        Returns True if a background snapshot is being written. A finished one is collected.
+        :return:
+            - Boolean
+        """
+        if self._process is None:
+            return False
+        if self._process.is_alive():
+            return True
+        self._collect()
+        return False
+
+    def snapshot(self, save, background=True):
+        """
+        Save the detector and drop the log it covers. The rows appended from now on go to a new segment.
+        :param save: A callable. save(path) writes the snapshot into the directory path, e.g.
+            `lambda path: save_model(path, detector, dstore)`.
+        :param background: A Boolean. Save in a forked process. Objects that talk to other processes (the sharded
+            engine) have to be saved in the foreground.
+        :return: None
+        """
+        if self._process is not None:
+            # [*]One snapshot at a time; a newer one covers more.
+            self._process.join()
+            self._collect()
+        covered = self.segment
+        self.segment += 1
+        self.appended = 0
+        self.last_snapshot = timeit.default_timer()
+        # [*]The offsets of the files still being read outlive the segments they were logged in.
+        self.offsets = {path: rows for path, rows in self.offsets.items() if os.path.exists(path)}
+        if self.offsets:
+            self._write(self._offset_lines(self.offsets))
+
+        if background:
+            self._process = mp.get_context('fork').Process(target=_background_snapshot,
+                                                           args=(save, self.directory, covered), daemon=True)
+            self._process.start()
+        else:
+            _snapshot(save, self.directory, covered)
+            self._remove_covered()
+
+    def _collect(self):
+        """
+        Join a finished background snapshot and drop the log it covers. A failed snapshot keeps the log; the next
+        one covers it.
+        """
+        process = self._process
+        self._process = None
+        process.join()
+        if process.exitcode != 0:
+            marker.debug_info("Snapshot of {} failed (exit code {}). The log is kept.".format(
+                self.directory, process.exitcode), m_type="WARNING")
+            return
+        self._remove_covered()
+
+    def _remove_covered(self):
+        """
+        Remove the segments covered by the newest snapshot, and the older snapshots.
+        """
+        snapshot = self.snapshot_segment()
+        for segment in self._segments():
+            if segment <= snapshot:
+                os.remove(self._path(segment))
+        _, latest = latest_snapshot(self.directory)
+        if latest is None:
+            return
+        for path in glob.glob(os.path.join(self.directory, SNAPSHOT_DIR + '*')):
+            if os.path.join(path, '') != latest and os.path.basename(path)[len(SNAPSHOT_DIR):].isdigit():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self):
+        """
+        Wait for a background snapshot.
+        :return: None
+        """
+        if self._process is not None:
+            self._process.join()
+            self._collect()
@@ -0,0 +1,229 @@
+"""
+@ File name: watcher.py
+@ Version: 1.0.0
+@ Last update: 2026.OCT.16
+@ Author: DH.KIM
+@ Company: Ntels Co., Ltd
+
+Wakes the main loops when a file marker (*.INFO) is created in a watched directory.
+
+Linux inotify is used through ctypes. Without it (another OS, or the watch limit is reached) `wait` sleeps and
+returns None, and the caller polls its directories as before.
+
+Usage:
+    watcher = Watcher()
+    watcher.watch(INPUT_DIR)
+    ready = watcher.wait(1)     # [*]None: poll every directory. A Set: the directories with a new marker.
+    ready = watcher.gather(60)  # [*]The same, collected over the whole period.
+"""
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import fnmatch
+import utils.marker as marker
+
+# [*]inotify(7) constants.
+IN_CREATE = 0x00000100
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+# [*]struct inotify_event: wd, mask, cookie, len, followed by len bytes of name.
+EVENT = struct.Struct('iIII')
+
+
+def _libc():
+    """
+    Returns the C library with the inotify functions, or None if they are not available.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError, TypeError):
+        return None
+    return libc
+
+
+class Watcher(object):
+    def __init__(self, pattern='*.INFO'):
+        """ Watches directories for newly created markers.
+
+        Args:
+            :param pattern: A String. File name pattern of the markers.
+        """
+        self.pattern = pattern
+        self._libc = _libc()
+        self._fd = None
+        # [*]Watched directories: wd -> directory, and directory -> wd.
+        self._directories = {}
+        self._wds = {}
+        # [*]Directories that couldn't be watched (e.g. deleted). They are polled until they can.
+        self._lost = set()
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                marker.debug_info("inotify is not available ({}). Directories are polled.".format(
+                    os.strerror(ctypes.get_errno())), m_type="WARNING")
+
+    def __contains__(self, directory):
+        return directory in self._wds
+
+    def __repr__(self):
+        return "Watcher(inotify={}, watched={}, lost={})".format(self.inotify, len(self._wds), len(self._lost))
+
+    @property
+    def inotify(self):
+        """
+        True if the directories are watched with inotify, False if they are polled.
+        """
+        return self._fd is not None
+
+    def watch(self, directory):
+        """
+        Watch a directory. Watching it again does nothing.
+        :param directory: A String. Directory path.
+        :return:
+            - Boolean: True if the directory is watched with inotify.
+        """
+        if self._fd is None:
+            return False
+        if directory in self._wds:
+            return True
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                marker.debug_info("inotify watch limit is reached (fs.inotify.max_user_watches). {} is polled."
+                                  .format(directory), m_type="WARNING")
+            self._lost.add(directory)
+            return False
+        self._lost.discard(directory)
+        self._wds[directory] = wd
+        self._directories[wd] = directory
+        return True
+
+    def unwatch(self, directory):
+        """
+        Stop watching a directory.
+        :param directory: A String. Directory path.
+        :return: None
+        """
+        self._lost.discard(directory)
+        wd = self._wds.pop(directory, None)
+        if wd is not None:
+            self._directories.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def wait(self, timeout):
+        """
+        Sleep until a marker is created in a watched directory, or for timeout seconds.
+        :param timeout: A Float. Seconds.
+        :return:
+            - set: The watched directories in which a marker was created. Empty on timeout.
+            - None: Unknown; every directory has to be polled (no inotify, a directory couldn't be watched, or
+                events were lost).
+        """
+        if self._fd is None:
+            time.sleep(timeout)
+            return None
+        if self._lost:
+            for directory in list(self._lost):
+                self.watch(directory)
+            if self._lost:
+                time.sleep(timeout)
+                self._read()
+            # [*]Markers created while a directory wasn't watched are found by polling once.
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            readable, _, _ = select.select([self._fd], [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                return set()
+            ready = self._read()
+            # [*]Other files (e.g. the .DAT written before its marker) don't wake the caller.
+            if ready is None or ready or time.monotonic() >= deadline:
+                return ready
+
+    def gather(self, duration):
+        """
+        Sleep for duration seconds, collecting the directories in which markers are created meanwhile.
+        :param duration: A Float. Seconds.
+        :return:
+            - set: The watched directories in which a marker was created.
+            - None: Unknown; every directory has to be polled.
+        """
+        deadline = time.monotonic() + duration
+        ready = set()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ready
+            found = self.wait(remaining)
+            if found is None:
+                time.sleep(max(deadline - time.monotonic(), 0))
+                return None
+            ready |= found
+
+    def _read(self):
+        """
+        Read the pending events.
+        :return:
+            The directories with a new marker, or None if events were lost or a directory is no longer watched.
+        """
+        ready = set()
+        unknown = False
+        while True:
+            try:
+                buffer = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = EVENT.unpack_from(buffer, offset)
+                name = buffer[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+                offset += EVENT.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    unknown = True
+                elif mask & IN_MOVE_SELF:
+                    # [*]The directory was renamed; its path no longer matches the watch.
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                elif mask & IN_IGNORED:
+                    # [*]Watch removed (directory deleted or renamed). It is watched again once it exists.
+                    directory = self._directories.pop(wd, None)
+                    if directory is not None:
+                        self._wds.pop(directory, None)
+                        self._lost.add(directory)
+                        unknown = True
+                elif wd in self._directories and fnmatch.fnmatch(os.fsdecode(name), self.pattern):
+                    ready.add(self._directories[wd])
+        if unknown:
+            return None
+        return ready
+
+    def close(self):
+        """
+        Stop watching.
+        :return: None
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._directories = {}
+        self._wds = {}
+        self._lost = set()